@@ -2,26 +2,67 @@
 
 import kxg
 
-from .messages import SetupWorld, SetupPlayer
+from .messages import SetupWorld, SetupPlayer, MessageBatch
 from .world import Player
 from .config import load_initial_pieces
 
-class BaseActor(kxg.Actor):
+class BatchingActor(kxg.Actor):
+    """
+    Collect the messages sent during a tick, and send them all at once.
+
+    Use `queue_message()` instead of `send_message()` (or `>>`) to add a
+    message to the current tick, and call `flush_messages()` at the end of
+    the tick.  If more than one message was queued, they're sent as a single
+    `MessageBatch`, so every recipient gets one packet per tick no matter how
+    many messages there were.
+
+    Messages in a batch are checked together, so if any one of them fails its
+    check, the whole batch is rejected.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._outbox = []
+
+    def queue_message(self, message):
+        self._outbox.append(message)
+
+    def flush_messages(self):
+        outbox, self._outbox = self._outbox, []
+
+        if len(outbox) == 1:
+            self >> outbox[0]
+        elif outbox:
+            self >> MessageBatch(outbox)
+
+    @kxg.subscribe_to_message(MessageBatch)
+    def on_message_batch(self, batch):
+        # Let subscribers (including token extensions) react to each message 
+        # as if it had been sent on its own.
+        for message in batch:
+            self._react_to_message(message)
+
+class BaseActor(BatchingActor):
 
     def __init__(self):
         super().__init__()
         self.player = None
 
+    def on_update_game(self, dt):
+        super().on_update_game(dt)
+        self.flush_messages()
+
     @kxg.subscribe_to_message(SetupWorld)
     def on_setup_world(self, message):
-        self.player = Player.from_actor(self, message.board)
+        self.player = Player.from_actor(
+                self, message.board, message.num_players)
         pieces = load_initial_pieces(
                 message.config,
                 self.player,
                 self.world.piece_types,
         )
         self.player.gain_pieces(pieces)
-        self >> SetupPlayer(self.player)
+        self.queue_message(SetupPlayer(self.player))
 
 
 
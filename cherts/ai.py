@@ -3,6 +3,43 @@
 import kxg
 
 from .actors import BaseActor
+from .lockstep import MoveCommand
 
 class AiActor(BaseActor):
-    pass
+    """
+    A computer-controlled player.
+
+    So far this only sets up the player's pieces (see `BaseActor`), and never 
+    moves them.  Tournament matches are played in lockstep instead, by 
+    `RandomPolicy`.
+    """
+
+class RandomPolicy:
+    """
+    Choose a random move for one player in a lockstep game.
+
+    Each tick, one of the player's pieces that isn't cooling down is moved to 
+    one of the tiles it can reach (possibly capturing an opponent's piece), 
+    all chosen at random.  The choices only depend on the given random number 
+    generator and the state of the world, so a match between policies seeded 
+    the same way always plays out the same way.
+    """
+
+    def __init__(self, player_id, random):
+        self.player_id = player_id
+        self.random = random
+
+    def choose_commands(self, world):
+        player = world.get_token(self.player_id)
+        commands = [
+                MoveCommand(piece.id, tile)
+                for piece in player.pieces
+                if not piece.cooldown_sec
+                for tile in sorted(world.find_reachable_tiles(piece))
+                if _is_free_or_enemy(world, player, tile)
+        ]
+        return [self.random.choice(commands)] if commands else []
+
+def _is_free_or_enemy(world, player, tile):
+    occupant = world.find_piece_on_tile(tile)
+    return occupant is None or occupant.player is not player
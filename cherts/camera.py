@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+"""\
+Map between the player frame and the pixels of the window.
+
+The camera is kept separate from the GUI (which needs a display) so that the
+math can be tested on its own.  All of the coordinates here are in the player
+frame, so "up" is always towards the far edge of the board, whichever player
+is looking at it.
+"""
+
+import math
+from vecrec import Vector, accept_anything_as_vector
+
+class Camera:
+    """
+    Pan and zoom the view of the board.
+
+    The camera is described by the point (in the player frame) at the center
+    of the window, and by the number of pixels per tile.  Every change bumps
+    `version`, so the GUI can tell when anything that depends on the view
+    (e.g. the grid lines, which are only built for the visible tiles) needs to
+    be rebuilt.
+    """
+
+    def __init__(self, window_shape, *, min_px_per_tile, max_px_per_tile,
+            zoom_step, placeholder_px_per_tile):
+        self.window_shape = Vector.from_anything(window_shape)
+        self.min_px_per_tile = min_px_per_tile
+        self.max_px_per_tile = max_px_per_tile
+        self.zoom_step = zoom_step
+        self.placeholder_px_per_tile = placeholder_px_per_tile
+        self.xyp_center = Vector(0, 0)
+        self.px_per_tile = min_px_per_tile
+        self.version = 0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(xyp_center={self.xyp_center}, px_per_tile={self.px_per_tile:g})'
+
+    @classmethod
+    def from_config(cls, config, window_shape):
+        params = config['camera']
+        return cls(
+                window_shape,
+                min_px_per_tile=params['min_px_per_tile'],
+                max_px_per_tile=params['max_px_per_tile'],
+                zoom_step=params['zoom_step'],
+                placeholder_px_per_tile=params['placeholder_px_per_tile'],
+        )
+
+    @property
+    def use_placeholders(self):
+        """
+        True if the tiles are too small for the piece images to be legible, in
+        which case it's cheaper to draw each piece as a plain marker.
+        """
+        return self.px_per_tile < self.placeholder_px_per_tile
+
+    @accept_anything_as_vector
+    def xyg_from_xyp(self, xyp):
+        return (xyp - self.xyp_center) * self.px_per_tile + self.window_shape / 2
+
+    @accept_anything_as_vector
+    def xyp_from_xyg(self, xyg):
+        return (xyg - self.window_shape / 2) / self.px_per_tile + self.xyp_center
+
+    def fit(self, xyp_min, xyp_max):
+        """
+        Show the whole of the given rectangle, as large as possible.
+
+        The corners are the centers of the tiles at either end of the
+        rectangle, so half a tile is added on every side.
+        """
+        xyp_min = Vector.from_anything(xyp_min)
+        xyp_max = Vector.from_anything(xyp_max)
+        size = xyp_max - xyp_min + (1, 1)
+
+        self.xyp_center = (xyp_min + xyp_max) / 2
+        self.px_per_tile = self._clamp_zoom(min(
+                self.window_shape.x / size.x,
+                self.window_shape.y / size.y,
+        ))
+        self.version += 1
+
+    def pan(self, dxg, dyg):
+        """
+        Move the view by the given number of pixels, e.g. as the mouse is
+        dragged.  The board moves along with the mouse.
+        """
+        self.xyp_center -= Vector(dxg, dyg) / self.px_per_tile
+        self.version += 1
+
+    def zoom(self, steps, xyg_anchor=None):
+        """
+        Zoom in (for positive steps) or out (for negative steps), keeping the
+        point under the given pixel (e.g. the mouse) in the same place.
+        """
+        if xyg_anchor is None:
+            xyg_anchor = self.window_shape / 2
+
+        xyp_anchor = self.xyp_from_xyg(xyg_anchor)
+        px_per_tile = self._clamp_zoom(self.px_per_tile * self.zoom_step**steps)
+
+        if px_per_tile == self.px_per_tile:
+            return
+
+        self.px_per_tile = px_per_tile
+        self.xyp_center += (xyp_anchor - self.xyp_from_xyg(xyg_anchor))
+        self.version += 1
+
+    def find_visible_xyp_rect(self, margin=0):
+        """
+        Return the smallest and largest tile coordinates (in the player frame)
+        that are at least partly visible, expanded by the given number of
+        tiles on every side.
+
+        The tiles are not clipped to the board.
+        """
+        xyp_min = self.xyp_from_xyg((0, 0))
+        xyp_max = self.xyp_from_xyg(self.window_shape)
+
+        return (
+                (math.floor(xyp_min.x + 0.5) - margin,
+                 math.floor(xyp_min.y + 0.5) - margin),
+                (math.ceil(xyp_max.x - 0.5) + margin,
+                 math.ceil(xyp_max.y - 0.5) + margin),
+        )
+
+    def is_xyp_visible(self, xyp, margin=0):
+        """
+        Return true if the given point is in the window, or within the given
+        number of tiles of it.
+        """
+        xg, yg = self.xyg_from_xyp(xyp)
+        margin_px = margin * self.px_per_tile
+        return (
+                -margin_px <= xg <= self.window_shape.x + margin_px and
+                -margin_px <= yg <= self.window_shape.y + margin_px
+        )
+
+    def _clamp_zoom(self, px_per_tile):
+        return min(max(px_per_tile, self.min_px_per_tile), self.max_px_per_tile)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""\
+Run the simulation at a fixed rate, independent of the frame rate.
+
+The game engine updates the world once per frame, with however much time
+passed since the last frame.  That ties the cost of the simulation to the
+frame rate, and makes its behavior depend on how steady the frame rate is.
+Instead, the time from each frame is accumulated, and the simulation advances
+in whole ticks of a fixed length.  Time left over at the end of a frame
+carries over to the next one, and the fraction of a tick it represents is used
+to interpolate between the last two ticks when rendering.
+"""
+
+# Frame times are floats, and adding up e.g. twenty 0.05s frames doesn't give
+# exactly one second.  Treat anything within this margin of a whole tick as a
+# whole tick, so that frames that are exactly as long as a tick always advance
+# the simulation by exactly one tick.
+EPSILON_SEC = 1e-9
+
+class FixedTimestep:
+    """
+    Work out how many fixed-length ticks to simulate after each frame.
+
+    If a frame takes a long time (e.g. because the window was being dragged),
+    the simulation catches up by running several ticks at once, but never more
+    than *max_ticks_per_update*.  Any time beyond that is dropped, so that a
+    machine too slow to keep up with the tick rate falls behind gracefully,
+    rather than spending ever longer catching up.
+    """
+
+    def __init__(self, tick_rate, max_ticks_per_update=5):
+        if tick_rate <= 0:
+            raise ValueError(f"tick rate must be positive, not {tick_rate}")
+        if max_ticks_per_update < 1:
+            raise ValueError(f"must allow at least one tick per update, not {max_ticks_per_update}")
+
+        self.tick_rate = tick_rate
+        self.max_ticks_per_update = max_ticks_per_update
+        self.tick = 0
+        self.num_dropped_ticks = 0
+        self._accumulator_sec = 0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(tick_rate={self.tick_rate}, max_ticks_per_update={self.max_ticks_per_update})'
+
+    @classmethod
+    def from_config(cls, config):
+        params = config['simulation']
+        return cls(
+                tick_rate=params['tick_rate'],
+                max_ticks_per_update=params['max_ticks_per_update'],
+        )
+
+    @property
+    def dt_sec(self):
+        """
+        The length of each tick.
+        """
+        return 1 / self.tick_rate
+
+    @property
+    def elapsed_sec(self):
+        """
+        The amount of time simulated so far.
+        """
+        return self.tick * self.dt_sec
+
+    @property
+    def alpha(self):
+        """
+        How far the current time is between the last tick and the next, as a
+        fraction between 0 and 1.
+
+        Anything drawn between ticks should be interpolated between its state
+        as of the last two ticks using this fraction.
+        """
+        return min(max(self._accumulator_sec / self.dt_sec, 0), 1)
+
+    def advance(self, dt_sec):
+        """
+        Account for the given amount of time passing, and return the number of
+        ticks that should be simulated as a result.
+        """
+        self._accumulator_sec += dt_sec
+
+        num_ticks = int((self._accumulator_sec + EPSILON_SEC) // self.dt_sec)
+        self._accumulator_sec -= num_ticks * self.dt_sec
+
+        if num_ticks > self.max_ticks_per_update:
+            self.num_dropped_ticks += num_ticks - self.max_ticks_per_update
+            num_ticks = self.max_ticks_per_update
+
+        self.tick += num_ticks
+        return num_ticks
@@ -10,13 +10,71 @@ from .world import Board, Piece, PieceType, MoveType, PatternType
 # `config`: The dictionary loaded from `config.toml`.
 # `params`: The subset of `config` relevant to a particular function.
 
-def load_config():
-    toml_path = Path(__file__).parent / 'config.toml'
-    return rtoml.load(toml_path)
+CONFIG_PATH = Path(__file__).parent / 'config.toml'
+
+def load_config(*override_paths):
+    """
+    Load the default config file, then apply any overrides from the given 
+    paths (in order).
+    """
+    config = rtoml.load(CONFIG_PATH)
+
+    for path in override_paths:
+        merge_config(config, rtoml.load(Path(path)))
+
+    return config
+
+def merge_config(config, overrides):
+    """
+    Recursively update the given config with the given overrides.  Tables are 
+    merged, everything else (including arrays) is replaced.
+    """
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(config.get(key), dict):
+            merge_config(config[key], value)
+        else:
+            config[key] = value
+
+def diff_config(old_config, new_config):
+    """
+    Find the names of the move, pattern, and piece types that differ between 
+    the given configs.
+
+    Piece types refer directly to their move and pattern types, so a piece 
+    type is considered to have changed if any of its move or pattern types 
+    changed.  Types that were added or removed are included.
+    """
+    def diff_section(key):
+        old, new = old_config[key], new_config[key]
+        return {k for k in old.keys() | new.keys() if old.get(k) != new.get(k)}
+
+    moves = diff_section('moves')
+    patterns = diff_section('patterns')
+    pieces = diff_section('pieces') | {
+            name
+            for name, params in new_config['pieces'].items()
+            if moves.intersection(params['moves'])
+            or patterns.intersection(params['patterns'])
+    }
+    return {
+            'moves': moves,
+            'patterns': patterns,
+            'pieces': pieces,
+    }
 
 def load_initial_pieces(config, player, piece_types):
+    """
+    Create the given player's starting pieces.
+
+    Pieces that are further from the player's origin (sideways) than the width 
+    of the player's slot are left out, so that games with more than two 
+    players don't set up pieces in each other's slots, or off the board.
+    """
     pieces = []
     for params in config['setup']['pieces']:
+        if player.width is not None and params['pos'][0] >= player.width:
+            continue
+
         piece_type = piece_types[params['name']]
         position = player.xyw_from_xyp(params['pos'])
         piece = Piece(player, piece_type, position)
@@ -27,6 +85,7 @@ def load_board(config):
     return Board(
             width=config['board']['width'],
             height=config['board']['height'],
+            layout=config['board'].get('layout'),
     )
 
 def load_piece_types(config, move_types, pattern_types):
@@ -65,7 +124,8 @@ def load_move_type(params, name):
     return MoveType(
             name,
             mode=params['mode'],
-            xyp_exprs=params['waypoints'],
+            xyp_exprs=params.get('waypoints', []),
+            xyp_steps=params.get('rays', []),
     )
 
 def load_pattern_types(config):
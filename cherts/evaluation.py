@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+
+"""\
+Score many positions at once.
+
+An AI comparing candidate moves needs to score far more positions than it
+could afford to by iterating over `Player.pieces` in python.  Instead, each
+position is reduced to a compact snapshot (the type, owner, and tile of every
+piece), the snapshots are stacked into a single array, and every position in
+the stack is scored in one pass of numpy operations.
+
+Everything that depends only on the rules (e.g. which tiles each type of
+piece can reach from each tile on an empty board) is worked out once, when the
+evaluator is created.  Scoring a batch is then just a matter of indexing into
+those tables and accounting for the pieces that block each other.
+
+The tables grow with the number of tiles, the number of players, and (for the
+rays) the size of the board, so this approach is meant for small boards.  On
+a 64x64 board with two players, creating an evaluator takes about 3 s, and the
+ray table alone takes 110 MiB.
+"""
+
+import numpy as np
+
+from vecrec import Vector
+from .world import Player, xyw_paths_from_xyp_exprs, xyt_from_xyw
+from .config import load_board, load_move_types, load_pattern_types, load_piece_types
+from .rules import build_move_table, NO_TILE, _Probe
+
+# Each piece in a snapshot is described by one of these records.  Snapshots
+# are padded to a fixed number of pieces with records whose type is EMPTY.
+SNAPSHOT_DTYPE = np.dtype([
+        ('type', np.int16),
+        ('owner', np.int8),
+        ('tile', np.int32),
+])
+EMPTY = -1
+
+TERMS = 'material', 'mobility', 'coverage', 'pattern_progress'
+
+class PositionEvaluator:
+    """
+    Score batches of positions from the perspective of one player.
+
+    The score is a weighted sum of the difference between the player and all
+    of their opponents in each of the following terms:
+
+    material:
+        The total value of each player's pieces, see `[evaluation]
+        piece_values`.
+
+    mobility:
+        The number of moves each player could make, i.e. the number of tiles
+        each piece can reach without landing on one of its own pieces.
+
+    coverage:
+        The number of tiles that at least one of each player's pieces can
+        reach, i.e. the same tiles counted by `World.get_coverage()`.
+
+    pattern_progress:
+        How close each player's pieces are to completing the patterns listed
+        in `[evaluation] patterns`, e.g. reaching the far edge of the board.
+        Each piece contributes between 0 (as far away as possible) and 1.
+
+    The weights for each term are also given in the `[evaluation]` config
+    section.
+    """
+
+    def __init__(self, config, num_players=2):
+        params = config['evaluation']
+        board = load_board(config)
+        move_types = load_move_types(config)
+        pattern_types = load_pattern_types(config)
+        piece_types = load_piece_types(config, move_types, pattern_types)
+
+        self.board = board
+        self.weights = np.array([params[x] for x in TERMS])
+        self.type_names = sorted(piece_types)
+        self.actor_ids = Player.find_actor_ids(num_players)
+
+        players = [
+                Player.from_actor_id(x, board, num_players)
+                for x in self.actor_ids
+        ]
+        types = [piece_types[x] for x in self.type_names]
+
+        # Each table has an extra row for EMPTY (i.e. index -1), so that empty
+        # slots can be looked up like any other piece.
+        self._values = np.array(
+                [params['piece_values'].get(x, 0) for x in self.type_names] + [0],
+                dtype=float,
+        )
+        self._jump_tiles = _build_jump_tiles(board, players, types)
+        self._ray_tiles = _build_ray_tiles(board, players, types)
+        self._progress = _build_progress(
+                board, players, types, set(params['patterns']))
+
+    def snapshot(self, world, num_pieces=None):
+        """
+        Reduce the given world to an array of piece records.
+
+        The array is padded with empty records to the given number of pieces,
+        so that snapshots of positions with different numbers of pieces can
+        be stacked together.
+        """
+        records = [
+                (
+                    self.type_names.index(piece.type.name),
+                    self.actor_ids.index(piece.player.id),
+                    piece.tile,
+                )
+                for piece in world.iter_pieces()
+        ]
+        return _make_snapshot(records, num_pieces)
+
+    def snapshot_position(self, position, num_pieces=None):
+        """
+        Reduce the given `notation.Position` to an array of piece records, 
+        without building a world.  See `snapshot()`.
+        """
+        width = self.board.width
+        records = [
+                (
+                    self.type_names.index(record.type),
+                    record.player,
+                    record.xyt[1] * width + record.xyt[0],
+                )
+                for record in position.pieces
+        ]
+        return _make_snapshot(records, num_pieces)
+
+    def evaluate(self, snapshots, player=0):
+        """
+        Return the score of each of the given positions, from the perspective
+        of the given player (an index into `Player.find_actor_ids()`).
+        """
+        terms = self.evaluate_terms(snapshots, player)
+        return np.stack([terms[x] for x in TERMS], axis=-1) @ self.weights
+
+    def evaluate_terms(self, snapshots, player=0):
+        """
+        Return the difference between the given player and their opponents in
+        each term of the score, for each of the given positions.
+
+        The snapshots should be an array with shape (positions, pieces), as
+        made by stacking the results of `snapshot()`.
+        """
+        snapshots = np.atleast_2d(snapshots)
+        types = snapshots['type']
+        owners = snapshots['owner'].astype(np.intp)
+        tiles = snapshots['tile'].astype(np.intp)
+        is_piece = types != EMPTY
+
+        num_positions, num_pieces = types.shape
+        num_tiles = self.board.num_tiles
+
+        # Which player occupies each tile in each position.  The extra column
+        # stands for "no tile", and is looked up in place of `NO_TILE`.
+        occupant = np.full((num_positions, num_tiles + 1), EMPTY, dtype=np.int8)
+        i, j = np.nonzero(is_piece)
+        occupant[i, tiles[i, j]] = owners[i, j]
+
+        table_owners = np.where(is_piece, owners, 0)
+        table_tiles = np.where(is_piece, tiles, 0)
+        index = types, table_owners, table_tiles
+
+        # Tiles reachable by the waypoint moves, regardless of what's on them.
+        jump_tiles = self._jump_tiles[index]
+        reach = [jump_tiles]
+
+        # Tiles along each ray, up to and including the first occupied tile.
+        if self._ray_tiles.shape[-1]:
+            ray_tiles = self._ray_tiles[index]
+            ray_occupants = _gather(occupant, ray_tiles)
+            is_open = np.logical_and.accumulate(
+                    ray_occupants == EMPTY, axis=-1)
+            is_open_before = np.ones_like(is_open)
+            is_open_before[..., 1:] = is_open[..., :-1]
+
+            is_reached = (
+                    is_open_before &
+                    (ray_tiles != NO_TILE) &
+                    (ray_occupants != owners[..., None, None])
+            )
+            ray_tiles = np.where(is_reached, ray_tiles, NO_TILE)
+            reach.append(ray_tiles.reshape(num_positions, num_pieces, -1))
+
+        reach = np.concatenate(reach, axis=-1)
+        reach = np.where(is_piece[..., None], reach, NO_TILE)
+
+        # A mask of the tiles each piece can reach.  Using a mask (rather than
+        # counting the reachable tiles) means that tiles reached in more than
+        # one way are only counted once.
+        reach_mask = np.zeros((num_positions, num_pieces, num_tiles + 1), dtype=bool)
+        i, j, _ = np.indices(reach.shape, sparse=True)
+        reach_mask[i, j, reach] = True
+        reach_mask = reach_mask[..., :num_tiles]
+
+        own_tiles = occupant[:, None, :num_tiles] == owners[..., None]
+        mobility = (reach_mask & ~own_tiles).sum(axis=-1)
+
+        material = self._values[types]
+        progress = self._progress[index]
+
+        def by_player(x):
+            mine = np.where(is_piece & (owners == player), x, 0).sum(axis=-1)
+            theirs = np.where(is_piece & (owners != player), x, 0).sum(axis=-1)
+            return mine - theirs
+
+        def coverage(owner):
+            is_owner = (is_piece & (owners == owner))[..., None]
+            return (reach_mask & is_owner).any(axis=1).sum(axis=-1)
+
+        opponents = [x for x in range(len(self.actor_ids)) if x != player]
+
+        return {
+                'material': by_player(material),
+                'mobility': by_player(mobility),
+                'coverage': coverage(player) - sum(map(coverage, opponents)),
+                'pattern_progress': by_player(progress),
+        }
+
+def _make_snapshot(records, num_pieces):
+    num_pieces = len(records) if num_pieces is None else num_pieces
+
+    if len(records) > num_pieces:
+        raise ValueError(f"position has {len(records)} pieces, but the snapshot only has room for {num_pieces}")
+
+    snapshot = np.zeros(num_pieces, dtype=SNAPSHOT_DTYPE)
+    snapshot['type'] = EMPTY
+    snapshot[:len(records)] = records
+    return snapshot
+
+def _gather(occupant, tiles):
+    """
+    Look up the occupant of each of the given tiles, in the corresponding
+    position.  `NO_TILE` is mapped to the extra column of `occupant`.
+    """
+    num_positions = occupant.shape[0]
+    positions = np.arange(num_positions).reshape((-1,) + (1,) * (tiles.ndim - 1))
+    return occupant[positions, tiles]
+
+def _build_jump_tiles(board, players, types):
+    """
+    Tabulate the tiles that each type of piece can reach using waypoint moves,
+    for each player and each tile.  Rows are padded with `NO_TILE`.
+    """
+    rows = {}
+
+    for t, type in enumerate(types):
+        for p, player in enumerate(players):
+            tables = [
+                    build_move_table(board, player, x)
+                    for x in type.move_types
+                    if x.xyp_exprs
+            ]
+            for tile in range(board.num_tiles):
+                targets = {int(x) for table in tables for x in table[tile]}
+                rows[t, p, tile] = sorted(targets - {NO_TILE})
+
+    width = max(map(len, rows.values()), default=0)
+    jump_tiles = np.full(
+            (len(types) + 1, len(players), board.num_tiles, width),
+            NO_TILE, dtype=np.int32)
+
+    for key, row in rows.items():
+        jump_tiles[key][:len(row)] = row
+
+    return jump_tiles
+
+def _build_ray_tiles(board, players, types):
+    """
+    Tabulate the tiles along each ray that each type of piece can slide along,
+    for each player and each tile, ignoring any other pieces.  Each ray is
+    padded with `NO_TILE`, as is each list of rays.
+    """
+    num_rays = max(
+            (sum(len(x.xyp_steps) for x in type.move_types) for type in types),
+            default=0,
+    )
+    max_length = max(board.size) - 1
+    ray_tiles = np.full(
+            (len(types) + 1, len(players), board.num_tiles, num_rays, max_length),
+            NO_TILE, dtype=np.int32)
+
+    y, x = np.divmod(np.arange(board.num_tiles), board.width)
+    i = np.arange(1, max_length + 1)
+
+    for t, type in enumerate(types):
+        for p, player in enumerate(players):
+            xyt_steps = [
+                    xyt_from_xyw(player.heading * Vector.from_anything(xyp_step))
+                    for move_type in type.move_types
+                    for xyp_step in move_type.xyp_steps
+            ]
+            for r, (dx, dy) in enumerate(xyt_steps):
+                lengths = board.find_ray_lengths((dx, dy))
+                tiles = (
+                        (y[:, None] + i * dy) * board.width +
+                        (x[:, None] + i * dx)
+                )
+                ray_tiles[t, p, :, r] = np.where(
+                        i <= lengths[:, None], tiles, NO_TILE)
+
+    return ray_tiles
+
+def _build_progress(board, players, types, pattern_names):
+    """
+    Tabulate how close each type of piece is to completing the given patterns,
+    for each player and each tile.
+
+    Progress is 1 minus the distance to the nearest end of a pattern, as a
+    fraction of the size of the board.  Coordinates that the pattern doesn't
+    care about (i.e. `any`) don't count towards the distance.
+    """
+    progress = np.zeros((len(types) + 1, len(players), board.num_tiles))
+    size = max(board.size)
+
+    for t, type in enumerate(types):
+        pattern_types = [x for x in type.pattern_types if x.name in pattern_names]
+        if not pattern_types:
+            continue
+
+        for p, player in enumerate(players):
+            for tile in range(board.num_tiles):
+                probe = _Probe(player, board.xyw_from_tile(tile))
+                distances = [
+                        _find_distance(probe.xyw, xyw_path[-1])
+                        for pattern_type in pattern_types
+                        for xyw_path in xyw_paths_from_xyp_exprs(
+                            pattern_type.xyp_exprs, probe, board, any_ok=True)
+                ]
+                progress[t, p, tile] = max(0, 1 - min(distances) / size)
+
+    return progress
+
+def _find_distance(xyw_from, xyw_to):
+    return max((
+            abs(b - a)
+            for a, b in zip(xyw_from, xyw_to)
+            if not np.isnan(b)
+    ), default=0)
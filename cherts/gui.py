@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 
+import os
 import os.path as os_path
+import re
+import math
 import kxg
 import pyglet
 from pyglet.gl import *
@@ -9,12 +12,41 @@ from more_itertools import flatten, pairwise
 
 from vecrec import Vector, accept_anything_as_vector
 from .actors import BaseActor
+from .camera import Camera
 from .messages import SetupWorld
 
+RESOURCE_DIR = os_path.join(os_path.dirname(__file__), '..', 'resources')
 pyglet.resource.path = [
-        os_path.join(os_path.dirname(__file__), '..', 'resources'),
+        RESOURCE_DIR,
         ]
 
+# There are only images for white and black pieces.  The pieces of any other 
+# player are drawn with the white images, tinted with these colors.
+PLAYER_TINTS = {
+        'red':     (220,  50,  47),
+        'blue':    ( 38, 139, 210),
+        'green':   (133, 153,   0),
+        'yellow':  (181, 137,   0),
+        'purple':  (108, 113, 196),
+        'orange':  (203,  75,  22),
+        'cyan':    ( 42, 161, 152),
+        'magenta': (211,  54, 130),
+        'brown':   (139,  90,  43),
+        'pink':    (255, 150, 180),
+        'gray':    (128, 128, 128),
+        'olive':   (128, 128,   0),
+        'navy':    (  0,  32,  73),
+        'teal':    (  0, 128, 128),
+}
+
+# When the camera is zoomed out far enough, pieces are drawn as plain squares 
+# of these colors instead of as sprites.
+PLACEHOLDER_COLORS = {
+        'white':   (255, 255, 255),
+        'black':   (  0,   0,   0),
+        **PLAYER_TINTS,
+}
+
 class Gui:
 #    - Needs Piece type, positions, possible/legal/current moves, 
 #      possible/legal/current patterns, pattern consequences
@@ -37,33 +69,22 @@ class Gui:
 
         self.batch = pyglet.graphics.Batch()
 
+        # Every sprite in the same layer shares the same group, so that the 
+        # batch can draw each layer with a single set of state changes.
+        self.groups = [pyglet.graphics.OrderedGroup(i) for i in range(2)]
+        self.sprites = SpritePool(self.batch)
+
         self.load_images()
 
-    def load_images(self):
-        """
-        Load the piece images and set the piece codes
+    def load_images(self, px_per_tile=None):
         """
+        Prepare to load the piece images at a resolution suitable for the 
+        given tile size, and set the piece codes.
 
-        pri = pyglet.resource.image # function handle
-        self.images = {
-                # Pieces
-                'piece_kdt': pri('piece_kdt45.png'),
-                'piece_klt': pri('piece_klt45.png'),
-                'piece_qdt': pri('piece_qdt45.png'),
-                'piece_qlt': pri('piece_qlt45.png'),
-                'piece_rdt': pri('piece_rdt45.png'),
-                'piece_rlt': pri('piece_rlt45.png'),
-                'piece_bdt': pri('piece_bdt45.png'),
-                'piece_blt': pri('piece_blt45.png'),
-                'piece_ndt': pri('piece_ndt45.png'),
-                'piece_nlt': pri('piece_nlt45.png'),
-                'piece_pdt': pri('piece_pdt45.png'),
-                'piece_plt': pri('piece_plt45.png'),
-
-                # User interface
-                'selected_circle': pri('selected_circle.png'),
-                'unselected_circle': pri('unselected_circle.png'),
-                }
+        The images themselves are loaded on demand, so only the pieces that 
+        actually appear in the game are loaded.
+        """
+        self.images = ImageAtlas(px_per_tile)
 
         # The three letter codes are [type][color][background]
         self.piece_file_codes = {
@@ -80,36 +101,226 @@ class Gui:
                 # t = transparent background
             }
 
-        # Center images
-        for image in self.images.values():
-            image.anchor_x = image.width / 2
-            image.anchor_y = image.height / 2
-
     def on_refresh_gui(self):
         pyglet.gl.glClearColor(*self.bg_color)
         self.window.clear()
         self.batch.draw()
 
 
+class ImageAtlas:
+    """
+    Load images the first time they're needed, and pack them all into a 
+    single texture.
+
+    Keeping every image in the same texture means that sprites using 
+    different images can be drawn without switching textures.  The piece 
+    images may be available at several resolutions (see 
+    `resources/source_files/export_pieces.py`), in which case the smallest 
+    resolution that's at least as large as a tile is used.
+    """
+
+    # The number of images that might be loaded: 6 piece types, 2 colors, and 
+    # 2 selection circles.  This is used to pick a texture size that will fit 
+    # all of them, but if more images are loaded, another texture will be 
+    # created.
+    expected_num_images = 14
+
+    def __init__(self, px_per_tile=None):
+        self.size = self.pick_size(px_per_tile)
+        self._images = {}
+
+        # Make a square texture with enough room for every image, rounded up to 
+        # a power of two.
+        n = math.ceil(math.sqrt(self.expected_num_images))
+        texture_size = 2**math.ceil(math.log2(n * self.size))
+        self._bin = pyglet.image.atlas.TextureBin(texture_size, texture_size)
+
+    def __getitem__(self, key):
+        try:
+            return self._images[key]
+        except KeyError:
+            image = self._images[key] = self._load_image(key)
+            return image
+
+    def __contains__(self, key):
+        return key in self._images
+
+    def _load_image(self, key):
+        if key.startswith('piece_'):
+            path = f'{key}{self.size}.png'
+        else:
+            path = f'{key}.png'
+
+        with pyglet.resource.file(path) as file:
+            image_data = pyglet.image.load(path, file=file)
+
+        # Leave a 1px border between images, so that neighboring images don't 
+        # bleed into each other when the sprites are scaled.
+        image = self._bin.add(image_data, border=1)
+
+        # Center the image.
+        image.anchor_x = image.width / 2
+        image.anchor_y = image.height / 2
+
+        return image
+
+    @staticmethod
+    def pick_size(px_per_tile):
+        """
+        Return the resolution of the piece images that would be used for the 
+        given tile size.
+        """
+        sizes = sorted(
+                int(m.group(1))
+                for path in os.listdir(RESOURCE_DIR)
+                if (m := re.fullmatch(r'piece_kdt(\d+)\.png', path))
+        )
+        if not px_per_tile:
+            return sizes[0]
+
+        return next((x for x in sizes if x >= px_per_tile), sizes[-1])
+
+
+class SpritePool:
+    """
+    Recycle the sprites belonging to pieces that have been removed from the 
+    world.
+
+    Some patterns create pieces constantly, and allocating a new vertex list 
+    for each one (and freeing it again when the piece is captured) is slow.  
+    Instead, released sprites are hidden and kept in the batch, and then 
+    handed out again the next time a sprite is needed.
+    """
+
+    def __init__(self, batch):
+        self.batch = batch
+        self.num_allocated = 0
+        self.num_reused = 0
+        self._free = []
+
+    @property
+    def num_free(self):
+        return len(self._free)
+
+    def acquire(self, image, x, y, group):
+        if not self._free:
+            self.num_allocated += 1
+            return pyglet.sprite.Sprite(
+                    image,
+                    x=x, y=y,
+                    batch=self.batch,
+                    group=group,
+            )
+
+        self.num_reused += 1
+        sprite = self._free.pop()
+
+        # All of the images are in the same texture atlas, so changing the 
+        # image and group doesn't require a new vertex list unless the group 
+        # actually changes (or the atlas was reloaded at another resolution 
+        # since the sprite was released).
+        sprite.image = image
+        if sprite.group is not group:
+            sprite.group = group
+        sprite.update(x=x, y=y, scale=1)
+        sprite.color = (255, 255, 255)
+        sprite.visible = True
+
+        return sprite
+
+    def release(self, sprite):
+        sprite.visible = False
+        self._free.append(sprite)
+
+
 class GuiActor(BaseActor):
 
     def __init__(self):
         super().__init__()
         self.player = None
         self.selection = None
+        self.camera = None
+        self._camera_version = None
+        self._visible_pieces = set()
+        self._placeholders = None
 
     def on_setup_gui(self, gui):
         self.gui = gui
         self.gui.window.set_handlers(self)
 
+    @kxg.subscribe_to_message(SetupWorld)
+    def on_setup_world(self, message):
+        super().on_setup_world(message)
+
+        # The camera needs to know which player we are, so that it can show 
+        # the board from our side.  Set it up (and load the images) before the 
+        # pieces are added to the world, because each piece makes its sprites 
+        # as soon as it's added.
+        self.camera = Camera.from_config(message.config, self.gui.window_shape)
+        self.fit_board()
+        self.gui.load_images(self.camera.px_per_tile)
+
     def on_draw(self):
+        # The window is drawn while the client is still waiting for the world
+        # to be set up, before there's a board or a camera.
+        if self.camera is None:
+            self.gui.on_refresh_gui()
+            return
+
+        # The world only changes once per tick, but the window may be redrawn 
+        # more often than that.  Put each sprite somewhere between where its 
+        # piece was as of the last two ticks, so that pieces move smoothly.
+        timestep = self.world.timestep
+        alpha = timestep.alpha if timestep else 1
+
+        # Anything that depends on where the camera is (except the sprites, 
+        # which are moved every frame anyway) only needs to be redrawn when the 
+        # camera moves.
+        if self.camera.version != self._camera_version:
+            self._camera_version = self.camera.version
+            self._refresh_images()
+            self.world.board.get_extension(self).redraw()
+            if self.selection:
+                self.selection.get_extension(self).redraw_move_lines()
+
+        # Only pieces that are in view (or close enough that they might be 
+        # drawn partly in view) are updated.  The rest are hidden, which keeps 
+        # them in the batch but makes them free to draw.
+        xyt_min, xyt_max = self.find_visible_xyt_rect(margin=1)
+        visible_pieces = self.world.find_pieces_in_rect(xyt_min, xyt_max)
+
+        if self.camera.use_placeholders:
+            self._draw_placeholders(visible_pieces, alpha)
+            visible_pieces = []
+        else:
+            self._clear_placeholders()
+
+        # Pieces that were removed from the world since the last frame have 
+        # already given their sprites back to the pool.
+        for piece in self._visible_pieces.difference(visible_pieces):
+            if piece.has_extension(self):
+                piece.get_extension(self).set_visible(False)
+
+        for piece in visible_pieces:
+            extension = piece.get_extension(self)
+            extension.set_visible(True)
+            extension.update_sprites(alpha)
+
+        self._visible_pieces = set(visible_pieces)
         self.gui.on_refresh_gui()
 
     def on_key_press(self, symbol, modifiers):
         if symbol == pyglet.window.key.SPACE:
             pass
 
+        # Home to see the whole board again:
+        elif symbol == pyglet.window.key.HOME and self.camera is not None:
+            self.fit_board()
+
     def on_mouse_press(self, xg, yg, button, modifiers):
+        if self.camera is None:
+            return
+
         # Left click to select pieces:
         if button == 1:
             xyw = self.xyw_from_xyg((xg, yg))
@@ -123,6 +334,21 @@ class GuiActor(BaseActor):
     def on_mouse_motion(self, x, y, dx, dy):
         pass
 
+    def on_mouse_drag(self, xg, yg, dxg, dyg, buttons, modifiers):
+        if self.camera is None:
+            return
+
+        # Middle drag to pan:
+        if buttons & pyglet.window.mouse.MIDDLE:
+            self.camera.pan(dxg, dyg)
+
+    def on_mouse_scroll(self, xg, yg, scroll_x, scroll_y):
+        if self.camera is None:
+            return
+
+        # Scroll to zoom, keeping the tile under the mouse in place:
+        self.camera.zoom(scroll_y, (xg, yg))
+
     def select(self, piece):
         """
         Select the given piece.
@@ -145,26 +371,110 @@ class GuiActor(BaseActor):
         This method can safely be called even if no piece is selected.
         """
         if self.selection:
-            self.selection.get_extension(self).on_deselect()
-            self.selection = None
+            selection, self.selection = self.selection, None
+            selection.get_extension(self).on_deselect()
+
+    def fit_board(self):
+        """
+        Zoom the camera so that the whole board is in view.
+        """
+        board = self.world.board
+        corners = [
+                self.player.xyp_from_xyw((0, 0)),
+                self.player.xyp_from_xyw((board.width - 1, board.height - 1)),
+        ]
+        self.camera.fit(
+                (min(x.x for x in corners), min(x.y for x in corners)),
+                (max(x.x for x in corners), max(x.y for x in corners)),
+        )
+
+    def find_visible_xyt_rect(self, margin=0):
+        """
+        Return the corners of the smallest rectangle of tiles (in world 
+        coordinates) that covers everything in view, plus the given number of 
+        tiles on every side.
+        """
+        corners = [
+                self.player.xyw_from_xyp(xyp)
+                for xyp in self.camera.find_visible_xyp_rect(margin)
+        ]
+        return (
+                (int(min(x.x for x in corners)), int(min(x.y for x in corners))),
+                (int(max(x.x for x in corners)), int(max(x.y for x in corners))),
+        )
 
     @accept_anything_as_vector
     def xyg_from_xyw(self, xyw):
         # Convert to player coordinates to make sure our pieces are always 
         # facing forward.
         xyp = self.player.xyp_from_xyw(xyw)
-        xyp_margin = (0.5, 0.5)
-        return (xyp + xyp_margin) * self.px_per_tile
+        return self.camera.xyg_from_xyp(xyp)
         
     @accept_anything_as_vector
     def xyw_from_xyg(self, xyg):
-        xyp_margin = (0.5, 0.5)
-        xyp = (xyg / self.px_per_tile) - xyp_margin
+        xyp = self.camera.xyp_from_xyg(xyg)
         return self.player.xyw_from_xyp(xyp)
 
     @property
     def px_per_tile(self):
-        return self.gui.window_shape.y / self.world.board.height
+        return self.camera.px_per_tile
+
+    def _refresh_images(self):
+        # Only the smallest images that are at least as large as a tile are 
+        # loaded, so zooming in or out far enough calls for a different size.  
+        # The old atlas is freed once none of the sprites refer to it.
+        if ImageAtlas.pick_size(self.px_per_tile) == self.gui.images.size:
+            return
+
+        self.gui.load_images(self.px_per_tile)
+
+        for piece in self.world.iter_pieces():
+            if piece.has_extension(self):
+                piece.get_extension(self).reload_images()
+
+    def _draw_placeholders(self, pieces, alpha):
+        # Draw every piece as a square, all in one vertex list.  The list is 
+        # only reallocated when the number of pieces in view changes.
+        #
+        # This is the path taken when the most pieces are in view, so avoid 
+        # anything that costs a function call per vertex.  The map from world 
+        # to window coordinates is just a scale (possibly negative, depending 
+        # on which side of the board we're on) and an offset.
+        xg0, yg0 = self.xyg_from_xyw((0, 0))
+        xg1, yg1 = self.xyg_from_xyw((1, 1))
+        sx, sy = xg1 - xg0, yg1 - yg0
+        r = 0.35
+        corners = [(-r, -r), (r, -r), (r, r), (-r, r)]
+        v2f = []
+        c3B = []
+
+        for piece in pieces:
+            xw, yw = piece.interpolate_xyw(alpha)
+            for dx, dy in corners:
+                v2f += xg0 + sx * (xw + dx), yg0 + sy * (yw + dy)
+            c3B += 4 * PLACEHOLDER_COLORS.get(piece.player.color, (255, 255, 255))
+
+        n = len(v2f) // 2
+        if self._placeholders and self._placeholders.get_size() != n:
+            self._clear_placeholders()
+
+        if not n:
+            return
+
+        if self._placeholders:
+            self._placeholders.vertices[:] = v2f
+            self._placeholders.colors[:] = c3B
+        else:
+            self._placeholders = self.gui.batch.add(
+                    n, GL_QUADS, self.gui.groups[1],
+                    ('v2f/stream', v2f),
+                    ('c3B/stream', c3B),
+            )
+
+    def _clear_placeholders(self):
+        if self._placeholders:
+            self._placeholders.delete()
+            self._placeholders = None
 
 
 
@@ -173,28 +483,65 @@ class BoardExtension(kxg.TokenExtension):
 
     @kxg.subscribe_to_message(SetupWorld)
     def on_setup_world(self, message):
-        # Normally this kind of setup would happen in `on_add_to_world()`, but 
-        # we can't do that here because:
-        # 
-        # - The board is added to the world before the players.
-        # - The `xyg_from_xyw()` function needs to know what player we are.
-        # 
-        # We can do this setup after the SetupWorld event, because the actor 
-        # creates the player earlier in the handling of that same event.
-
-        w, h = self.token.size
-        d = 0.5
-        xyg_from_xyw = self.actor.xyg_from_xyw
+        # The board is added to the world before the players, and the 
+        # `xyg_from_xyw()` function needs to know what player we are, so 
+        # nothing can be drawn yet.  The actor calls `redraw()` before the first 
+        # frame, and again whenever the camera moves.
+        self.border = None
+        self.walls = None
+
+    def redraw(self):
+        """
+        Outline the tiles that are in view.
 
-        h_lines = [
-                [xyg_from_xyw(-0.5, y-0.5), xyg_from_xyw(w+0.5, y-0.5)]
-                for y in range(h+1)
-        ]
-        v_lines = [
-                [xyg_from_xyw(x-0.5, -0.5), xyg_from_xyw(x-0.5, h+0.5)]
-                for x in range(w+1)
+        On a large board, most of the tiles are usually out of view, so only 
+        drawing the visible ones keeps the number of vertices proportional to 
+        the size of the window rather than the size of the board.  When the 
+        camera is zoomed out far enough that the grid would just be a smear, 
+        only the edges of the board are outlined.
+        """
+        self._delete_vertex_lists()
+
+        board = self.token
+        xyg_from_xyw = self.actor.xyg_from_xyw
+        outline_only = self.actor.camera.use_placeholders
+        (x0, y0), (x1, y1) = self.actor.find_visible_xyt_rect()
+
+        def is_on_board(x, y):
+            tile = board.tile_from_xyt((x, y))
+            return tile is not None and board.kind_from_tile(tile) != board.HOLE
+
+        # Outline every tile that's part of the board (i.e. isn't a hole).  
+        # Each edge is only drawn once, even if it's shared by two tiles.
+        edges = set()
+        walls = []
+
+        for y in range(max(y0, 0), min(y1, board.height - 1) + 1):
+            for x in range(max(x0, 0), min(x1, board.width - 1) + 1):
+                tile = board.tile_from_xyt((x, y))
+                kind = board.kind_from_tile(tile)
+                if kind == board.HOLE:
+                    continue
+
+                neighbor_edges = [
+                        ((x, y-1), ((x, y), (x+1, y))),
+                        ((x, y+1), ((x, y+1), (x+1, y+1))),
+                        ((x-1, y), ((x, y), (x, y+1))),
+                        ((x+1, y), ((x+1, y), (x+1, y+1))),
+                ]
+                edges.update(
+                        edge
+                        for neighbor, edge in neighbor_edges
+                        if not outline_only or not is_on_board(*neighbor)
+                )
+                if kind == board.WALL:
+                    walls.append((x, y))
+
+        xygs = [
+                xyg_from_xyw(x - 0.5, y - 0.5)
+                for edge in sorted(edges)
+                for x, y in edge
         ]
-        xygs = sum(h_lines + v_lines, [])
 
         n = len(xygs)
         v2f = sum((x.tuple for x in xygs), ())
@@ -204,11 +551,35 @@ class BoardExtension(kxg.TokenExtension):
                 n, GL_LINES, None,
                 ('v2f', v2f),
                 ('c3B', c3B),
-        )
+        ) if edges else None
+
+        xygs = [
+                xyg_from_xyw(x + dx, y + dy)
+                for x, y in walls
+                for dx, dy in [(-0.5, -0.5), (0.5, -0.5), (0.5, 0.5), (-0.5, 0.5)]
+        ]
+
+        n = len(xygs)
+        v2f = sum((x.tuple for x in xygs), ())
+        c3B = n * [64, 64, 64]
+
+        self.walls = self.actor.gui.batch.add(
+                n, GL_QUADS, None,
+                ('v2f', v2f),
+                ('c3B', c3B),
+        ) if walls else None
 
     @kxg.watch_token
     def on_remove_from_world(self):
-        self.border.delete()
+        self._delete_vertex_lists()
+
+    def _delete_vertex_lists(self):
+        if self.border:
+            self.border.delete()
+            self.border = None
+        if self.walls:
+            self.walls.delete()
+            self.walls = None
 
 
 class PieceExtension(kxg.TokenExtension):
@@ -218,16 +589,19 @@ class PieceExtension(kxg.TokenExtension):
         type = self.token.type.name
         color = self.token.player.color
 
-        image_key = f"piece_{pc[type]}{pc[color]}t"
+        image_key = f"piece_{pc[type]}{pc.get(color, pc['white'])}t"
         return image_key
 
+    def get_tint(self):
+        return PLAYER_TINTS.get(self.token.player.color, (255, 255, 255))
+
     @kxg.watch_token
     def on_add_to_world(self, world):
 
         # Make sprites
         self.icon_sprite = self._new_sprite(self.get_image_key(), 1)
+        self.icon_sprite.color = self.get_tint()
         self.selected_sprite = self._new_sprite('selected_circle', 0)
-        self.selected_sprite.visible = False
         self.unselected_sprite = self._new_sprite('unselected_circle', 0)
 
         self.sprites = [
@@ -238,34 +612,61 @@ class PieceExtension(kxg.TokenExtension):
 
         self.move_lines = []
 
-        # Rescale the sprite image to match the piece radius
-        icon_w = self.icon_sprite.width
-        icon_h = self.icon_sprite.height
-        icon_r = (icon_w**2 + icon_h**2)**0.5 / 2
+        # The sprites stay hidden until the actor finds the piece in view.
+        self.is_visible = None
+        self.set_visible(False)
 
-        selected_w = self.selected_sprite.width
-        selected_h = self.selected_sprite.height
-        selected_r = (selected_w**2 + selected_h**2)**0.5 / 2
+        self._measure_icon()
 
+    def reload_images(self):
+        """
+        Switch the sprites to the images in the current atlas, e.g. after the 
+        camera zooms far enough for the GUI to load a different resolution.
+        """
+        if not self.sprites:
+            return
+
+        images = self.actor.gui.images
+        self.icon_sprite.image = images[self.get_image_key()]
+        self.selected_sprite.image = images['selected_circle']
+        self.unselected_sprite.image = images['unselected_circle']
+        self._measure_icon()
+
+    def update_sprites(self, alpha):
+        xg, yg = self.actor.xyg_from_xyw(self.token.interpolate_xyw(alpha))
         piece_r = self.actor.px_per_tile * self.token.radius
+        scale = piece_r / self.icon_r
 
-        scale = piece_r / icon_r
-        for sprite in self.sprites:
-            sprite.scale = scale
-        
-    @kxg.watch_token
-    def on_update_game(self, delta_t):
+        # Setting the position and scale together only recalculates the 
+        # vertices once.
         for sprite in self.sprites:
-            sprite.position = self.actor.xyg_from_xyw(self.token.xyw)
+            sprite.update(x=xg, y=yg, scale=scale)
+
+    def set_visible(self, visible):
+        """
+        Show or hide the sprites for this piece, e.g. as it moves in and out 
+        of view.  Only the circle matching the selection state is shown.
+        """
+        if visible == self.is_visible:
+            return
+
+        self.is_visible = visible
+        self._refresh_visibility()
 
     def on_select(self):
         info(f"selecting piece: {self.token}")
-        self.selected_sprite.visible = True
-        self.unselected_sprite.visible = False
+        self._refresh_visibility()
+        self.redraw_move_lines()
 
-        self.move_lines = []
+    def on_deselect(self):
+        info(f"deselecting piece: {self.token}")
+        self._refresh_visibility()
+        self._delete_move_lines()
 
-        for move in self.token.find_possible_moves():
+    def redraw_move_lines(self):
+        self._delete_move_lines()
+
+        for move in self.token.find_legal_moves():
             xyw_waypoints = [self.token.xyw, *move.xyw_path]
             xygs = [
                     self.actor.xyg_from_xyw(v)
@@ -283,36 +684,52 @@ class PieceExtension(kxg.TokenExtension):
             )
             self.move_lines.append(line)
 
-    def on_deselect(self):
-        info(f"deselecting piece: {self.token}")
-        self.selected_sprite.visible = False
-        self.unselected_sprite.visible = True
-
-        for line in self.move_lines:
-            line.delete()
-
     @kxg.watch_token
     def on_remove_from_world(self):
         for sprite in self.sprites:
-            sprite.delete()
+            self.actor.gui.sprites.release(sprite)
+
+        # The released sprites may be handed out to another piece, so make 
+        # sure this extension doesn't touch them again.
+        self.sprites = []
+        self._delete_move_lines()
+
+    def _refresh_visibility(self):
+        if not self.sprites:
+            return
+
+        is_selected = self.actor.selection is self.token
+        self.icon_sprite.visible = self.is_visible
+        self.selected_sprite.visible = self.is_visible and is_selected
+        self.unselected_sprite.visible = self.is_visible and not is_selected
+
+    def _measure_icon(self):
+        # Remember the size of the icon image, so the sprites can be rescaled 
+        # to match the piece radius whenever the camera zooms.
+        image = self.icon_sprite.image
+        self.icon_r = (image.width**2 + image.height**2)**0.5 / 2
+
+    def _delete_move_lines(self):
+        for line in self.move_lines:
+            line.delete()
+        self.move_lines = []
 
     def _new_sprite(self, image_key, group_num=1, **sprite_kwargs):
         """
         Create a new sprite object with some common (but cluttering) parameters 
         prefilled. 
         'image_key' is the key for the image dict defined in the gui.
-        'group_num' is the pyglet OrderedGroup number
-        'sprite_kwargs' are passed directly to Sprite constructor
+        'group_num' is the index of the shared OrderedGroup (i.e. layer)
+        'sprite_kwargs' are passed directly to Sprite.update()
         """
 
         xg, yg = self.actor.xyg_from_xyw(self.token.xyw)
-        sprite = pyglet.sprite.Sprite(
+        sprite = self.actor.gui.sprites.acquire(
                 self.actor.gui.images[image_key],
                 x=xg, y=yg,
-                batch=self.actor.gui.batch,
-                group=pyglet.graphics.OrderedGroup(group_num),
-                **sprite_kwargs,
+                group=self.actor.gui.groups[group_num],
         )
+        sprite.update(**sprite_kwargs)
 
         return sprite
 
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+
+"""\
+Host many multiplayer matches in a single process.
+
+Each match is an ordinary kxg server game (a world, a referee, and one
+`kxg.ServerActor` for each client), but instead of every match getting its own
+process and its own blocking game loop, all of the matches share one asyncio
+event loop.  Client connections are multiplexed over non-blocking sockets, and
+each match schedules its own ticks, yielding to the other matches in between.
+"""
+
+import time
+import errno
+import socket
+import asyncio
+import multiprocessing
+import kxg
+import linersock
+
+from nonstdlib import info, warning, error
+from .world import World
+from .referee import Referee
+from .config import load_config
+from .rules import RuleBook
+
+# The most data that can be waiting to be sent to a client before it's
+# disconnected.
+MAX_WRITE_BUFFER_BYTES = 1024 * 1024
+
+def main(argv=None):
+    """\
+Host any number of two-player matches in one process.
+
+Clients connect with `cherts client`.  Every two clients to connect are paired
+up into a new match.
+
+Usage:
+    cherts host [options]
+    cherts host --load-test [options]
+
+Options:
+    -H --host HOST          [default: {host}]
+        The address to listen on.
+
+    -p --port PORT          [default: {port}]
+        The port to listen on.
+
+    -r --tick-rate HZ       [default: 20]
+        The number of times per second to update each match.
+
+    -l --load-test
+        Instead of waiting for real clients, play increasing numbers of
+        simultaneous matches against simulated clients, and report how many
+        can be sustained at the given tick rate.
+
+    -m --max-matches NUM    [default: 512]
+        The largest number of simultaneous matches to try in the load test.
+
+    -t --duration SEC       [default: 5]
+        How long to measure each number of matches for in the load test.
+"""
+    import docopt
+
+    usage = main.__doc__.format(
+            host=kxg.quickstart.DEFAULT_HOST,
+            port=kxg.quickstart.DEFAULT_PORT,
+    )
+    args = docopt.docopt(usage.strip(), argv)
+    config = load_config()
+    tick_rate = float(args['--tick-rate'])
+
+    if args['--load-test']:
+        coroutine = run_load_test(
+                config,
+                tick_rate=tick_rate,
+                max_matches=int(args['--max-matches']),
+                duration_sec=float(args['--duration']),
+        )
+    else:
+        coroutine = serve(
+                config,
+                args['--host'],
+                int(args['--port']),
+                tick_rate=tick_rate,
+        )
+
+    try:
+        asyncio.run(coroutine)
+    except KeyboardInterrupt:
+        pass
+
+async def serve(config, host, port, *, tick_rate):
+    match_host = MatchHost(config, tick_rate=tick_rate)
+    await match_host.start(host, port)
+    info(f"hosting matches on {host}:{match_host.port}")
+    await match_host.serve_forever()
+
+class MatchHost:
+    """
+    Accept connections, pair them up into matches, and play every match
+    concurrently in the current event loop.
+
+    The rule tables (see `rules.RuleBook`) are built once, when the host is 
+    created, and every match shares them.
+    """
+
+    def __init__(self, config, *, tick_rate=20, players_per_match=2):
+        self.config = config
+        self.rules = RuleBook.from_config(config, players_per_match)
+        self.tick_rate = tick_rate
+        self.players_per_match = players_per_match
+        self.matches = set()
+        self._lobby = []
+        self._server = None
+        self._tasks = set()
+
+    @property
+    def port(self):
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self, host, port):
+        self._server = await asyncio.start_server(
+                self._on_client_connected, host, port)
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        for pipe in self._lobby:
+            pipe.close()
+
+    def start_match(self, pipes):
+        match = Match(
+                self.config,
+                pipes,
+                tick_rate=self.tick_rate,
+                rules=self.rules,
+        )
+        task = asyncio.create_task(self._play_match(match))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return match
+
+    async def _play_match(self, match):
+        self.matches.add(match)
+        try:
+            await match.play()
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            # One broken match shouldn't bring down every other match.
+            error(f"{match!r} crashed: {err!r}")
+        finally:
+            match.close()
+            self.matches.discard(match)
+
+    async def _on_client_connected(self, reader, writer):
+        pipe = open_stream_pipe(reader, writer)
+        info(f"client connected: {pipe}")
+
+        # Nothing reads from the pipes in the lobby, so ask the sockets 
+        # whether the clients are still there.
+        self._lobby = [x for x in self._lobby if not x.socket.is_disconnected()]
+        self._lobby.append(pipe)
+
+        n = self.players_per_match
+        while len(self._lobby) >= n:
+            pipes, self._lobby = self._lobby[:n], self._lobby[n:]
+            self.start_match(pipes)
+
+class Match:
+    """
+    A single game between remote clients, updated at a fixed tick rate.
+    """
+
+    def __init__(self, config, pipes, *, tick_rate, rules=None):
+        self.world = World(rules)
+        self.referee = Referee(config)
+        self.pipes = pipes
+        self.dt_sec = 1 / tick_rate
+        self.num_ticks = 0
+        self.num_late_ticks = 0
+
+        stage = kxg.MultiplayerServerGameStage(
+                self.world, self.referee, [], pipes)
+        self.theater = kxg.Theater(stage)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(clients={self.pipes})'
+
+    async def play(self):
+        """
+        Update the match until it ends, sleeping between ticks so that the
+        other matches can be updated.
+
+        If a tick finishes late (i.e. the event loop is overloaded), the next
+        tick starts immediately, but the match doesn't try to catch up on the
+        ticks it missed.
+        """
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+
+        while not self.theater.is_finished:
+            if any(x.finished() for x in self.pipes):
+                warning(f"client disconnected; ending {self!r}")
+                self.theater.exit()
+                break
+
+            self.theater.update(self.dt_sec)
+            self.num_ticks += 1
+
+            next_tick += self.dt_sec
+            delay = next_tick - loop.time()
+
+            if delay < 0:
+                self.num_late_ticks += 1
+                next_tick = loop.time()
+                delay = 0
+
+            await asyncio.sleep(delay)
+
+    def close(self):
+        for pipe in self.pipes:
+            pipe.close()
+
+class StreamSocket:
+    """
+    Make a pair of asyncio streams look like the non-blocking socket that
+    `linersock.Pipe` expects, so that a pipe can be used with asyncio.
+
+    The pipe handles all of the framing and serialization, so ordinary kxg
+    clients can connect, and the kxg server actors can use the pipe
+    unchanged.  Incoming data is read by a background task as soon as it
+    arrives, and `recv()` hands it over the next time the pipe asks.
+    Outgoing data is handed to the asyncio transport, which sends it whenever
+    the socket is ready.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.incoming = bytearray()
+
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self._read_task = asyncio.create_task(self._read_forever())
+
+    def getsockname(self):
+        return self.writer.get_extra_info('sockname')
+
+    def getpeername(self):
+        return self.writer.get_extra_info('peername')
+
+    def setblocking(self, flag):
+        # The streams never block.
+        pass
+
+    def recv(self, max_bytes):
+        if not self.incoming:
+            if self._read_task.done():
+                return b''
+            raise BlockingIOError(errno.EAGAIN, "no data yet")
+
+        data = bytes(self.incoming[:max_bytes])
+        del self.incoming[:max_bytes]
+        return data
+
+    def is_disconnected(self):
+        return self._read_task.done()
+
+    def send(self, data):
+        # Quietly drop anything sent after the connection was closed.  The 
+        # pipe will find out that it's finished the next time it's read from.
+        if self.writer.is_closing():
+            return len(data)
+
+        self.writer.write(data)
+
+        # Clients that stop reading would otherwise make the server buffer 
+        # everything sent to them for as long as the match lasts.  Pretend 
+        # the connection was closed by the other end, so the pipe reports 
+        # that it's finished the next time it's read from.
+        if self.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER_BYTES:
+            warning(f"client {self.getpeername()} isn't keeping up; disconnecting")
+            self.close()
+
+        return len(data)
+
+    def close(self):
+        self._read_task.cancel()
+        self.writer.close()
+
+    async def _read_forever(self):
+        try:
+            while data := await self.reader.read(65536):
+                self.incoming += data
+        except ConnectionError:
+            pass
+
+def open_stream_pipe(reader, writer):
+    """
+    Return a `linersock.Pipe` that communicates using the given asyncio
+    streams.  See `StreamSocket`.
+    """
+    return linersock.Pipe(StreamSocket(reader, writer))
+
+async def run_load_test(config, *, tick_rate, max_matches, duration_sec):
+    """
+    Find how many simultaneous matches this process can keep up with.
+
+    The number of matches is doubled until the matches can no longer be
+    updated at (nearly) the requested tick rate.  Each match is played between 
+    two ordinary kxg clients controlled by the AI.  The clients run in a 
+    separate process, and the reported CPU usage only counts the host process.  
+    Note that if there's only one core available, the clients compete with the 
+    host for it, so the number of sustainable matches will be underestimated.
+    """
+    print(f"target: {tick_rate:g} ticks/s per match")
+    print("matches  ticks/s  late  cpu")
+
+    num_matches = 1
+    sustained = 0
+    cpu_fraction = 0
+
+    while num_matches <= max_matches:
+        stats = await _measure_load(config, num_matches, tick_rate, duration_sec)
+        ok = stats['ticks_per_sec'] >= 0.95 * tick_rate
+
+        print("{:>7}  {:>7.1f}  {:>4.0%}  {:>3.0%}{}".format(
+            num_matches,
+            stats['ticks_per_sec'],
+            stats['late_fraction'],
+            stats['cpu_fraction'],
+            '' if ok else '  (not sustained)',
+        ))
+
+        if not ok:
+            break
+
+        sustained = num_matches
+        cpu_fraction = stats['cpu_fraction']
+        num_matches *= 2
+
+    print(f"sustained {sustained} simultaneous matches at {tick_rate:g} ticks/s")
+
+    # Extrapolate from the host's own CPU usage, which is more meaningful than 
+    # the number of sustained matches when the clients and the host share a 
+    # core.
+    if cpu_fraction:
+        print(f"estimated capacity: {sustained / cpu_fraction:.0f} matches per core")
+
+    return sustained
+
+async def _measure_load(config, num_matches, tick_rate, duration_sec):
+    match_host = MatchHost(config, tick_rate=tick_rate)
+    await match_host.start('127.0.0.1', 0)
+
+    num_clients = num_matches * match_host.players_per_match
+    clients = multiprocessing.Process(
+            target=_run_load_clients,
+            args=(match_host.port, num_clients, tick_rate),
+            daemon=True,
+    )
+    clients.start()
+
+    try:
+        start = time.perf_counter()
+        while len(match_host.matches) < num_matches:
+            if not clients.is_alive() or time.perf_counter() - start > 60:
+                raise RuntimeError(f"only {len(match_host.matches)}/{num_matches} matches started")
+            await asyncio.sleep(0.01)
+
+        # Don't count the time it takes to setup the worlds.
+        await asyncio.sleep(1)
+
+        matches = list(match_host.matches)
+        ticks_before = [(x.num_ticks, x.num_late_ticks) for x in matches]
+        cpu_before = time.process_time()
+        wall_before = time.perf_counter()
+
+        await asyncio.sleep(duration_sec)
+
+        wall_sec = time.perf_counter() - wall_before
+        cpu_sec = time.process_time() - cpu_before
+        num_ticks = sum(x.num_ticks - n for x, (n, _) in zip(matches, ticks_before))
+        num_late = sum(x.num_late_ticks - n for x, (_, n) in zip(matches, ticks_before))
+
+    finally:
+        clients.terminate()
+        clients.join()
+        await match_host.close()
+
+    return {
+            'ticks_per_sec': num_ticks / num_matches / wall_sec,
+            'late_fraction': num_late / num_ticks if num_ticks else 0,
+            'cpu_fraction': cpu_sec / wall_sec,
+    }
+
+def _run_load_clients(port, num_clients, tick_rate):
+    from .ai import AiActor
+
+    theaters = []
+    for _ in range(num_clients):
+        sock = socket.create_connection(('127.0.0.1', port))
+        pipe = linersock.Pipe(sock)
+        stage = kxg.MultiplayerClientGameStage(World(), AiActor(), pipe)
+        theaters.append(kxg.Theater(stage))
+
+    dt_sec = 1 / tick_rate
+
+    while True:
+        start = time.perf_counter()
+
+        for theater in theaters:
+            if not theater.is_finished:
+                theater.update(dt_sec)
+
+        time.sleep(max(0, dt_sec - (time.perf_counter() - start)))
@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+
+"""\
+Deterministic lockstep simulation.
+
+In lockstep mode, every peer runs the complete simulation, and the only thing
+sent over the network is what each player decided to do on each tick.  This
+only works if every peer's simulation is exactly the same, so the rules
+applied here are fully deterministic:
+
+- The world advances in whole ticks, never by a measured amount of time.
+- Pieces always sit on whole tiles, and commands refer to tiles by their
+  packed integer index.  Cooldowns are counted in ticks.
+- Commands are applied in a fixed order: by tick, then by player, then in the
+  order they were issued.  Pieces are always iterated in order of id.
+
+Each peer periodically includes a checksum of its state in the batch it sends,
+so that any divergence between the simulations is detected right away.  The
+amount of data exchanged each tick depends only on the number of commands
+issued, not on the number of pieces.
+"""
+
+import math
+import struct
+import zlib
+import kxg
+
+from collections import namedtuple
+from .world import World, Player
+from .config import (
+        load_board, load_move_types, load_pattern_types, load_piece_types,
+        load_initial_pieces,
+)
+
+# Wire format
+# ===========
+# Each peer sends one batch per tick, even if it has no commands.  All integers
+# are little-endian.
+#
+# header:   tick (u32), player actor id (u8), number of commands (u16), flags
+#           (u8)
+# checksum: only present if `flags & HAS_CHECKSUM`.  The tick the checksum was
+#           taken on (u32), CRC-32 of the state at the start of that tick (u32)
+# command:  piece id (u32), target tile (u32)
+#
+# Snapshots (see `LockstepSimulation.snapshot()`) use a similar format, but are
+# never sent over the network.
+#
+# header:   tick (u32)
+# piece:    piece id (u32), player actor id (u8), tile (i32, -1 if the piece
+#           isn't on the board), remaining cooldown in ticks (u32)
+
+HEADER_STRUCT = struct.Struct('<IBHB')
+CHECKSUM_STRUCT = struct.Struct('<II')
+COMMAND_STRUCT = struct.Struct('<II')
+TICK_STRUCT = struct.Struct('<I')
+PIECE_STATE_STRUCT = struct.Struct('<IBiI')
+
+HAS_CHECKSUM = 0x01
+MAX_COMMANDS = 2**16 - 1
+
+class LockstepError(Exception):
+    pass
+
+class DesyncError(LockstepError):
+    pass
+
+MoveCommand = namedtuple('MoveCommand', 'piece_id tile')
+
+class CommandBatch:
+    """
+    Every command one player issued for a particular tick.
+    """
+
+    def __init__(self, tick, player_id, commands=(), checksum=None):
+        self.tick = tick
+        self.player_id = player_id
+        self.commands = list(commands)
+        self.checksum = checksum
+
+    def __repr__(self):
+        cls = self.__class__.__name__
+        return f'{cls}(tick={self.tick}, player_id={self.player_id}, commands={self.commands})'
+
+    def pack(self):
+        if len(self.commands) > MAX_COMMANDS:
+            raise ValueError(f"can't send more than {MAX_COMMANDS} commands in one tick, got {len(self.commands)}")
+
+        flags = HAS_CHECKSUM if self.checksum else 0
+        parts = [HEADER_STRUCT.pack(
+                self.tick, self.player_id, len(self.commands), flags)]
+
+        if self.checksum:
+            parts.append(CHECKSUM_STRUCT.pack(*self.checksum))
+        for command in self.commands:
+            parts.append(COMMAND_STRUCT.pack(*command))
+
+        return b''.join(parts)
+
+    @classmethod
+    def unpack(cls, packet):
+        tick, player_id, num_commands, flags = HEADER_STRUCT.unpack_from(packet, 0)
+        offset = HEADER_STRUCT.size
+        checksum = None
+
+        if flags & HAS_CHECKSUM:
+            checksum = CHECKSUM_STRUCT.unpack_from(packet, offset)
+            offset += CHECKSUM_STRUCT.size
+
+        commands = []
+        for _ in range(num_commands):
+            commands.append(MoveCommand(*COMMAND_STRUCT.unpack_from(packet, offset)))
+            offset += COMMAND_STRUCT.size
+
+        if offset != len(packet):
+            raise ValueError(f"command batch has {len(packet) - offset} unexpected trailing bytes")
+
+        return cls(tick, player_id, commands, checksum)
+
+class LockstepSimulation:
+    """
+    Advance a world one tick at a time, given every player's commands for
+    that tick.
+    """
+
+    def __init__(self, world, *, tick_rate):
+        self.world = world
+        self.tick = 0
+        self.tick_rate = tick_rate
+        self._cooldown_ticks = {}
+
+        # Pieces are never created during a lockstep game, only captured, so 
+        # every piece that a snapshot could refer to is already in the world.  
+        # Keep them around after they're captured, so they can be put back.
+        self._pieces_by_id = {x.id: x for x in world.iter_pieces()}
+
+    @property
+    def dt_sec(self):
+        return 1 / self.tick_rate
+
+    def apply(self, batches):
+        """
+        Execute the given command batches, which must include exactly one
+        batch from each player for the current tick, then advance to the next
+        tick.
+
+        Commands that aren't legal (e.g. because the piece was captured
+        earlier in the same tick) are ignored.  Every peer ignores the same
+        commands, so this doesn't cause a desync.
+        """
+        batches = sorted(batches, key=lambda x: x.player_id)
+
+        if any(x.tick != self.tick for x in batches):
+            raise LockstepError(f"expected batches for tick {self.tick}, got {batches}")
+
+        with self.world._unlock_temporarily():
+            for batch in batches:
+                for command in batch.commands:
+                    self._execute(batch.player_id, command)
+
+            self._update_cooldowns()
+
+        self.tick += 1
+
+    def checksum(self):
+        """
+        Return a CRC-32 of the state of every piece.
+        """
+        return zlib.crc32(self.snapshot())
+
+    def snapshot(self):
+        """
+        Return the state of the simulation as a compact byte string.
+
+        The snapshot only records what can change during a lockstep game: 
+        which pieces are still in play, where they are, and how long until 
+        they can move again.  Everything else (e.g. the board and the piece 
+        types) is assumed to stay the same.
+        """
+        cooldown_ticks = self._cooldown_ticks
+        return b''.join([
+                TICK_STRUCT.pack(self.tick),
+                *(
+                    PIECE_STATE_STRUCT.pack(
+                        piece.id,
+                        piece.player.id,
+                        piece.tile if piece.tile is not None else -1,
+                        cooldown_ticks.get(piece.id, 0),
+                    )
+                    for piece in self.world.iter_pieces()
+                ),
+        ])
+
+    def restore(self, snapshot):
+        """
+        Put the simulation back into the state described by the given 
+        snapshot (see `snapshot()`).
+
+        Only the pieces that differ from the snapshot are touched, so 
+        restoring a recent snapshot is much cheaper than building the world 
+        again.  The restored pieces keep the same ids, so commands that refer 
+        to them remain valid.
+        """
+        world = self.world
+        board = world.board
+        tick, = TICK_STRUCT.unpack_from(snapshot)
+        states = {
+                id: (tile, cooldown_ticks)
+                for id, _, tile, cooldown_ticks
+                in PIECE_STATE_STRUCT.iter_unpack(
+                    memoryview(snapshot)[TICK_STRUCT.size:])
+        }
+
+        with world._unlock_temporarily():
+            for piece in list(world.iter_pieces()):
+                if piece.id not in states:
+                    self._cooldown_ticks.pop(piece.id, None)
+                    piece.player.lose_piece(piece)
+                    world._remove_token(piece)
+
+            for id, (tile, cooldown_ticks) in states.items():
+                piece = self._pieces_by_id[id]
+
+                if id not in world:
+                    piece.set_xyw(board.xyw_from_tile(tile))
+                    piece.player.gain_piece(piece)
+                    _add_token(world, piece, kxg.IdFactory(id, 0))
+                elif piece.tile != tile:
+                    piece.set_xyw(board.xyw_from_tile(tile))
+
+                if self._cooldown_ticks.get(id, 0) != cooldown_ticks:
+                    self._set_cooldown_ticks(piece, cooldown_ticks)
+
+        self.tick = tick
+
+    def _execute(self, player_id, command):
+        world = self.world
+
+        if command.piece_id not in world:
+            return
+
+        piece = world.get_token(command.piece_id)
+
+        if getattr(piece, 'player', None) is not world.get_token(player_id):
+            return
+        if self._cooldown_ticks.get(piece.id, 0):
+            return
+        if command.tile not in world.find_reachable_tiles(piece):
+            return
+
+        occupant = world.find_piece_on_tile(command.tile)
+        if occupant is not None:
+            if occupant.player is piece.player:
+                return
+            # Forget the cooldown before removing the piece, because removing 
+            # it from the world also takes away its id.
+            self._cooldown_ticks.pop(occupant.id, None)
+            occupant.player.lose_piece(occupant)
+            world._remove_token(occupant)
+
+        piece.set_xyw(world.board.xyw_from_tile(command.tile))
+
+        cooldown_ticks = math.ceil(piece.type.cooldown_sec * self.tick_rate)
+        self._set_cooldown_ticks(piece, cooldown_ticks)
+
+    def _update_cooldowns(self):
+        for id, ticks in list(self._cooldown_ticks.items()):
+            self._set_cooldown_ticks(self.world.get_token(id), ticks - 1)
+
+    def _set_cooldown_ticks(self, piece, ticks):
+        if ticks > 0:
+            self._cooldown_ticks[piece.id] = ticks
+        else:
+            self._cooldown_ticks.pop(piece.id, None)
+
+        # Derive the cooldown in seconds from the number of ticks, rather than
+        # accumulating floating point error by subtracting `dt` every tick.
+        piece.set_cooldown_sec(max(ticks, 0) / self.tick_rate)
+
+class LockstepPeer:
+    """
+    One player's end of a lockstep session.
+
+    Each tick, call `queue_command()` for anything the player wants to do,
+    `end_tick()` to get the packet to send to the other peers, `receive()`
+    for every packet that arrives, and `advance()` to run the simulation as
+    far as the commands received so far allow.
+    """
+
+    def __init__(self, simulation, player_id, *, player_ids=Player.ACTOR_IDS,
+            input_delay_ticks=3, checksum_interval_ticks=20):
+
+        self.simulation = simulation
+        self.player_id = player_id
+        self.player_ids = tuple(player_ids)
+        self.input_delay_ticks = input_delay_ticks
+        self.checksum_interval_ticks = checksum_interval_ticks
+        self.num_bytes_sent = 0
+
+        self._queued_commands = []
+        self._next_tick_to_send = input_delay_ticks
+        self._checksums = {}
+        self._remote_checksums = {}
+
+        # Nobody can issue commands for the first few ticks, because there
+        # wouldn't be time for them to reach the other peers.
+        self._batches = {
+                tick: {id: CommandBatch(tick, id) for id in self.player_ids}
+                for tick in range(input_delay_ticks)
+        }
+
+    @property
+    def tick(self):
+        return self.simulation.tick
+
+    def queue_command(self, command):
+        self._queued_commands.append(command)
+
+    def end_tick(self):
+        """
+        Package up the commands queued since the last call, and return the
+        packet that should be sent to every other peer.
+        """
+        checksum = None
+        if self.tick % self.checksum_interval_ticks == 0:
+            checksum = self.tick, self._take_checksum()
+
+        batch = CommandBatch(
+                self._next_tick_to_send,
+                self.player_id,
+                self._queued_commands,
+                checksum,
+        )
+        self._queued_commands = []
+        self._next_tick_to_send += 1
+        self._add_batch(batch)
+
+        packet = batch.pack()
+        self.num_bytes_sent += len(packet)
+        return packet
+
+    def receive(self, packet):
+        batch = CommandBatch.unpack(packet)
+
+        if batch.player_id not in self.player_ids or batch.player_id == self.player_id:
+            raise LockstepError(f"unexpected batch from player {batch.player_id}")
+
+        self._add_batch(batch)
+
+        if batch.checksum:
+            tick, checksum = batch.checksum
+            self._remote_checksums[tick, batch.player_id] = checksum
+            self._compare_checksums()
+
+    def can_advance(self):
+        # Don't get ahead of the local player: the simulation can only advance
+        # past ticks for which `end_tick()` has been called.
+        if self.tick >= self._next_tick_to_send - self.input_delay_ticks:
+            return False
+
+        return len(self._batches.get(self.tick, ())) == len(self.player_ids)
+
+    def advance(self):
+        """
+        Simulate every tick for which all players' commands have arrived, and
+        return the number of ticks simulated.
+        """
+        num_ticks = 0
+
+        while self.can_advance():
+            self.simulation.apply(self._batches.pop(self.tick).values())
+            num_ticks += 1
+
+        return num_ticks
+
+    def _add_batch(self, batch):
+        if batch.tick < self.tick:
+            raise LockstepError(f"received {batch!r} after tick {batch.tick} was simulated")
+
+        batches = self._batches.setdefault(batch.tick, {})
+        if batch.player_id in batches:
+            raise LockstepError(f"received two batches from player {batch.player_id} for tick {batch.tick}")
+
+        batches[batch.player_id] = batch
+
+    def _take_checksum(self):
+        checksum = self._checksums[self.tick] = self.simulation.checksum()
+        self._compare_checksums()
+        return checksum
+
+    def _compare_checksums(self):
+        for (tick, player_id), remote in list(self._remote_checksums.items()):
+            if tick not in self._checksums:
+                continue
+
+            del self._remote_checksums[tick, player_id]
+            if remote != self._checksums[tick]:
+                raise DesyncError(f"player {player_id} diverged from player {self.player_id} on tick {tick}")
+
+        # Once everyone's checksums for a tick have been compared, there's no
+        # need to remember ours.
+        pending = {tick for tick, _ in self._remote_checksums}
+        for tick in list(self._checksums):
+            if tick < self.tick - self.input_delay_ticks - self.checksum_interval_ticks and tick not in pending:
+                del self._checksums[tick]
+
+def build_world(config, position=None, num_players=2, rules=None):
+    """
+    Create a world that's been setup according to the given config, without
+    using any messages.
+
+    Every peer in a lockstep session builds its own world this way, and gets
+    exactly the same result, including the ids of every token.  If a
+    `notation.Position` is given, the pieces are placed as it describes,
+    instead of as described by the `[setup]` config section.  If given, 
+    *rules* should be a `RuleBook` built from the same config.
+    """
+    if position is not None and position.num_players > num_players:
+        raise ValueError(f"position has pieces for {position.num_players} players, but the world only has {num_players}")
+
+    world = World(rules)
+    world._set_actors([])
+
+    # Each player's id is the same as the id of the actor controlling it, so
+    # the batches can refer to players by id.  Every other token is numbered
+    # in order after that.
+    actor_ids = Player.find_actor_ids(num_players)
+    ids = kxg.IdFactory(max(actor_ids) + 1, 1)
+
+    board = load_board(config)
+    move_types = load_move_types(config)
+    pattern_types = load_pattern_types(config)
+    piece_types = load_piece_types(config, move_types, pattern_types)
+
+    with world._unlock_temporarily():
+        world.setup(
+                board,
+                move_types=move_types,
+                pattern_types=pattern_types,
+                piece_types=piece_types,
+                config=config,
+                num_players=num_players,
+        )
+        tokens = [
+                board,
+                *_sorted_by_name(move_types),
+                *_sorted_by_name(pattern_types),
+                *_sorted_by_name(piece_types),
+        ]
+        for token in tokens:
+            _add_token(world, token, ids)
+
+        for index, actor_id in enumerate(actor_ids):
+            player = Player.from_actor_id(actor_id, board, num_players)
+            if position is None:
+                pieces = load_initial_pieces(config, player, piece_types)
+            else:
+                pieces = position.make_pieces(
+                        index, player, piece_types, move_types)
+            player.gain_pieces(pieces)
+
+            _add_token(world, player, kxg.IdFactory(actor_id, 0))
+            for piece in pieces:
+                _add_token(world, piece, ids)
+
+                # Pieces from a position may be in the middle of a move, and 
+                # the move has to be in the world too, so that it has an id 
+                # that can be synced and recorded.
+                if piece.current_move is not None:
+                    _add_token(world, piece.current_move, ids)
+
+            world.add_player(player)
+
+    return world
+
+def _sorted_by_name(types):
+    return [types[k] for k in sorted(types)]
+
+def _add_token(world, token, ids):
+    # This does the same thing as `kxg.Token._give_id()` and 
+    # `kxg.World._add_token()`, but without their logging and sanity checks.  
+    # The logger inspects the whole stack for every message (even if the 
+    # message is never shown), which took more than 80% of the time it takes 
+    # to build a world.  Every token here is new, so the checks can't fail.
+    token._id = ids.next()
+    world._tokens[token.id] = token
+    token._add_to_world(world, world._actors)
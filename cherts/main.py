@@ -1,9 +1,26 @@
 #!/usr/bin/env python3
 
+import sys
 import kxg
 import cherts
 
 def main():
+    # Subcommands that don't play an interactive game are handled by cherts 
+    # itself.  Everything else is handled by the kxg game engine.
+    subcommands = {
+            'tournament': 'cherts.tournament',
+            'memcheck': 'cherts.memcheck',
+            'profile': 'cherts.profiling',
+            'host': 'cherts.host',
+            'notation': 'cherts.notation',
+    }
+    argv = sys.argv[1:]
+
+    if argv and argv[0] in subcommands:
+        from importlib import import_module
+        module = import_module(subcommands[argv[0]])
+        return module.main(argv)
+
     kxg.quickstart.main(
             cherts.World,
             cherts.Referee,
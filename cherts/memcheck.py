@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+import gc
+import random
+import tracemalloc
+import kxg
+
+from collections import Counter
+from .config import load_config
+from .tournament import play_headless_match
+
+def main(argv=None):
+    """\
+Simulate a long headless game, and fail if memory use grows too much.
+
+The game is driven by a script that does what the GUI and AI do every tick:
+ask for the possible moves of every piece, and occasionally move one.  Memory
+use (according to `tracemalloc`) and the number of live tokens of each class
+are sampled throughout the game.  Growth is measured from the end of the
+warmup period and compared to the budget in the `[memcheck]` config section.
+
+Usage:
+    cherts memcheck <minutes> [<config>] [options]
+
+Arguments:
+    <minutes>
+        The amount of game time to simulate.
+
+    <config>
+        A TOML file with settings that should override the default config.
+
+Options:
+    -d --dt SEC             [default: 0.05]
+        The amount of game time that passes each tick.
+
+    -s --seed NUM           [default: 0]
+        The random seed for the scripted session.
+
+    -n --top NUM            [default: 10]
+        The number of allocating call sites to report.
+
+    -b --budget KIB
+        The amount of memory growth to allow, instead of the budget given in
+        the config.
+"""
+    import docopt
+
+    args = docopt.docopt(main.__doc__.strip(), argv)
+    config = load_config(*([args['<config>']] if args['<config>'] else []))
+    params = config['memcheck']
+
+    if args['--budget']:
+        params['budget_kib'] = float(args['--budget'])
+
+    random.seed(int(args['--seed']))
+    dt_sec = float(args['--dt'])
+    check = MemoryCheck(params)
+
+    def on_tick(world):
+        exercise_world(world)
+        check.on_update_game(world, dt_sec)
+
+    check.start()
+    try:
+        world, elapsed_sec = play_headless_match(
+                config,
+                time_limit_sec=60 * float(args['<minutes>']),
+                dt_sec=dt_sec,
+                on_tick=on_tick,
+        )
+        check.finish(world)
+    finally:
+        check.stop()
+
+    print(check.format(int(args['--top'])))
+    return 0 if check.passed else 1
+
+def exercise_world(world):
+    """
+    Do the same things to the world that the GUI and AI would do each tick.
+    """
+    if world.board is None:
+        return
+
+    world.find_possible_moves_by_piece()
+
+    if random.random() < 0.05:
+        pieces = list(world.iter_pieces())
+        empty_tiles = [
+                x for x in sorted(world.board.valid_tiles)
+                if world.find_piece_on_tile(x) is None
+        ]
+        if pieces and empty_tiles:
+            piece = random.choice(pieces)
+            tile = random.choice(empty_tiles)
+
+            with world._unlock_temporarily():
+                piece.set_xyw(world.board.xyw_from_tile(tile))
+
+def count_live_tokens():
+    """
+    Count every token that hasn't been garbage collected, by class.
+
+    This includes tokens that were never added to the world (e.g. the moves
+    returned by `Piece.find_possible_moves()`), so it catches tokens that are
+    kept alive by mistake.
+    """
+    gc.collect()
+    return Counter(
+            type(x).__name__
+            for x in gc.get_objects()
+            if isinstance(x, kxg.Token)
+    )
+
+class MemoryCheck:
+    """
+    Sample memory use and live tokens as a game progresses, and decide whether
+    the growth after the warmup period fits within the budget.
+    """
+
+    def __init__(self, params):
+        self.warmup_sec = params['warmup_sec']
+        self.sample_interval_sec = params['sample_interval_sec']
+        self.budget_kib = params['budget_kib']
+        self.token_budget = params['token_budget']
+        self.elapsed_sec = 0
+        self.samples = []
+        self._initial = None
+        self._baseline = None
+        self._final = None
+
+    def start(self):
+        tracemalloc.start()
+        self._initial = self._take_sample()
+        self.samples.append(self._initial)
+
+    def stop(self):
+        tracemalloc.stop()
+
+    def on_update_game(self, world, dt_sec):
+        elapsed_sec = self.elapsed_sec
+        self.elapsed_sec += dt_sec
+
+        interval = self.sample_interval_sec
+
+        if self._baseline is None and self.elapsed_sec >= self.warmup_sec:
+            self._baseline = self._take_sample()
+            self.samples.append(self._baseline)
+
+        elif elapsed_sec // interval != self.elapsed_sec // interval:
+            self.samples.append(self._take_sample(snapshot=False))
+
+    def finish(self, world):
+        self._final = self._take_sample()
+        self.samples.append(self._final)
+
+        # If the game was shorter than the warmup period, just measure the
+        # growth from the start of the game.
+        if self._baseline is None:
+            self._baseline = self._initial
+
+    @property
+    def growth_kib(self):
+        return (self._final['traced_bytes'] - self._baseline['traced_bytes']) / 1024
+
+    @property
+    def token_growth(self):
+        growth = Counter(self._final['tokens'])
+        growth.subtract(self._baseline['tokens'])
+        return {k: v for k, v in sorted(growth.items()) if v}
+
+    @property
+    def passed(self):
+        return (
+                self.growth_kib <= self.budget_kib and
+                all(x <= self.token_budget for x in self.token_growth.values())
+        )
+
+    def find_top_allocations(self, n):
+        """
+        Return the call sites responsible for the most memory growth since the
+        end of the warmup period.
+        """
+        before = self._baseline['snapshot']
+        after = self._final['snapshot']
+
+        if before is None or after is None:
+            return []
+
+        stats = after.compare_to(before, 'lineno')
+        return [x for x in stats if x.size_diff > 0][:n]
+
+    def format(self, top=10):
+        lines = []
+
+        lines.append("elapsed_sec  traced_kib  tokens")
+        for sample in self.samples:
+            lines.append("{:>11.1f}  {:>10.1f}  {:>6}".format(
+                sample['elapsed_sec'],
+                sample['traced_bytes'] / 1024,
+                sum(sample['tokens'].values()),
+            ))
+
+        lines.append("")
+        lines.append(f"memory growth: {self.growth_kib:.1f} KiB (budget: {self.budget_kib} KiB)")
+
+        token_growth = self.token_growth
+        if token_growth:
+            lines.append(f"token growth (budget: {self.token_budget} per class):")
+            for k, v in token_growth.items():
+                lines.append(f"    {k:<16} {v:+d}")
+
+        top_allocations = self.find_top_allocations(top)
+        if top_allocations:
+            lines.append("top allocating call sites:")
+            for stat in top_allocations:
+                lines.append(f"    {stat}")
+
+        lines.append("")
+        lines.append("PASSED" if self.passed else "FAILED")
+
+        return '\n'.join(lines)
+
+    def _take_sample(self, snapshot=True):
+        if snapshot:
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ])
+
+        return {
+                'elapsed_sec': self.elapsed_sec,
+                'traced_bytes': tracemalloc.get_traced_memory()[0],
+                'tokens': count_live_tokens(),
+                'snapshot': snapshot or None,
+        }
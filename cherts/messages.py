@@ -3,8 +3,10 @@
 from kxg import Message, MessageCheck
 
 from cherts.world import *
+from cherts.sync import decode
 from cherts.config import (
-        load_board, load_move_types, load_pattern_types, load_piece_types
+        load_board, load_move_types, load_pattern_types, load_piece_types,
+        load_move_type, load_pattern_type, load_piece_type, diff_config,
 )
 
 # Think about adding an `on_receive`/`on_finalize`/`on_prepare`/`on_unpack` 
@@ -18,8 +20,9 @@ from cherts.config import (
 
 class SetupWorld(Message):
 
-    def __init__(self, config):
+    def __init__(self, config, num_players=2):
         self.config = config
+        self.num_players = num_players
         self.board = load_board(self.config)
         self.move_types = load_move_types(self.config)
         self.pattern_types = load_pattern_types(self.config)
@@ -52,6 +55,74 @@ class SetupWorld(Message):
                 move_types=self.move_types,
                 pattern_types=self.pattern_types,
                 piece_types=self.piece_types,
+                config=self.config,
+                num_players=self.num_players,
+        )
+
+class ReloadConfig(Message):
+    """
+    Apply changes to the config without restarting the game.
+
+    Only the move, pattern, and piece types that actually changed are 
+    rebuilt.  Changes to the board can't be applied to a game in progress.
+    """
+
+    def __init__(self, world, config):
+        self.config = config
+        self.diff = diff_config(world.config, config)
+
+        def load_types(key, load_type, *args):
+            return {
+                    name: load_type(config[key][name], name, *args)
+                        if name in config[key] else None
+                    for name in self.diff[key]
+            }
+
+        self.move_types = load_types('moves', load_move_type)
+        self.pattern_types = load_types('patterns', load_pattern_type)
+
+        # Unchanged piece types keep referring to the existing move and pattern 
+        # types, so the new piece types must do the same.
+        move_types = {**world.move_types, **self.move_types}
+        pattern_types = {**world.pattern_types, **self.pattern_types}
+
+        self.piece_types = load_types(
+                'pieces', load_piece_type, move_types, pattern_types)
+
+        self.old_types = [
+                types[name]
+                for key, types in [
+                    ('moves', world.move_types),
+                    ('patterns', world.pattern_types),
+                    ('pieces', world.piece_types),
+                ]
+                for name in self.diff[key]
+                if name in types
+        ]
+
+    def tokens_to_add(self):
+        for types in [self.move_types, self.pattern_types, self.piece_types]:
+            yield from (x for x in types.values() if x is not None)
+
+    def tokens_to_remove(self):
+        yield from self.old_types
+
+    def on_check(self, world):
+        if not self.was_sent_by_referee():
+            raise MessageCheck("only the referee can reload the config.")
+        if self.config['board'] != world.config['board']:
+            raise MessageCheck("can't change the board during a game.")
+
+        for piece in world.iter_pieces():
+            if self.piece_types.get(piece.type.name, piece.type) is None:
+                raise MessageCheck(f"can't remove piece type {piece.type.name!r}; pieces of that type still exist.")
+
+    def on_execute(self, world):
+        world.reload(
+                self.config,
+                move_types=self.move_types,
+                pattern_types=self.pattern_types,
+                piece_types=self.piece_types,
         )
 
 class SetupPlayer(Message):
@@ -65,15 +136,123 @@ class SetupPlayer(Message):
 
     def on_check(self, world):
         # Make sure there aren't too many players.
-        if len(world.players) >= 2:
+        if len(world.players) >= world.num_players:
             raise MessageCheck("too many players")
 
+        # With many players, the board might not be big enough for every 
+        # player to set up their pieces without overlapping.
+        tiles = set()
+
+        for piece in self.player.pieces:
+            tile = world.board.tile_from_xyw(piece.xyw)
+
+            if not world.board.is_playable(tile):
+                raise MessageCheck(f"{piece} isn't on a playable tile.")
+            if tile in tiles or world.find_piece_on_tile(tile):
+                raise MessageCheck(f"{piece} is on a tile that's already occupied.")
+
+            tiles.add(tile)
+
     def on_execute(self, world):
         world.add_player(self.player)
 
+class SyncPieces(Message):
+    """
+    Bring the continuously changing state of each piece up to date.
+
+    The packet is encoded by `sync.SyncEncoder` on the referee.  The decoded 
+    values are applied on every machine, including the one that encoded them, 
+    so that every world agrees on the same quantized state.
+    """
+
+    def __init__(self, packet):
+        self.packet = packet
+
+    def on_check(self, world):
+        if not self.was_sent_by_referee():
+            raise MessageCheck("only the referee can sync pieces.")
+
+    def on_execute(self, world):
+        frame = decode(self.packet)
+
+        for id, state in frame.states.items():
+            if id not in world:
+                continue
+
+            piece = world.get_token(id)
+
+            if 'xyw' in state:
+                piece.set_xyw(state['xyw'])
+            if 'move' in state:
+                piece.set_current_move(_get_token_or_none(world, state['move']))
+            if 'pattern' in state:
+                piece.set_current_pattern(_get_token_or_none(world, state['pattern']))
+            if 'cooldown' in state:
+                piece.set_cooldown_sec(state['cooldown'])
+
+class MessageBatch(Message):
+    """
+    Deliver several messages at once.
+
+    Actors collect the messages they send during a tick and send them as a
+    single batch (see `actors.BatchingActor`), so each recipient gets one
+    packet per tick instead of one per message.  The messages in the batch are
+    checked and executed in the order they were sent.  Note that every message
+    is checked before any are executed, so a check can't depend on the effects
+    of an earlier message in the same batch.
+    """
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+
+        # Observers are notified about each message individually (as well as
+        # about the batch itself), but things like the replay recorder need to
+        # know that these messages are already accounted for by the batch.
+        for message in self.messages:
+            message.batch = self
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.messages!r})'
+
+    def __iter__(self):
+        yield from self.messages
+
+    def __len__(self):
+        return len(self.messages)
+
+    def tokens_to_add(self):
+        for message in self.messages:
+            yield from message.tokens_to_add()
+
+    def tokens_to_remove(self):
+        for message in self.messages:
+            yield from message.tokens_to_remove()
+
+    def on_check(self, world):
+        for message in self.messages:
+            message.sender_id = self.sender_id
+            message.on_check(world)
+
+    def on_execute(self, world):
+        for message in self.messages:
+            message.on_execute(world)
+            world._react_to_message(message)
+
+    def on_undo(self, world):
+        for message in reversed(self.messages):
+            message.on_undo(world)
+
+def is_batched(message):
+    """
+    Return true if the given message was delivered as part of a batch.
+    """
+    return getattr(message, 'batch', None) is not None
+
 class AnticipateCollision(Message):
     # The server could anticipate collision between pieces, and preemptively 
     # send out messages saying what will happen.  This might be a way to make 
     # the game more responsive, if that's a problem.
     pass
 
+def _get_token_or_none(world, id):
+    return None if id is None else world.get_token(id)
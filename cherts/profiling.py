@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+
+import sys
+import random
+import signal
+import cProfile
+import pstats
+
+from collections import Counter
+from .config import load_config
+from .tournament import play_headless_match
+
+PROFILERS = 'cprofile', 'sample'
+
+def main(argv=None):
+    """\
+Profile a scripted headless game, so that slow matches can be reproduced.
+
+The game is driven by a script that does what players do through the GUI:
+select pieces (which asks for their possible moves) and move them to one of
+the tiles they can reach.  The selections and moves are spread evenly over the
+given number of ticks, and are chosen at random from the given seed, so the
+same arguments always profile the same game.
+
+The GUI itself isn't run, because it needs a display.  Selecting a piece is
+profiled up to the point where the GUI would start drawing the moves.
+
+Usage:
+    cherts profile [<config>] [options]
+
+Arguments:
+    <config>
+        A TOML file with settings that should override the default config.
+
+Options:
+    -t --ticks NUM          [default: 1200]
+        The number of ticks to simulate.
+
+    -d --dt SEC             [default: 0.05]
+        The amount of game time that passes each tick.
+
+    -S --selections NUM     [default: 1000]
+        The number of times to select a piece.
+
+    -m --moves NUM          [default: 100]
+        The number of times to move a piece.
+
+    -b --board WxH
+        The size of the board, e.g. `16x16`.  Any layout given in the config
+        is discarded.
+
+    -n --pieces NUM
+        The number of pieces each player starts with.  The pieces are placed
+        row by row from each player's edge of the board, cycling through the
+        types of piece in the `[setup]` config section.
+
+    -p --profiler NAME      [default: cprofile]
+        Either 'cprofile' (deterministic, records every call) or 'sample'
+        (statistical, with much less overhead).
+
+    -i --interval MS        [default: 1]
+        How often the sampling profiler records the stack, in milliseconds of
+        CPU time.
+
+    -o --output PATH        [default: cherts]
+        Where to write the results.  The cProfile stats are written to
+        `PATH.pstats`, and the stacks (in the "collapsed" format read by
+        `flamegraph.pl`, speedscope, etc.) to `PATH.folded`.
+
+    -s --seed NUM           [default: 0]
+        The random seed for the scripted session.
+
+    -N --top NUM            [default: 20]
+        The number of functions to report.
+"""
+    import docopt
+
+    args = docopt.docopt(main.__doc__.strip(), argv)
+    config = load_config(*([args['<config>']] if args['<config>'] else []))
+
+    if args['--profiler'] not in PROFILERS:
+        raise SystemExit(f"unknown profiler: {args['--profiler']!r}")
+
+    if args['--board']:
+        width, height = parse_board_size(args['--board'])
+        resize_board(config, width, height)
+
+    if args['--pieces']:
+        scale_setup(config, int(args['--pieces']))
+
+    num_ticks = int(args['--ticks'])
+    dt_sec = float(args['--dt'])
+    script = ScriptedSession(
+            num_ticks=num_ticks,
+            num_selections=int(args['--selections']),
+            num_moves=int(args['--moves']),
+            seed=int(args['--seed']),
+    )
+
+    def play():
+        return play_headless_match(
+                config,
+                num_ticks=num_ticks,
+                dt_sec=dt_sec,
+                on_tick=script.on_tick,
+        )
+
+    output = args['--output']
+
+    if args['--profiler'] == 'cprofile':
+        profiler = cProfile.Profile()
+        world, elapsed_sec = profiler.runcall(play)
+        profiler.dump_stats(f'{output}.pstats')
+
+        stats = pstats.Stats(profiler, stream=sys.stdout)
+        stats.sort_stats('cumulative').print_stats(int(args['--top']))
+        paths = [f'{output}.pstats']
+
+    else:
+        sampler = StackSampler(float(args['--interval']) / 1000)
+        with sampler:
+            world, elapsed_sec = play()
+        sampler.dump_stacks(f'{output}.folded')
+
+        print(sampler.format(int(args['--top'])))
+        paths = [f'{output}.folded']
+
+    print(script.format())
+    print(format_move_cache(world.move_cache))
+    for path in paths:
+        print(f"wrote: {path}")
+
+def parse_board_size(size):
+    try:
+        width, height = map(int, size.lower().split('x'))
+    except ValueError:
+        raise SystemExit(f"expected board size like '16x16', not {size!r}")
+    return width, height
+
+def resize_board(config, width, height):
+    config['board']['width'] = width
+    config['board']['height'] = height
+    config['board'].pop('layout', None)
+
+def scale_setup(config, num_pieces):
+    """
+    Replace the starting pieces with the given number of pieces, placed row by
+    row from the player's own edge of the board.
+
+    The types of the pieces cycle through the types in the original setup, in
+    order.  Each player only gets the half of the board closest to them, so
+    asking for more pieces than fit in that half is an error.
+    """
+    width = config['board']['width']
+    height = config['board']['height']
+    max_pieces = width * (height // 2)
+
+    if num_pieces > max_pieces:
+        raise SystemExit(f"can't fit {num_pieces} pieces on each side of a {width}x{height} board (max: {max_pieces})")
+
+    names = [x['name'] for x in config['setup']['pieces']]
+    config['setup']['pieces'] = [
+            {'name': names[i % len(names)], 'pos': [i % width, i // width]}
+            for i in range(num_pieces)
+    ]
+
+class ScriptedSession:
+    """
+    Select and move pieces at a steady rate, as a player would.
+    """
+
+    def __init__(self, *, num_ticks, num_selections, num_moves, seed):
+        self.num_ticks = num_ticks
+        self.num_selections = num_selections
+        self.num_moves = num_moves
+        self.random = random.Random(seed)
+        self.tick = 0
+        self.counts = Counter()
+
+    def on_tick(self, world):
+        if world.board is not None:
+            for i in range(self._num_due(self.num_selections)):
+                self.select_piece(world)
+            for i in range(self._num_due(self.num_moves)):
+                self.move_piece(world)
+
+        self.tick += 1
+
+    def select_piece(self, world):
+        pieces = list(world.iter_pieces())
+        if not pieces:
+            return
+
+        piece = self.random.choice(pieces)
+        piece.find_legal_moves()
+        self.counts['selections'] += 1
+
+    def move_piece(self, world):
+        """
+        Move a random piece to a random empty tile that it can reach.
+
+        The move happens immediately, like the moves made by `cherts
+        memcheck`, because there isn't a message for making moves yet.
+        """
+        pieces = list(world.iter_pieces())
+        self.random.shuffle(pieces)
+
+        for piece in pieces:
+            tiles = [
+                    x for x in sorted(world.find_reachable_tiles(piece))
+                    if world.find_piece_on_tile(x) is None
+            ]
+            if tiles:
+                tile = self.random.choice(tiles)
+                with world._unlock_temporarily():
+                    piece.set_xyw(world.board.xyw_from_tile(tile))
+                self.counts['moves'] += 1
+                return
+
+    def format(self):
+        return f"ticks: {self.tick}, selections: {self.counts['selections']}, moves: {self.counts['moves']}"
+
+    def _num_due(self, total):
+        # Spread the events as evenly as possible over the ticks.
+        return (
+                (self.tick + 1) * total // self.num_ticks -
+                self.tick * total // self.num_ticks
+        )
+
+def format_move_cache(cache):
+    report = cache.report()
+    return f"move cache: {report['hits']} hits, {report['misses']} misses ({report['hit_rate']:.1%} hit rate), {report['invalidations']} invalidations"
+
+class StackSampler:
+    """
+    Record the stack of the main thread at regular intervals of CPU time.
+
+    Samples are taken from a `SIGPROF` handler, so this only works on
+    platforms that have `signal.setitimer()` (i.e. not Windows).  The overhead
+    is proportional to the number of samples, not to the number of function
+    calls, so the profile isn't skewed towards code that makes many small
+    calls.
+    """
+
+    def __init__(self, interval_sec):
+        if not hasattr(signal, 'setitimer'):
+            raise SystemExit("the sampling profiler isn't supported on this platform")
+
+        self.interval_sec = interval_sec
+        self.stacks = Counter()
+        self._prev_handler = None
+
+    def __enter__(self):
+        self._prev_handler = signal.signal(signal.SIGPROF, self._on_sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval_sec, self.interval_sec)
+        return self
+
+    def __exit__(self, *exc_info):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._prev_handler)
+
+    @property
+    def num_samples(self):
+        return sum(self.stacks.values())
+
+    def count_self_samples(self):
+        """
+        Count the samples in which each function was at the top of the stack.
+        """
+        counts = Counter()
+        for stack, n in self.stacks.items():
+            counts[stack[-1]] += n
+        return counts
+
+    def dump_stacks(self, path):
+        """
+        Write the stacks in the "collapsed" format: one line per unique stack,
+        with the frames (outermost first) separated by semicolons, followed by
+        the number of samples.
+        """
+        with open(path, 'w') as f:
+            for stack, n in sorted(self.stacks.items()):
+                f.write(f"{';'.join(stack)} {n}\n")
+
+    def format(self, top=20):
+        lines = [f"samples: {self.num_samples} (every {self.interval_sec * 1000:g} ms of CPU time)"]
+
+        if self.num_samples:
+            lines.append("")
+            lines.append(" self%  function")
+            for frame, n in self.count_self_samples().most_common(top):
+                lines.append(f"{n / self.num_samples:>6.1%}  {frame}")
+
+        return '\n'.join(lines)
+
+    def _on_sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            stack.append(_format_frame(frame))
+            frame = frame.f_back
+        stack.reverse()
+        self.stacks[tuple(stack)] += 1
+
+def _format_frame(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})'
@@ -1,12 +1,127 @@
 #!/usr/bin/env python3
 
 import kxg
+from time import strftime
+from pathlib import Path
+from nonstdlib import info, warning
 
-from .messages import SetupWorld
-from .config import load_config
+from .messages import SetupWorld, ReloadConfig, SyncPieces, is_batched
+from .config import load_config, CONFIG_PATH
+from .sync import SyncEncoder, PayloadMeter
+from .replay import ReplayWriter
+from .actors import BatchingActor
+from .clock import FixedTimestep
 
-class Referee (kxg.Referee):
+class Referee (BatchingActor, kxg.Referee):
+
+    def __init__(self, config=None):
+        super().__init__()
+        self.config = config
+        self.sync_encoder = None
+        self.sync_payload = PayloadMeter()
+        self.sync_report_interval_sec = None
+        self.replay = None
+        self.replay_snapshot_interval_sec = None
+        self.reload_interval_sec = None
+        self.reload_mtime = None
+        self.timestep = None
+        self.tick = 0
+        self.elapsed_sec = 0
 
     def on_start_game(self, num_players):
-        config = load_config()
-        self >> SetupWorld(config)
+        config = self.config = self.config or load_config()
+        self.timestep = FixedTimestep.from_config(config)
+        self.sync_encoder = SyncEncoder(config['sync']['keyframe_interval'])
+        self.sync_report_interval_sec = config['sync']['report_interval_sec']
+
+        # Start recording before the world is setup, so that the recording 
+        # includes every message.
+        if config['replay']['record']:
+            self.start_replay(config['replay'])
+
+        if config['reload']['watch']:
+            self.reload_interval_sec = config['reload']['poll_interval_sec']
+            self.reload_mtime = CONFIG_PATH.stat().st_mtime
+
+        self >> SetupWorld(config, num_players)
+
+    def on_update_game(self, dt):
+        super().on_update_game(dt)
+
+        # Syncing the pieces is the most expensive thing the referee does, so 
+        # only do it once per simulation tick, not once per frame.
+        for i in range(self.timestep.advance(dt)):
+            self.on_update_tick(self.timestep.dt_sec)
+
+        self.flush_messages()
+
+    def on_update_tick(self, dt):
+        self.tick += 1
+        self.sync_pieces(dt)
+
+        elapsed_sec = self.elapsed_sec
+        self.elapsed_sec += dt
+
+        if self.replay:
+            interval = self.replay_snapshot_interval_sec
+            if elapsed_sec // interval != self.elapsed_sec // interval:
+                self.replay.write_snapshot(self.elapsed_sec, self.world)
+
+        if self.reload_interval_sec:
+            interval = self.reload_interval_sec
+            if elapsed_sec // interval != self.elapsed_sec // interval:
+                self.reload_config_if_changed()
+
+    def on_finish_game(self):
+        if self.replay:
+            self.replay.close()
+
+    @kxg.subscribe_to_message(kxg.Message)
+    def on_record_message(self, message):
+        # Messages that arrived in a batch are recorded as part of the batch.
+        if self.replay and not is_batched(message):
+            self.replay.write_message(self.elapsed_sec, message)
+
+    def start_replay(self, params):
+        dir = Path(params['dir'])
+        dir.mkdir(parents=True, exist_ok=True)
+        path = dir / strftime('%Y%m%d_%H%M%S.replay')
+
+        info(f"recording replay: {path}")
+        self.replay = ReplayWriter(path)
+        self.replay_snapshot_interval_sec = params['snapshot_interval_sec']
+
+    def reload_config_if_changed(self):
+        """
+        Apply any changes made to the config file since it was last loaded.
+        """
+        mtime = CONFIG_PATH.stat().st_mtime
+        if mtime == self.reload_mtime:
+            return
+
+        self.reload_mtime = mtime
+
+        # Send this message right away rather than adding it to the batch for 
+        # this tick, so that a failed check doesn't take the rest of the batch 
+        # down with it, and can be reported here.
+        try:
+            config = load_config()
+            self >> ReloadConfig(self.world, config)
+        except Exception as err:
+            warning(f"couldn't reload {CONFIG_PATH}: {err}")
+        else:
+            info(f"reloaded {CONFIG_PATH}")
+
+    def sync_pieces(self, dt):
+        packet = self.sync_encoder.encode(self.world.iter_pieces(), self.tick)
+        elapsed_sec = self.sync_payload.elapsed_sec
+        self.sync_payload.on_update_game(dt)
+
+        if packet is not None:
+            self.queue_message(SyncPieces(packet))
+            self.sync_payload.record(packet)
+
+        interval = self.sync_report_interval_sec
+        if elapsed_sec // interval != self.sync_payload.elapsed_sec // interval:
+            stats = self.sync_payload.report()
+            info(f"sync payload to each client: {stats['payload_bytes_per_sec']:.1f} B/s ({stats['packets']} packets)")
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+
+"""\
+Record every message applied to the world, and play the recording back.
+"""
+
+import io
+import mmap
+import pickle
+import struct
+import kxg
+
+from .world import World
+
+# File format
+# ===========
+# A replay file is a header followed by an append-only sequence of records.
+# Each record is length-prefixed, so the file can be read sequentially even if
+# the recording was interrupted before it could be closed.  All integers are
+# little-endian.
+#
+# header:   MAGIC
+# record:   length of everything after this field (u32), kind (u8), game time
+#           in seconds (f64), payload
+#
+# There are three kinds of records:
+#
+# MESSAGE:  A pickled message, in which tokens that were already in the world
+#           are replaced by their ids.
+# SNAPSHOT: A pickled copy of every token in the world.
+# INDEX:    Written once, when the recording is closed.  The payload is an
+#           array of (game time (f64), file offset (u64)) pairs, one for each
+#           snapshot.  The index record is followed by a footer giving its
+#           offset, so readers can find it without scanning the whole file.
+#
+# footer:   offset of the index record (u64), INDEX_MAGIC
+
+MAGIC = b'CHERTS-REPLAY\x00\x00\x01'
+INDEX_MAGIC = b'CHERTS-INDEX\x00\x00\x00\x01'
+
+MESSAGE = 0
+SNAPSHOT = 1
+INDEX = 2
+
+LENGTH_STRUCT = struct.Struct('<I')
+RECORD_STRUCT = struct.Struct('<Bd')
+INDEX_ENTRY_STRUCT = struct.Struct('<dQ')
+FOOTER_STRUCT = struct.Struct('<Q')
+FOOTER_SIZE = FOOTER_STRUCT.size + len(INDEX_MAGIC)
+
+class ReplayWriter:
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._snapshots = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def is_closed(self):
+        return self._file.closed
+
+    def write_message(self, time, message):
+        self._write_record(MESSAGE, time, _dumps(message, message))
+
+    def write_snapshot(self, time, world):
+        offset = self._file.tell()
+        self._write_record(SNAPSHOT, time, _dumps(snapshot_world(world)))
+        self._snapshots.append((time, offset))
+
+        # Make sure that everything up to the snapshot makes it to disk, in
+        # case the game crashes later on.
+        self._file.flush()
+
+    def close(self):
+        if self.is_closed:
+            return
+
+        offset = self._file.tell()
+        index = b''.join(INDEX_ENTRY_STRUCT.pack(*x) for x in self._snapshots)
+        self._write_record(INDEX, 0, index)
+        self._file.write(FOOTER_STRUCT.pack(offset))
+        self._file.write(INDEX_MAGIC)
+        self._file.close()
+
+    def _write_record(self, kind, time, payload):
+        header = RECORD_STRUCT.pack(kind, time)
+        self._file.write(LENGTH_STRUCT.pack(len(header) + len(payload)))
+        self._file.write(header)
+        self._file.write(payload)
+
+class ReplayReader:
+    """
+    Play back a recording made by `ReplayWriter`.
+
+    The file is memory-mapped, so seeking only touches the parts of the file
+    that are actually needed: the nearest snapshot before the requested time,
+    and the messages between that snapshot and the requested time.  Messages
+    are applied as fast as possible, without regard for the time at which they
+    were originally sent.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: not a cherts replay file")
+
+        self._end, self._snapshots = self._load_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    @property
+    def snapshot_times(self):
+        return [time for time, _ in self._snapshots]
+
+    def iter_records(self, offset=len(MAGIC)):
+        """
+        Yield the kind, time, payload, and offset of every record starting at
+        the given offset.
+        """
+        yield from self._iter_records(offset, self._end)
+
+    def seek(self, time):
+        """
+        Return a world in the state it was at the given game time.
+        """
+        world, offset = self._restore_nearest_snapshot(time)
+        for message in self.iter_messages(world, offset, time):
+            pass
+        return world
+
+    def iter_messages(self, world, offset=len(MAGIC), until=None):
+        """
+        Apply every message after the given offset to the given world,
+        yielding each one after it has been applied.
+        """
+        for kind, time, payload, _ in self.iter_records(offset):
+            if until is not None and time > until:
+                break
+            if kind != MESSAGE:
+                continue
+
+            message = _loads(payload, world)
+            with world._unlock_temporarily():
+                message._execute(world)
+                world._react_to_message(message)
+
+            yield time, message
+
+    def _iter_records(self, offset, end):
+        while offset + LENGTH_STRUCT.size <= end:
+            length, = LENGTH_STRUCT.unpack_from(self._mmap, offset)
+            start = offset + LENGTH_STRUCT.size
+
+            # Stop at a record that was only partially written.
+            if length < RECORD_STRUCT.size or start + length > end:
+                return
+
+            kind, time = RECORD_STRUCT.unpack_from(self._mmap, start)
+            payload = self._mmap[start + RECORD_STRUCT.size : start + length]
+
+            yield kind, time, payload, offset
+            offset = start + length
+
+    def _restore_nearest_snapshot(self, time):
+        offset = None
+
+        for snapshot_time, snapshot_offset in self._snapshots:
+            if snapshot_time > time:
+                break
+            offset = snapshot_offset
+
+        if offset is None:
+            world = World()
+            world._set_actors([])
+            return world, len(MAGIC)
+
+        kind, _, payload, _ = next(self.iter_records(offset))
+        assert kind == SNAPSHOT
+        world = restore_world(_loads(payload))
+
+        # Skip the snapshot itself.
+        return world, offset + _record_size(payload)
+
+    def _load_index(self):
+        size = len(self._mmap)
+
+        if size >= len(MAGIC) + FOOTER_SIZE and \
+                self._mmap[size - len(INDEX_MAGIC):] == INDEX_MAGIC:
+            index_offset, = FOOTER_STRUCT.unpack_from(
+                    self._mmap, size - FOOTER_SIZE)
+            kind, _, payload, _ = next(self._iter_records(index_offset, size))
+            assert kind == INDEX
+
+            snapshots = list(INDEX_ENTRY_STRUCT.iter_unpack(payload))
+            return index_offset, snapshots
+
+        # The recording wasn't closed cleanly, so there's no index.  Scan the
+        # file to rebuild it, ignoring any partially written record at the end.
+        snapshots = []
+        end = len(MAGIC)
+
+        for kind, time, payload, offset in self._iter_records(end, size):
+            if kind == SNAPSHOT:
+                snapshots.append((time, offset))
+            end = offset + _record_size(payload)
+
+        return end, snapshots
+
+def snapshot_world(world):
+    """
+    Return a picklable description of every token in the world.
+    """
+    return {
+            'config': world.config,
+            'tokens': [x for x in world],
+            'board': world.board,
+            'players': world.players,
+            'move_types': world.move_types,
+            'pattern_types': world.pattern_types,
+            'piece_types': world.piece_types,
+    }
+
+def restore_world(snapshot):
+    """
+    Create a new world from a description returned by `snapshot_world()`.
+
+    The tokens keep the ids they had when the snapshot was taken, so messages
+    recorded after the snapshot can be applied to the restored world.
+    """
+    world = World()
+    world._set_actors([])
+
+    # Setup the world before adding any tokens, so that the pieces can be 
+    # indexed as they're added.
+    with world._unlock_temporarily():
+        world.setup(
+                snapshot['board'],
+                move_types=snapshot['move_types'],
+                pattern_types=snapshot['pattern_types'],
+                piece_types=snapshot['piece_types'],
+                config=snapshot['config'],
+        )
+        for token in sorted(snapshot['tokens'], key=lambda x: x.id):
+            world._add_token(token)
+        for player in snapshot['players']:
+            world.add_player(player)
+
+    return world
+
+class _Pickler(pickle.Pickler):
+    """
+    Pickle tokens by value, except those that are already in the world when a
+    message is being pickled.
+
+    Token extensions may install method wrappers on the tokens they extend, and
+    those wrappers refer to the GUI and other things that can't (and
+    shouldn't) be pickled, so they're left out.
+    """
+
+    def __init__(self, file, message=None):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.message = message
+
+        if message:
+            self.by_value = set(message.tokens_to_add())
+            self.removed_ids = getattr(message, '_removed_token_ids', {})
+
+    def persistent_id(self, obj):
+        if not self.message or not isinstance(obj, kxg.Token):
+            return None
+        if obj in self.by_value:
+            return None
+        if obj in self.removed_ids:
+            return self.removed_ids[obj]
+        return obj.id
+
+    def reducer_override(self, obj):
+        if not isinstance(obj, kxg.Token) or isinstance(obj, kxg.World):
+            return NotImplemented
+
+        state = {
+                k: v for k, v in obj.__getstate__().items()
+                if not isinstance(v, kxg.Token.WatchedMethod)
+        }
+        return _new_token, (type(obj),), state
+
+class _Unpickler(pickle.Unpickler):
+
+    def __init__(self, file, world):
+        super().__init__(file)
+        self.world = world
+
+    def persistent_load(self, id):
+        return self.world.get_token(id)
+
+def _record_size(payload):
+    return LENGTH_STRUCT.size + RECORD_STRUCT.size + len(payload)
+
+def _new_token(cls):
+    return cls.__new__(cls)
+
+def _dumps(obj, message=None):
+    buffer = io.BytesIO()
+    _Pickler(buffer, message).dump(obj)
+    return buffer.getvalue()
+
+def _loads(payload, world=None):
+    return _Unpickler(io.BytesIO(payload), world).load()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+"""\
+Rollback netcode on top of the deterministic lockstep simulation.
+
+A lockstep peer can't simulate a tick until every player's commands for that
+tick have arrived, so every command has to be scheduled far enough in the
+future to cover the round trip to the other peers.  A rollback peer instead
+applies the local player's commands right away, and predicts that the other
+players didn't do anything on any tick their commands haven't arrived for
+yet.  When commands do arrive for a tick that was already simulated, the peer
+restores the snapshot it took at the start of that tick, and simulates every
+tick since then again, this time with the actual commands.
+
+Snapshots are taken at the start of every tick, and kept in a ring buffer
+with room for `max_rollback_ticks` of them.  A peer never gets more than that
+many ticks ahead of the last tick for which it has every player's commands,
+so there's always a snapshot to roll back to.  Once every player's commands
+for a tick have arrived, the state at the start of the following tick can't
+change any more, so that's when checksums are taken and compared.
+"""
+
+import zlib
+from nonstdlib import debug
+from .world import Player
+from .lockstep import (
+        LockstepError, DesyncError, CommandBatch, TICK_STRUCT,
+)
+
+class RollbackPeer:
+    """
+    One player's end of a rollback session.
+
+    The interface is the same as `LockstepPeer`: each tick, call
+    `queue_command()` for anything the player wants to do, `end_tick()` to get
+    the packet to send to the other peers, `receive()` for every packet that
+    arrives, and `advance()` to run the simulation.  The difference is that
+    `advance()` always simulates the tick just ended (unless the peer has
+    gotten too far ahead), and first rolls back if any of the packets that
+    arrived since the last call contradict what was predicted.
+    """
+
+    def __init__(self, simulation, player_id, *, player_ids=Player.ACTOR_IDS,
+            max_rollback_ticks=8, checksum_interval_ticks=20):
+
+        self.simulation = simulation
+        self.player_id = player_id
+        self.player_ids = tuple(player_ids)
+        self.max_rollback_ticks = max_rollback_ticks
+        self.checksum_interval_ticks = checksum_interval_ticks
+        self.num_bytes_sent = 0
+        self.num_rollbacks = 0
+        self.num_resimulated_ticks = 0
+
+        self._queued_commands = []
+        self._next_tick_to_send = simulation.tick
+        self._confirmed_tick = simulation.tick
+        self._rollback_tick = None
+        self._batches = {}
+        self._snapshots = [None] * max_rollback_ticks
+        self._checksums = {}
+        self._remote_checksums = {}
+        self._checksums_to_send = []
+        self._next_checksum_tick = simulation.tick
+
+    @property
+    def tick(self):
+        return self.simulation.tick
+
+    @property
+    def confirmed_tick(self):
+        """
+        The first tick for which some player's commands haven't arrived yet.
+        The state as of the start of this tick is final, but any later state
+        may still be rolled back.
+        """
+        return self._confirmed_tick
+
+    def queue_command(self, command):
+        self._queued_commands.append(command)
+
+    def end_tick(self):
+        """
+        Package up the commands queued since the last call, and return the
+        packet that should be sent to every other peer.
+        """
+        checksum = None
+        if self._checksums_to_send:
+            checksum = self._checksums_to_send.pop(0)
+
+        batch = CommandBatch(
+                self._next_tick_to_send,
+                self.player_id,
+                self._queued_commands,
+                checksum,
+        )
+        self._queued_commands = []
+        self._next_tick_to_send += 1
+        self._add_batch(batch)
+
+        packet = batch.pack()
+        self.num_bytes_sent += len(packet)
+        return packet
+
+    def receive(self, packet):
+        batch = CommandBatch.unpack(packet)
+
+        if batch.player_id not in self.player_ids or batch.player_id == self.player_id:
+            raise LockstepError(f"unexpected batch from player {batch.player_id}")
+
+        self._add_batch(batch)
+
+        # The tick was simulated on the assumption that this player didn't do
+        # anything.  If that turned out to be wrong, everything since then has
+        # to be simulated again.
+        if batch.tick < self.tick and batch.commands:
+            if self._rollback_tick is None or batch.tick < self._rollback_tick:
+                self._rollback_tick = batch.tick
+
+        if batch.checksum:
+            tick, checksum = batch.checksum
+            self._remote_checksums[tick, batch.player_id] = checksum
+            self._compare_checksums()
+
+    def can_advance(self):
+        # Don't get ahead of the local player, or so far ahead of the other
+        # players that the snapshot needed to roll back would be overwritten.
+        if self.tick >= self._next_tick_to_send:
+            return False
+
+        return self.tick - self._confirmed_tick < self.max_rollback_ticks
+
+    def advance(self):
+        """
+        Roll back if necessary, then simulate every tick the local player has
+        ended, and return the number of ticks simulated (not counting any that
+        were simulated again).
+        """
+        if self._rollback_tick is not None:
+            self._roll_back(self._rollback_tick)
+
+        # Some ticks that were already simulated may have been confirmed since
+        # the last call.  Take their checksums now, before simulating any
+        # further overwrites their snapshots.
+        self._take_checksums()
+
+        num_ticks = 0
+        while self.can_advance():
+            self._simulate_tick()
+            num_ticks += 1
+
+        self._forget_confirmed_batches()
+        return num_ticks
+
+    def _add_batch(self, batch):
+        if batch.tick < self._confirmed_tick:
+            raise LockstepError(f"received {batch!r} after every batch for tick {batch.tick} had arrived")
+
+        batches = self._batches.setdefault(batch.tick, {})
+        if batch.player_id in batches:
+            raise LockstepError(f"received two batches from player {batch.player_id} for tick {batch.tick}")
+
+        batches[batch.player_id] = batch
+
+        while len(self._batches.get(self._confirmed_tick, ())) == len(self.player_ids):
+            self._confirmed_tick += 1
+
+    def _simulate_tick(self):
+        tick = self.tick
+        snapshot = self._snapshots[tick % self.max_rollback_ticks] = \
+                self.simulation.snapshot()
+
+        if tick == self._next_checksum_tick and tick <= self._confirmed_tick:
+            self._take_checksum(tick, snapshot)
+
+        # Any player whose commands haven't arrived yet is predicted to have
+        # done nothing.
+        batches = self._batches.get(tick, {})
+        self.simulation.apply([
+                batches.get(id) or CommandBatch(tick, id)
+                for id in self.player_ids
+        ])
+
+    def _roll_back(self, tick):
+        snapshot = self._find_snapshot(tick)
+        if snapshot is None:
+            raise LockstepError(f"can't roll back to tick {tick}, the oldest snapshot is for tick {self.tick - self.max_rollback_ticks}")
+
+        debug(f"rolling back from tick {self.tick} to tick {tick}")
+
+        end_tick = self.tick
+        self.simulation.restore(snapshot)
+
+        while self.tick < end_tick:
+            self._simulate_tick()
+
+        self._rollback_tick = None
+        self.num_rollbacks += 1
+        self.num_resimulated_ticks += end_tick - tick
+
+    def _find_snapshot(self, tick):
+        # The tick is stored in the snapshot itself, so there's no need to
+        # keep track of which tick each slot in the ring buffer belongs to.
+        snapshot = self._snapshots[tick % self.max_rollback_ticks]
+        if snapshot is None or TICK_STRUCT.unpack_from(snapshot)[0] != tick:
+            return None
+        return snapshot
+
+    def _take_checksums(self):
+        # Only take checksums of states that can't be rolled back any more,
+        # i.e. the start of any tick up to the first one that some player's
+        # commands haven't arrived for.
+        final_tick = min(self._confirmed_tick, self.tick - 1)
+
+        while self._next_checksum_tick <= final_tick:
+            tick = self._next_checksum_tick
+            self._take_checksum(tick, self._find_snapshot(tick))
+
+    def _take_checksum(self, tick, snapshot):
+        checksum = self._checksums[tick] = zlib.crc32(snapshot)
+        self._checksums_to_send.append((tick, checksum))
+        self._next_checksum_tick += self.checksum_interval_ticks
+        self._compare_checksums()
+
+    def _compare_checksums(self):
+        for (tick, player_id), remote in list(self._remote_checksums.items()):
+            if tick not in self._checksums:
+                continue
+
+            del self._remote_checksums[tick, player_id]
+            if remote != self._checksums[tick]:
+                raise DesyncError(f"player {player_id} diverged from player {self.player_id} on tick {tick}")
+
+        # Keep our checksums until everyone else has had a chance to send
+        # theirs, which they'll do soon after the tick is confirmed.
+        pending = {tick for tick, _ in self._remote_checksums}
+        for tick in list(self._checksums):
+            if tick < self._confirmed_tick - 2 * self.checksum_interval_ticks and tick not in pending:
+                del self._checksums[tick]
+
+    def _forget_confirmed_batches(self):
+        # Batches are needed until the tick they're for can no longer be
+        # rolled back.
+        for tick in list(self._batches):
+            if tick < min(self._confirmed_tick, self.tick):
+                del self._batches[tick]
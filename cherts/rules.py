@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+"""\
+Read-only tables precomputed from the rules in the config.
+
+Evaluating the move expressions for every piece is one of the more expensive
+things the world does, but for a piece sitting on a tile, the result only
+depends on the tile, the player, and the expressions themselves.  A `RuleBook`
+evaluates every move expression for every tile and player once, up front, so
+the world can just look the results up.
+
+Rule books are read-only, so any number of worlds can share one.  The match
+host (see `host.MatchHost`) builds a single rule book and gives it to every
+match it plays.  Rule books can also be published in shared memory, for worlds
+in other processes.  The tournament runner builds each rule book once in the
+parent process, and every worker process attaches to it rather than parsing
+the config and building the tables again.  The tables are never copied into
+the workers, so they only take up memory once per host.
+"""
+
+import pickle
+import struct
+import numpy as np
+
+from multiprocessing import shared_memory
+from .world import Player, xyw_paths_from_xyp_exprs_batch
+from .config import load_board, load_move_types
+
+# Shared memory layout
+# ====================
+# header length (u32), pickled header, padding, table data
+#
+# The header contains the config and an index giving the key, offset, shape,
+# and dtype of each table.  Offsets are relative to the start of the table
+# data, which begins at the first multiple of ALIGNMENT after the header.
+# Every table is aligned to ALIGNMENT bytes.
+
+HEADER_LENGTH_STRUCT = struct.Struct('<I')
+ALIGNMENT = 64
+
+# Tiles that a move can't reach (e.g. because it would leave the board) are
+# marked with this value.
+NO_TILE = -1
+
+class RuleBook:
+
+    def __init__(self, config, tables):
+        self._config = config
+        self._tables = tables
+        self._shm = None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(tables={len(self._tables)})'
+
+    @classmethod
+    def from_config(cls, config, num_players=2):
+        """
+        Evaluate every move expression in the given config for every tile and
+        every player.
+        """
+        board = load_board(config)
+        players = [
+                Player.from_actor_id(x, board, num_players)
+                for x in Player.find_actor_ids(num_players)
+        ]
+        tables = {}
+
+        for move_type in load_move_types(config).values():
+            if not move_type.xyp_exprs:
+                continue
+
+            for player in players:
+                key = make_move_table_key(board, player, move_type)
+                tables[key] = build_move_table(board, player, move_type)
+
+        return cls(config, tables)
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Load a rule book that another process published with `publish()`.
+
+        The tables are read-only views into the shared memory, so they aren't
+        copied.  The rule book can be closed (see `close()`) once nothing 
+        refers to any of its tables.
+        """
+        shm = _attach_shared_memory(name)
+
+        header_length, = HEADER_LENGTH_STRUCT.unpack_from(shm.buf, 0)
+        header_start = HEADER_LENGTH_STRUCT.size
+        header = pickle.loads(shm.buf[header_start : header_start + header_length])
+        data_start = _align(header_start + header_length)
+
+        # Use `frombuffer()` because (unlike the `ndarray()` constructor) it 
+        # keeps the buffer exported for as long as the array exists.  That way 
+        # the memory can't be unmapped while any of the tables are still in 
+        # use; `close()` will raise a BufferError instead.
+        tables = {}
+        for key, offset, shape, dtype in header['index']:
+            table = np.frombuffer(
+                    shm.buf,
+                    dtype=dtype,
+                    count=int(np.prod(shape)),
+                    offset=data_start + offset,
+            ).reshape(shape)
+            table.flags.writeable = False
+            tables[key] = table
+
+        rules = cls(header['config'], tables)
+        rules._shm = shm
+        return rules
+
+    def publish(self):
+        """
+        Copy the rule book into a new block of shared memory, and return the
+        block.
+
+        Other processes can use the name of the block (i.e. `shm.name`) to
+        attach to it.  The caller is responsible for unlinking the block once
+        every other process is done with it.
+        """
+        index = []
+        offset = 0
+
+        for key, table in self._tables.items():
+            offset = _align(offset)
+            index.append((key, offset, table.shape, table.dtype.str))
+            offset += table.nbytes
+
+        header = pickle.dumps({'config': self._config, 'index': index})
+        header_start = HEADER_LENGTH_STRUCT.size
+        data_start = _align(header_start + len(header))
+
+        shm = shared_memory.SharedMemory(create=True, size=data_start + offset)
+        HEADER_LENGTH_STRUCT.pack_into(shm.buf, 0, len(header))
+        shm.buf[header_start : header_start + len(header)] = header
+
+        for key, offset, shape, dtype in index:
+            view = np.ndarray(
+                    shape,
+                    dtype=dtype,
+                    buffer=shm.buf,
+                    offset=data_start + offset,
+            )
+            view[...] = self._tables[key]
+
+        return shm
+
+    def close(self):
+        """
+        Detach from the shared memory this rule book was loaded from, if any.
+
+        Raises a BufferError if any of the tables are still referenced.
+        """
+        if self._shm is not None:
+            self._tables = {}
+            self._shm.close()
+            self._shm = None
+
+    @property
+    def config(self):
+        return self._config
+
+    def find_move_table(self, board, player, move_type):
+        """
+        Return the tiles that the given move can reach from each tile of the
+        given board, or None if the move isn't in the rule book.
+
+        The table is an array with a row for each tile.  Each row lists the
+        tiles reached by each path of the move, padded with `NO_TILE`.
+        """
+        key = make_move_table_key(board, player, move_type)
+        return self._tables.get(key)
+
+def make_move_table_key(board, player, move_type):
+    """
+    Identify a move table by everything that affects its contents.
+
+    The key doesn't include the name of the move type, so that the table
+    can't be used if the move type is changed (e.g. by reloading the config).
+    """
+    return (
+            board.size,
+            board.layout,
+            player.origin.tuple,
+            player.heading.tuple,
+            tuple(move_type.xyp_exprs),
+    )
+
+def build_move_table(board, player, move_type):
+    probes = [
+            _Probe(player, board.xyw_from_tile(tile))
+            for tile in range(board.num_tiles)
+    ]
+    xyw_paths_batch = xyw_paths_from_xyp_exprs_batch(
+            move_type.xyp_exprs,
+            probes,
+            board,
+    )
+
+    rows = []
+    for xyw_paths_by_expr in xyw_paths_batch:
+        rows.append([
+            board.tile_from_xyw(xyw_path[-1])
+                if board.is_playable_xyw_path(xyw_path) else None
+            for xyw_paths in xyw_paths_by_expr
+            for xyw_path in xyw_paths
+        ])
+
+    width = max(map(len, rows), default=0)
+    table = np.full((board.num_tiles, width), NO_TILE, dtype=np.int32)
+
+    for i, row in enumerate(rows):
+        row = [NO_TILE if x is None else x for x in row]
+        table[i, :len(row)] = row
+
+    return table
+
+class _Probe:
+    """
+    Stand in for a piece, so that move expressions can be evaluated for tiles
+    that don't have a piece on them.
+    """
+    __slots__ = 'player', 'xyw'
+
+    def __init__(self, player, xyw):
+        self.player = player
+        self.xyw = xyw
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def _attach_shared_memory(name):
+    # The process that created the block is responsible for unlinking it, so 
+    # don't track it here.  Older versions of python can't be told not to 
+    # track the block, but that's only a problem for processes that aren't 
+    # children of the creator (which share its resource tracker).
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+"""\
+Tools for AI search over world states.
+
+A search tends to reach the same arrangement of pieces many times, by making
+the same moves in different orders.  The transposition table remembers what
+was learned about each arrangement (keyed by `World.zobrist_hash`), so that it
+only has to be searched once.
+"""
+
+import numpy as np
+from collections import namedtuple
+
+# Each entry records whether its value is the exact value of the position, or
+# just a bound on it (e.g. because the search was cut off early).
+EXACT, LOWER_BOUND, UPPER_BOUND = range(3)
+
+# The best move found for a position, as the id of the piece to move and the
+# tile to move it to.
+NO_MOVE = 0, -1
+
+ENTRY_DTYPE = np.dtype([
+        ('key', np.uint64),
+        ('value', np.float64),
+        ('piece_id', np.uint32),
+        ('tile', np.int32),
+        ('depth', np.int16),
+        ('bound', np.uint8),
+        ('generation', np.uint8),
+])
+
+Entry = namedtuple('Entry', 'value depth bound piece_id tile')
+
+class TranspositionTable:
+    """
+    A fixed-size hash table of search results, keyed by Zobrist hash.
+
+    The table is allocated once, with as many entries as fit in the given
+    amount of memory, and never grows.  Each hash maps to a single slot, so
+    positions sometimes have to compete for the same slot.  The replacement
+    policy decides which one to keep:
+
+    - 'always': The new position always replaces the old one.
+    - 'depth': The new position only replaces the old one if it was searched
+      at least as deeply, or if the old one is left over from an earlier
+      search (see `new_search()`).
+    """
+    POLICIES = 'always', 'depth'
+
+    def __init__(self, max_bytes, replacement='depth'):
+        if replacement not in self.POLICIES:
+            raise ValueError(f"unknown replacement policy: {replacement!r}")
+
+        size = max_bytes // ENTRY_DTYPE.itemsize
+        if size < 1:
+            raise ValueError(f"{max_bytes} bytes isn't enough for even one entry")
+
+        self.replacement = replacement
+        self._entries = np.zeros(size, dtype=ENTRY_DTYPE)
+        self._entries['depth'] = -1
+        self._generation = 0
+        self.reset_stats()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(size={len(self)}, replacement={self.replacement!r})'
+
+    def __len__(self):
+        return len(self._entries)
+
+    @classmethod
+    def from_config(cls, config):
+        params = config['search']
+        return cls(
+                max_bytes=int(params['transposition_table_mib'] * 2**20),
+                replacement=params['replacement'],
+        )
+
+    @property
+    def nbytes(self):
+        return self._entries.nbytes
+
+    @property
+    def hit_rate(self):
+        return self.num_hits / self.num_probes if self.num_probes else 0
+
+    def probe(self, key):
+        """
+        Return what's known about the position with the given hash, or None
+        if it isn't in the table.
+        """
+        self.num_probes += 1
+        entry = self._entries[key % len(self._entries)]
+
+        if entry['depth'] < 0 or entry['key'] != key:
+            return None
+
+        self.num_hits += 1
+        return Entry(
+                value=float(entry['value']),
+                depth=int(entry['depth']),
+                bound=int(entry['bound']),
+                piece_id=int(entry['piece_id']),
+                tile=int(entry['tile']),
+        )
+
+    def store(self, key, value, depth, bound=EXACT, move=NO_MOVE):
+        """
+        Record the result of searching the position with the given hash to the
+        given depth.  Returns false if the replacement policy decided to keep
+        the position already in the slot instead.
+        """
+        slot = key % len(self._entries)
+        entry = self._entries[slot]
+        is_empty = entry['depth'] < 0
+
+        if not is_empty and entry['key'] != key:
+            if self.replacement == 'depth' and \
+                    entry['generation'] == self._generation and \
+                    entry['depth'] > depth:
+                self.num_rejected += 1
+                return False
+
+            self.num_overwrites += 1
+
+        self.num_stores += 1
+        self._entries[slot] = (
+                key, value, move[0], move[1], depth, bound, self._generation)
+        return True
+
+    def new_search(self):
+        """
+        Indicate that a new search is starting.
+
+        Entries from earlier searches are kept, because they're often still
+        useful, but they no longer take precedence over new entries.
+        """
+        self._generation = (self._generation + 1) % 256
+
+    def clear(self):
+        """
+        Forget every entry, e.g. because the rules changed.
+        """
+        self._entries['depth'] = -1
+
+    def reset_stats(self):
+        self.num_probes = 0
+        self.num_hits = 0
+        self.num_stores = 0
+        self.num_overwrites = 0
+        self.num_rejected = 0
+
+    def count_occupied(self):
+        return int((self._entries['depth'] >= 0).sum())
+
+    def format_stats(self):
+        occupied = self.count_occupied()
+        return '\n'.join([
+                f"size:       {len(self)} entries ({self.nbytes / 2**20:.1f} MiB, {self.replacement!r} replacement)",
+                f"occupied:   {occupied} ({occupied / len(self):.1%})",
+                f"probes:     {self.num_probes} ({self.hit_rate:.1%} hits)",
+                f"stores:     {self.num_stores} ({self.num_overwrites} overwrites, {self.num_rejected} rejected)",
+        ])
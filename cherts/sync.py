@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+"""\
+Compact, delta-compressed synchronization of continuously changing piece state.
+
+Discrete game events (setup, captures, etc.) are communicated with ordinary kxg
+messages.  The state that changes every tick (e.g. the position of a piece
+that's in the middle of a move) would be far too expensive to communicate that
+way, so instead the referee encodes it into a small binary packet once per
+tick.  Only the fields that changed since the previous packet are included,
+except for periodic keyframes, which include every field of every piece.
+"""
+
+import struct
+
+# Wire format
+# ===========
+# Every packet starts with a header, followed by one record for each piece
+# that has changed.  Each record starts with the id of the piece and a bitmask
+# indicating which fields follow.  The fields always appear in the order given
+# by `FIELDS`.  All integers are little-endian.
+#
+# header:   kind (u8), tick (u32), number of records (u16)
+# record:   piece id (u32), field mask (u8)
+# xyw:      x, y (i16, i16), in units of 1/TILE_QUANTA tiles
+# move:     token id (u32), 0 if there is no current move
+# pattern:  token id (u32), 0 if there is no current pattern
+# cooldown: remaining cooldown (u16), in units of 1/COOLDOWN_QUANTA sec
+
+TILE_QUANTA = 64
+COOLDOWN_QUANTA = 100
+
+KEYFRAME = 0
+DELTA = 1
+
+FIELDS = 'xyw', 'move', 'pattern', 'cooldown'
+FIELD_STRUCTS = {
+        'xyw': struct.Struct('<hh'),
+        'move': struct.Struct('<I'),
+        'pattern': struct.Struct('<I'),
+        'cooldown': struct.Struct('<H'),
+}
+HEADER_STRUCT = struct.Struct('<BIH')
+RECORD_STRUCT = struct.Struct('<IB')
+
+class SyncEncoder:
+    """
+    Encode the state of every piece into a compact packet, once per tick.
+
+    The encoder remembers the state it last sent for each piece, so that
+    subsequent packets only need to include the fields that changed.  Every
+    *keyframe_interval* ticks (and whenever `request_keyframe()` is called) a
+    keyframe is sent instead, which allows clients that missed or mishandled a
+    delta to recover.
+    """
+
+    def __init__(self, keyframe_interval=60):
+        self.keyframe_interval = keyframe_interval
+        self._last_states = {}
+        self._ticks_since_keyframe = None
+
+    def request_keyframe(self):
+        self._ticks_since_keyframe = None
+
+    def encode(self, pieces, tick):
+        """
+        Return a packet describing the given pieces, or None if nothing has
+        changed since the last packet.
+        """
+        is_keyframe = (
+                self._ticks_since_keyframe is None or
+                self._ticks_since_keyframe + 1 >= self.keyframe_interval
+        )
+        states = {x.id: quantize_piece(x) for x in pieces}
+        records = []
+        num_records = 0
+
+        for id, state in states.items():
+            last_state = None if is_keyframe else self._last_states.get(id)
+            mask = 0
+            fields = []
+
+            for i, field in enumerate(FIELDS):
+                if last_state is None or state[i] != last_state[i]:
+                    mask |= 1 << i
+                    fields.append(FIELD_STRUCTS[field].pack(*state[i]))
+
+            if mask:
+                records.append(RECORD_STRUCT.pack(id, mask))
+                records.extend(fields)
+                num_records += 1
+
+        # Forget about any pieces that were removed from the world.  If they're
+        # ever added back, they'll be sent in full.
+        self._last_states = states
+
+        if is_keyframe:
+            self._ticks_since_keyframe = 0
+        else:
+            self._ticks_since_keyframe += 1
+
+        if not is_keyframe and not num_records:
+            return None
+
+        kind = KEYFRAME if is_keyframe else DELTA
+        header = HEADER_STRUCT.pack(kind, tick, num_records)
+        return b''.join([header, *records])
+
+class SyncFrame:
+    """
+    The decoded contents of a single sync packet.
+
+    `states` maps piece ids to dictionaries containing only the fields that
+    were present in the packet.  Positions are returned as (x, y) tuples in
+    the world frame, moves and patterns as token ids (or None), and cooldowns
+    in seconds.
+    """
+
+    def __init__(self, tick, is_keyframe, states):
+        self.tick = tick
+        self.is_keyframe = is_keyframe
+        self.states = states
+
+    def __repr__(self):
+        cls = self.__class__.__name__
+        return f'{cls}(tick={self.tick}, is_keyframe={self.is_keyframe})'
+
+def decode(packet):
+    kind, tick, num_records = HEADER_STRUCT.unpack_from(packet, 0)
+    offset = HEADER_STRUCT.size
+    states = {}
+
+    for _ in range(num_records):
+        id, mask = RECORD_STRUCT.unpack_from(packet, offset)
+        offset += RECORD_STRUCT.size
+        state = states[id] = {}
+
+        for i, field in enumerate(FIELDS):
+            if mask & (1 << i):
+                values = FIELD_STRUCTS[field].unpack_from(packet, offset)
+                offset += FIELD_STRUCTS[field].size
+                state[field] = dequantize_field(field, values)
+
+    if offset != len(packet):
+        raise ValueError(f"sync packet has {len(packet) - offset} unexpected trailing bytes")
+
+    return SyncFrame(tick, kind == KEYFRAME, states)
+
+def quantize_piece(piece):
+    return (
+            (round(piece.xyw.x * TILE_QUANTA), round(piece.xyw.y * TILE_QUANTA)),
+            (_id_or_zero(piece.current_move),),
+            (_id_or_zero(piece.current_pattern),),
+            (round(piece.cooldown_sec * COOLDOWN_QUANTA),),
+    )
+
+def dequantize_field(field, values):
+    if field == 'xyw':
+        return tuple(x / TILE_QUANTA for x in values)
+    if field == 'cooldown':
+        return values[0] / COOLDOWN_QUANTA
+    return values[0] or None
+
+class PayloadMeter:
+    """
+    Keep track of how much sync data has been encoded.
+
+    Only the sync packets themselves are counted.  The `SyncPieces` messages 
+    that carry them are pickled (and batched with any other messages sent 
+    that tick) before they're sent, and the pipe adds its own framing, so the 
+    bandwidth actually used is somewhat higher.  Every client receives every 
+    packet, so these numbers apply to each client.
+    """
+
+    def __init__(self):
+        self.elapsed_sec = 0
+        self.num_bytes = 0
+        self.num_packets = 0
+
+    def on_update_game(self, dt):
+        self.elapsed_sec += dt
+
+    def record(self, packet):
+        self.num_bytes += len(packet)
+        self.num_packets += 1
+
+    def report(self):
+        """
+        Return the number of payload bytes and packets encoded so far, and the 
+        average number of payload bytes per second.
+        """
+        return {
+                'payload_bytes': self.num_bytes,
+                'packets': self.num_packets,
+                'payload_bytes_per_sec': self.num_bytes / self.elapsed_sec if self.elapsed_sec else 0,
+        }
+
+def _id_or_zero(token):
+    return 0 if token is None else token.id
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import random
+import multiprocessing
+import kxg
+
+from pathlib import Path
+from collections import Counter, defaultdict
+from .world import World, Player
+from .referee import Referee
+from .ai import AiActor, RandomPolicy
+from .lockstep import LockstepSimulation, CommandBatch, build_world
+from .config import load_config
+from .rules import RuleBook
+
+# The parent process loads each config variant and builds its rule book once, 
+# then publishes it in shared memory.  Each worker process attaches to the 
+# rule books when it starts, and reuses them for every match it plays.
+_rule_books = {}
+
+def main(argv=None):
+    """\
+Play many headless AI-vs-AI matches, to compare different configurations.
+
+Each match is played in lockstep by two AIs that make random moves, until one
+of them wins (see the `[tournament]` config section) or the time limit is
+reached.  The matches are reproducible: the same seed always plays the same
+match.
+
+Usage:
+    cherts tournament <num_matches> [<variant>...] [options]
+
+Arguments:
+    <num_matches>
+        The number of matches to play for each config variant.
+
+    <variant>
+        A TOML file with settings that should override the default config.
+        Each variant is played separately.  If no variants are given, only the
+        default config is played.
+
+Options:
+    -j --jobs NUM           [default: {num_cpus}]
+        The number of matches to play in parallel.
+
+    -t --time-limit SEC     [default: 600]
+        The amount of game time after which a match is declared a draw.
+
+    -d --dt SEC             [default: 0.05]
+        The amount of game time that passes each tick.
+
+    -s --seed NUM           [default: 0]
+        The random seed for the first match.  Each subsequent match uses the
+        next seed.
+
+    -o --output PATH
+        Write the summary to the given path, in JSON format.
+"""
+    import docopt
+
+    usage = main.__doc__.format(num_cpus=os.cpu_count()).strip()
+    args = docopt.docopt(usage, argv)
+
+    variants = {Path(x).stem: x for x in args['<variant>']} or {'default': None}
+    num_matches = int(args['<num_matches>'])
+    seed = int(args['--seed'])
+    jobs = [
+            (name, seed + i, float(args['--time-limit']), float(args['--dt']))
+            for name in variants
+            for i in range(num_matches)
+    ]
+
+    summary = TournamentSummary()
+    start = time.perf_counter()
+    shared_memory = {
+            name: RuleBook.from_config(load_config(*([path] if path else []))).publish()
+            for name, path in variants.items()
+    }
+
+    try:
+        with multiprocessing.Pool(
+                int(args['--jobs']),
+                initializer=_init_worker,
+                initargs=({k: v.name for k, v in shared_memory.items()},),
+        ) as pool:
+            for result in pool.imap_unordered(_play_job, jobs):
+                summary.add_result(result)
+                print(f"\r{summary.num_matches}/{len(jobs)} matches", end='', file=sys.stderr)
+
+    finally:
+        for shm in shared_memory.values():
+            shm.close()
+            shm.unlink()
+
+    elapsed = time.perf_counter() - start
+    print(f"\r{len(jobs)} matches in {elapsed:.1f}s ({len(jobs) / elapsed:.1f}/s)", file=sys.stderr)
+    print(summary.format())
+
+    if args['--output']:
+        Path(args['--output']).write_text(json.dumps(summary.report(), indent=2))
+
+def play_headless_match(config, *, dt_sec, num_ticks=None, time_limit_sec=None,
+        rules=None, on_tick=None):
+    """
+    Play a match between two AIs, without a GUI.
+
+    Returns the world as it was at the end of the match, and the amount of
+    game time that elapsed.  The match ends when a winner is declared, or
+    after the given number of ticks.  Instead of a number of ticks, a time
+    limit can be given, which is rounded to the nearest whole number of ticks.
+    If given, *rules* should be a `RuleBook` built from the same config, and
+    *on_tick* is called with the world after each tick.
+    """
+    num_ticks = _count_ticks(num_ticks, time_limit_sec, dt_sec)
+    world = World(rules)
+    actors = [Referee(config), AiActor(), AiActor()]
+    stage = kxg.GameStage(world, kxg.Forum(), actors)
+    theater = kxg.Theater(stage)
+    num_ticks_played = 0
+
+    # Count ticks rather than adding up the time, so that floating point error 
+    # can't add an extra tick.
+    while num_ticks_played < num_ticks and not theater.is_finished:
+        theater.update(dt_sec)
+        num_ticks_played += 1
+
+        if on_tick:
+            on_tick(world)
+
+        if world.has_game_ended():
+            break
+
+    stage.on_exit_stage()
+    return world, num_ticks_played * dt_sec
+
+def play_random_match(config, *, seed, dt_sec, num_ticks=None,
+        time_limit_sec=None, rules=None):
+    """
+    Play a lockstep match between two AIs that make random moves.
+
+    Returns the world as it was at the end of the match, and the amount of 
+    game time that elapsed, like `play_headless_match()`.  Both AIs draw from 
+    the same random number generator, seeded with *seed*.
+    """
+    num_ticks = _count_ticks(num_ticks, time_limit_sec, dt_sec)
+    royal_pieces = set(config['tournament']['royal_pieces'])
+
+    world = build_world(config, rules=rules)
+    simulation = LockstepSimulation(world, tick_rate=1 / dt_sec)
+    rng = random.Random(seed)
+    policies = [RandomPolicy(x, rng) for x in Player.ACTOR_IDS]
+
+    while simulation.tick < num_ticks and not world.has_game_ended():
+        simulation.apply([
+                CommandBatch(
+                    simulation.tick,
+                    policy.player_id,
+                    policy.choose_commands(world),
+                )
+                for policy in policies
+        ])
+
+        winner = find_winner(world, royal_pieces)
+        if winner is not None:
+            with world._unlock_temporarily():
+                world.declare_winner(winner)
+
+    return world, simulation.tick * dt_sec
+
+def find_winner(world, royal_pieces):
+    """
+    Return the only player who still has a piece of one of the given types, 
+    or None if more than one player does.
+    """
+    survivors = [
+            player for player in world.players
+            if any(x.type.name in royal_pieces for x in player.pieces)
+    ]
+    return survivors[0] if len(survivors) == 1 else None
+
+def summarize_match(world, elapsed_sec):
+    return {
+            'winner': world.winner.color if world.winner else None,
+            'duration_sec': elapsed_sec,
+            'pieces': {
+                player.color: dict(Counter(x.type.name for x in player.pieces))
+                for player in world.players
+            },
+    }
+
+class TournamentSummary:
+    """
+    Aggregate the results of many matches, as they arrive.
+    """
+
+    def __init__(self):
+        self.num_matches = 0
+        self._variants = defaultdict(lambda: {
+                'matches': 0,
+                'wins': Counter(),
+                'total_duration_sec': 0,
+                'total_pieces': defaultdict(Counter),
+        })
+
+    def add_result(self, result):
+        stats = self._variants[result['variant']]
+        stats['matches'] += 1
+        stats['wins'][result['winner'] or 'draw'] += 1
+        stats['total_duration_sec'] += result['duration_sec']
+
+        for color, pieces in result['pieces'].items():
+            stats['total_pieces'][color].update(pieces)
+
+        self.num_matches += 1
+
+    def report(self):
+        """
+        Return the win rates, mean game length, and mean number of surviving
+        pieces of each type for each config variant.
+        """
+        report = {}
+
+        for name, stats in self._variants.items():
+            n = stats['matches']
+            report[name] = {
+                    'matches': n,
+                    'win_rates': {
+                        k: v / n for k, v in sorted(stats['wins'].items())
+                    },
+                    'mean_duration_sec': stats['total_duration_sec'] / n,
+                    'mean_surviving_pieces': {
+                        color: {k: v / n for k, v in sorted(pieces.items())}
+                        for color, pieces in stats['total_pieces'].items()
+                    },
+            }
+
+        return report
+
+    def format(self):
+        lines = []
+
+        for name, stats in self.report().items():
+            lines.append(f"{name}: {stats['matches']} matches, mean length {stats['mean_duration_sec']:.1f}s")
+            for k, v in stats['win_rates'].items():
+                lines.append(f"    {k:<10} {v:6.1%}")
+            for color, pieces in stats['mean_surviving_pieces'].items():
+                counts = ', '.join(f'{k}={v:.2f}' for k, v in pieces.items())
+                lines.append(f"    {color} survivors: {counts}")
+
+        return '\n'.join(lines)
+
+def _init_worker(shared_memory_names):
+    for name, shm_name in shared_memory_names.items():
+        _rule_books[name] = RuleBook.attach(shm_name)
+
+def _play_job(job):
+    name, seed, time_limit_sec, dt_sec = job
+    rules = _rule_books[name]
+
+    world, elapsed_sec = play_random_match(
+            rules.config,
+            seed=seed,
+            time_limit_sec=time_limit_sec,
+            dt_sec=dt_sec,
+            rules=rules,
+    )
+    return {
+            'variant': name,
+            'seed': seed,
+            **summarize_match(world, elapsed_sec),
+    }
+
+def _count_ticks(num_ticks, time_limit_sec, dt_sec):
+    if (num_ticks is None) == (time_limit_sec is None):
+        raise ValueError("must give either num_ticks or time_limit_sec, but not both")
+
+    if num_ticks is None:
+        num_ticks = round(time_limit_sec / dt_sec)
+
+    return num_ticks
@@ -1,7 +1,13 @@
 import kxg
+import math
+import numpy as np
 from vecrec import Vector, cast_anything_to_vector, accept_anything_as_vector
 from kxg import read_only
-from more_itertools import collapse
+from nonstdlib import info
+from more_itertools import collapse, bucket
+from functools import lru_cache
+from collections import defaultdict
+from .clock import FixedTimestep
 
 # Variable naming conventions
 # ===========================
@@ -55,16 +61,71 @@ from more_itertools import collapse
 #   A list of coordinates meant to be traversed in order, e.g. waypoints.  
 #   Paths can be in different coordinate frames, e.g. `xyp_path`, `xyw_path`, 
 #   etc.
+#
+# `xyt`
+#   Mnemonic: "tile (x, y)"
+#   An (x, y) tuple of integers identifying a single square of the board, in 
+#   the world frame.  A piece occupies the tile nearest to its `xyw` position.
+#
+# `tile`
+#   A single integer identifying a square of the board, packed from its `xyt` 
+#   coordinates as `y * w + x`.  Tiles are cheap to hash and compare, so they 
+#   are used for anything keyed by board position (e.g. which piece occupies 
+#   each tile).  Positions are only converted back to `xyw` where they meet 
+#   the GUI or continuous movement.
+#
+# `step`
+#   The displacement between two adjacent tiles along a ray, e.g. `xyp_step` or 
+#   `xyw_step`.
 
 class World(kxg.World):
 
-    def __init__(self):
+    def __init__(self, rules=None):
         super().__init__()
+        self._rules = rules
+        self._config = None
         self._board = None
         self._players = []
+        self._num_players = 2
+        self._pieces = {}
+        self._sorted_pieces = ()
         self._move_types = {}
         self._pattern_types = {}
         self._piece_types = {}
+        self._winner = None
+        self._occupancy = {}
+        self._coverage = {}
+        self._reach = {}
+        self._dependents = defaultdict(set)
+        self._move_cache = MoveCache()
+        self._hash = 0
+        self._piece_hashes = {}
+        self._zobrist_keys = None
+        self._cooldown_bucket_sec = 1
+        self._timestep = None
+
+    @property
+    def config(self):
+        """
+        The config dictionary that the current board and types were loaded 
+        from.
+        """
+        return self._config
+
+    @property
+    def rules(self):
+        """
+        Tables precomputed from the config (see `rules.RuleBook`), or None.
+        """
+        return self._rules
+
+    @property
+    def timestep(self):
+        """
+        The `clock.FixedTimestep` that decides when the world ticks, or None 
+        if the world was setup without a config.
+        """
+        return self._timestep
 
     @property
     def board(self):
@@ -74,6 +135,14 @@ class World(kxg.World):
     def players(self):
         return self._players
 
+    @property
+    def num_players(self):
+        """
+        The number of players the game was setup for.  Players join one at a 
+        time, so this may be more than `len(world.players)`.
+        """
+        return self._num_players
+
     @property
     def move_types(self):
         return self._move_types
@@ -86,12 +155,112 @@ class World(kxg.World):
     def piece_types(self):
         return self._piece_types
 
-    def setup(self, board, *, move_types, pattern_types, piece_types):
+    @property
+    def winner(self):
+        """
+        The player who won the game, or None if the game hasn't been won.
+        """
+        return self._winner
+
+    def declare_winner(self, player):
+        self._winner = player
+        self.end_game()
+
+    @property
+    def zobrist_hash(self):
+        """
+        A 64-bit hash of the arrangement of the pieces.
+
+        The hash covers the type, owner, tile, and remaining cooldown (rounded 
+        up to the nearest `[search] cooldown_bucket_sec`) of every piece, and 
+        nothing else.  In particular, it doesn't depend on the ids of the 
+        pieces, so different worlds with the same arrangement of pieces have 
+        the same hash.  The hash is updated incrementally as pieces are added, 
+        moved, and removed, so it's cheap to read at any time.
+        """
+        return self._hash
+
+    @property
+    def move_cache(self):
+        """
+        The cache used by `find_legal_moves()`.  Its hit, miss, and 
+        invalidation counts are useful for tuning.
+        """
+        return self._move_cache
+
+    def setup(self, board, *, move_types, pattern_types, piece_types, config=None, num_players=2):
+        self._config = config
         self._board = board
+        self._num_players = num_players
+        self._zobrist_keys = ZobristKeys(board.num_tiles if board else 0)
+        if config:
+            self._cooldown_bucket_sec = config['search']['cooldown_bucket_sec']
+            self._zobrist_keys = ZobristKeys.from_config(config, board)
+            self._timestep = FixedTimestep.from_config(config)
         self._move_types = move_types
         self._pattern_types = pattern_types
         self._piece_types = piece_types
 
+    def on_update_game(self, dt):
+        """
+        Update every token once per simulation tick, rather than once per 
+        frame.
+        """
+        if self._timestep is None:
+            return super().on_update_game(dt)
+
+        for i in range(self._timestep.advance(dt)):
+            super().on_update_game(self._timestep.dt_sec)
+
+    def reload(self, config, *, move_types, pattern_types, piece_types):
+        """
+        Replace some of the move, pattern, and piece types.
+
+        Each argument maps names to new types, or to None if the type should be 
+        removed.  Types that aren't mentioned are kept as they are.  Pieces 
+        with a replaced type are switched to the new type, and everything 
+        derived from their types (e.g. coverage and legal moves) is 
+        recalculated.  Any piece type that refers to a replaced move or 
+        pattern type must also be replaced (see `config.diff_config()`), so 
+        nothing needs to be recalculated for the other pieces.
+        """
+        for types, new_types in [
+                (self._move_types, move_types),
+                (self._pattern_types, pattern_types),
+                (self._piece_types, piece_types),
+        ]:
+            for name, type in new_types.items():
+                if type is None:
+                    del types[name]
+                else:
+                    types[name] = type
+
+        affected_pieces = [
+                x for x in self.iter_pieces()
+                if x.type.name in piece_types
+        ]
+        for piece in affected_pieces:
+            piece.set_type(self._piece_types[piece.type.name])
+            self._move_cache.invalidate_piece(piece)
+
+        self._refresh_coverage(affected_pieces)
+        self._config = config
+
+    @kxg.read_only
+    def get_coverage(self, player):
+        """
+        Return a map of how many of the given player's pieces can reach each 
+        tile.
+
+        The map is kept up to date as pieces are added, moved, and removed, so 
+        it's cheap to query at any time.
+        """
+        try:
+            return self._coverage[player]
+        except KeyError:
+            coverage = self._coverage[player] = CoverageMap(self.board)
+            return coverage
+
     def add_player(self, player):
         self._players.append(player)
 
@@ -111,21 +280,415 @@ class World(kxg.World):
         # Didn't click on any piece.
         return None
 
+    @kxg.read_only
+    def find_piece_at(self, xyw):
+        """
+        Return the piece occupying the tile nearest the given position, or None 
+        if that tile is empty.
+        """
+        return self._occupancy.get(self.board.tile_from_xyw(xyw))
+
+    @kxg.read_only
+    def find_piece_on_tile(self, tile):
+        """
+        Return the piece occupying the given tile, or None if it's empty.
+        """
+        return self._occupancy.get(tile)
+
+    @kxg.read_only
+    def find_pieces_in_rect(self, xyt_min, xyt_max):
+        """
+        Return the pieces occupying any of the tiles between the given corners
+        (inclusive).  The rectangle may extend past the edges of the board.
+
+        This is meant for culling, so it's only as accurate as the occupancy
+        map: pieces are found by the tile they're moving into, not by where
+        they're drawn.
+        """
+        board = self.board
+        x0, y0 = max(xyt_min[0], 0), max(xyt_min[1], 0)
+        x1, y1 = min(xyt_max[0], board.width - 1), min(xyt_max[1], board.height - 1)
+
+        if x0 > x1 or y0 > y1:
+            return []
+
+        # Look up each tile if the rectangle is small, otherwise it's faster to
+        # check every piece.
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self._occupancy):
+            return [
+                    piece
+                    for tile, piece in self._occupancy.items()
+                    if x0 <= tile % board.width <= x1
+                    and y0 <= tile // board.width <= y1
+            ]
+
+        pieces = []
+        for y in range(y0, y1 + 1):
+            for tile in range(y * board.width + x0, y * board.width + x1 + 1):
+                piece = self._occupancy.get(tile)
+                if piece is not None:
+                    pieces.append(piece)
+
+        return pieces
+
     @kxg.read_only
     def iter_pieces(self):
-        for player in self.players:
-            yield from player.pieces
+        """
+        Yield every piece in the world, in order of id.
+
+        The order doesn't depend on the order in which the players were added 
+        (which can vary between machines), so anything that depends on the 
+        order of iteration is still deterministic.
+        """
+        # Pieces are added and removed much less often than they're iterated 
+        # over, so keep the sorted list around until it changes.
+        if self._sorted_pieces is None:
+            self._sorted_pieces = tuple(sorted(self._pieces, key=lambda x: x.id))
+
+        yield from self._sorted_pieces
+
+    @kxg.read_only
+    def find_possible_moves_by_piece(self):
+        """
+        Return a dictionary mapping every piece to its possible moves.
+
+        This is equivalent to calling `Piece.find_possible_moves()` for each 
+        piece, but much faster, because the move expressions are evaluated for 
+        every piece of each type at once.
+        """
+        moves = {}
+        pieces_by_type = bucket(self.iter_pieces(), key=lambda x: x.type)
+
+        for type in pieces_by_type:
+            pieces = list(pieces_by_type[type])
+
+            for piece in pieces:
+                moves[piece] = []
+
+            for move_type in type.move_types:
+                batch = move_type.make_moves_batch(pieces)
+                for piece, piece_moves in zip(pieces, batch):
+                    moves[piece] += piece_moves
+
+        return moves
+
+    @kxg.read_only
+    def find_legal_moves(self, piece):
+        """
+        Return the moves the given piece can legally make, accounting for 
+        other pieces blocking its rays and occupying its jump targets.
+
+        The moves are cached until a piece enters or leaves one of the tiles 
+        they depend on (see `MoveCache`), so asking for the same piece's moves 
+        repeatedly is cheap.
+        """
+        moves = self._move_cache.get(piece)
+
+        if moves is None:
+            moves, deps = self._find_legal_moves(piece)
+            self._move_cache.put(piece, moves, deps)
+
+        return list(moves)
+
+    @kxg.read_only
+    def find_legal_moves_by_piece(self):
+        """
+        Return a dictionary mapping every piece to its legal moves.
+        """
+        return {x: self.find_legal_moves(x) for x in self.iter_pieces()}
+
+    @kxg.read_only
+    def find_reachable_tiles(self, piece):
+        """
+        Return the tiles the given piece could move to, accounting for other 
+        pieces blocking its rays.
+        """
+        try:
+            reach, deps = self._reach[piece]
+        except KeyError:
+            return frozenset()
+        return frozenset(reach)
+
+    @kxg.read_only
+    def measure_ray(self, xyw_origin, xyw_step, player):
+        """
+        Count the number of tiles that a piece controlled by the given player 
+        could slide along the given ray.
+
+        The ray ends at the edge of the playable part of the board, just before 
+        the first tile occupied by one of the player's own pieces, or on the 
+        first tile occupied by an opponent's piece.
+        """
+        board = self.board
+        tile = board.tile_from_xyw(xyw_origin)
+
+        if tile is None:
+            return 0
+
+        # The precomputed ray length already accounts for the edges, walls, 
+        # and holes of the board, so only the pieces need to be checked here.
+        dx, dy = xyt_step = xyt_from_xyw(xyw_step)
+        max_length = board.find_ray_length(tile, xyt_step)
+        tile_step = dy * board.width + dx
+
+        for i in range(1, max_length + 1):
+            occupant = self._occupancy.get(tile + i * tile_step)
+
+            if occupant is None:
+                continue
+
+            return i if occupant.player is not player else i - 1
+
+        return max_length
+
+    def _on_add_piece(self, piece):
+        self._pieces[piece] = None
+        self._sorted_pieces = None
+
+        tile = piece.tile
+        if tile is not None:
+            self._occupancy[tile] = piece
+
+        self._refresh_hash(piece)
+        self._refresh_coverage({piece} | self._dependents.get(tile, set()))
+        self._move_cache.invalidate_tile(tile)
+
+    def _on_remove_piece(self, piece):
+        self._pieces.pop(piece, None)
+        self._sorted_pieces = None
+
+        tile = piece.tile
+        if self._occupancy.get(tile) is piece:
+            del self._occupancy[tile]
+
+        self._hash ^= self._piece_hashes.pop(piece, 0)
+        self._forget_coverage(piece)
+        self._refresh_coverage(self._dependents.get(tile, set()))
+        self._move_cache.invalidate_piece(piece)
+        self._move_cache.invalidate_tile(tile)
+
+    def _on_move_piece(self, piece, tile_before):
+        tile_after = piece.tile
+
+        # The piece's own moves start from wherever it is, so they change even 
+        # if it hasn't left its tile.
+        self._move_cache.invalidate_piece(piece)
+
+        if tile_before == tile_after:
+            return
+
+        self._refresh_hash(piece)
+
+        if self._occupancy.get(tile_before) is piece:
+            del self._occupancy[tile_before]
+        if tile_after is not None:
+            self._occupancy[tile_after] = piece
+
+        self._refresh_coverage(
+                {piece} |
+                self._dependents.get(tile_before, set()) |
+                self._dependents.get(tile_after, set())
+        )
+        self._move_cache.invalidate_tile(tile_before)
+        self._move_cache.invalidate_tile(tile_after)
+
+    def _on_change_piece(self, piece):
+        """
+        Called when anything about a piece other than its position changes, 
+        e.g. its type or its cooldown.
+        """
+        self._refresh_hash(piece)
+
+    def _refresh_hash(self, piece):
+        piece_hash = self._zobrist_keys.find_key(
+                piece.type.name,
+                piece.player.id,
+                piece.tile,
+                math.ceil(piece.cooldown_sec / self._cooldown_bucket_sec),
+        )
+        self._hash ^= self._piece_hashes.get(piece, 0) ^ piece_hash
+        self._piece_hashes[piece] = piece_hash
+
+    def _refresh_coverage(self, pieces):
+        """
+        Recalculate which tiles the given pieces can reach.
+
+        Each piece records which tiles its reach depends on: the tiles along 
+        each of its rays, and the tile that blocks each ray.  When a piece 
+        enters or leaves a tile, only the pieces that depend on that tile need 
+        to be refreshed.
+        """
+        if not self.board:
+            return
+
+        for piece in list(pieces):
+            self._forget_coverage(piece)
+
+            reach, deps = self._find_reach(piece)
+            self.get_coverage(piece.player)._add_tiles(reach, 1)
+            self._reach[piece] = reach, deps
+
+            for tile in deps:
+                self._dependents[tile].add(piece)
+
+    def _forget_coverage(self, piece):
+        try:
+            reach, deps = self._reach.pop(piece)
+        except KeyError:
+            return
+
+        self.get_coverage(piece.player)._add_tiles(reach, -1)
+
+        for tile in deps:
+            self._dependents[tile].discard(piece)
+            if not self._dependents[tile]:
+                del self._dependents[tile]
+
+    def _find_reach(self, piece):
+        board = self.board
+        reach = set()
+        deps = set()
+
+        # The precomputed move tables only apply to pieces that are exactly on 
+        # a tile, not to pieces in the middle of a move.
+        is_on_tile = (
+                self._rules is not None and
+                piece.tile is not None and
+                piece.xyw == board.xyw_from_tile(piece.tile)
+        )
+
+        for move_type in piece.move_types:
+            table = None
+            if is_on_tile and move_type.xyp_exprs:
+                table = self._rules.find_move_table(board, piece.player, move_type)
+
+            if table is not None:
+                reach.update(x for x in table[piece.tile].tolist() if x >= 0)
+
+            else:
+                xyw_paths = xyw_paths_from_xyp_exprs(
+                        move_type.xyp_exprs,
+                        piece,
+                        board,
+                )
+                for xyw_path in clip_xyw_paths(xyw_paths, board):
+                    reach.add(board.tile_from_xyw(xyw_path[-1]))
+
+            tile0 = board.tile_from_xyw(piece.xyw)
+            if tile0 is None:
+                continue
+
+            for xyw_step in move_type.find_xyw_steps(piece):
+                length, ray_tiles = self._trace_ray(piece, tile0, xyw_step)
+                reach.update(ray_tiles[:length])
+                deps.update(ray_tiles)
+
+        return reach, deps
+
+    def _find_legal_moves(self, piece):
+        board = self.board
+        moves = []
+        deps = set()
+        tile0 = board.tile_from_xyw(piece.xyw)
+
+        for move_type in piece.move_types:
+            xyw_paths = xyw_paths_from_xyp_exprs(
+                    move_type.xyp_exprs,
+                    piece,
+                    board,
+            )
+
+            # A jump can't land on one of the piece's own pieces, so it depends 
+            # on the tile it lands on.
+            for xyw_path in clip_xyw_paths(xyw_paths, board):
+                tile = board.tile_from_xyw(xyw_path[-1])
+                occupant = self._occupancy.get(tile)
+                deps.add(tile)
+
+                if occupant is None or occupant.player is not piece.player:
+                    moves.append(Move(move_type, piece, xyw_path))
+
+            if tile0 is None:
+                continue
+
+            for xyw_step in move_type.find_xyw_steps(piece):
+                length, ray_tiles = self._trace_ray(piece, tile0, xyw_step)
+                deps.update(ray_tiles)
+
+                if length:
+                    moves.append(Ray(move_type, piece, xyw_step, length))
+
+        return moves, deps
+
+    def _trace_ray(self, piece, tile0, xyw_step):
+        """
+        Return how many tiles the given piece can slide along the given ray, 
+        and every tile that number depends on.
+
+        Every tile along the ray is reachable.  The tile just past the end of 
+        the ray (if it's playable) is the one that blocked it, so the ray also 
+        depends on that tile.
+        """
+        board = self.board
+        dx, dy = xyt_step = xyt_from_xyw(xyw_step)
+        tile_step = dy * board.width + dx
+        max_length = board.find_ray_length(tile0, xyt_step)
+        length = self.measure_ray(piece.xyw, xyw_step, piece.player)
+
+        ray_tiles = [
+                tile0 + i * tile_step
+                for i in range(1, min(length + 1, max_length) + 1)
+        ]
+        return length, ray_tiles
 
 class Board(kxg.Token):
+    """
+    The grid of tiles that pieces move on.
+
+    Each tile is one of:
+
+    - `PLAYABLE`: Pieces can move to and through the tile.
+    - `WALL`: An obstacle.  Pieces can't enter the tile, and rays stop in 
+      front of it, just like they do at the edge of the board.
+    - `HOLE`: Not part of the board at all, e.g. to make boards that aren't 
+      rectangular.  Pieces can't enter the tile, and it isn't drawn.
+
+    The layout is given as a list of strings, one per row, with one character 
+    per tile (see `TILE_CHARS`).  The first row is the far edge of the board 
+    (y=h-1) and the last row is the near edge (y=0), like a chess diagram.  
+    Without a layout, every tile is playable.
+
+    The layout never changes, so anything that depends only on the layout 
+    (e.g. the number of tiles each ray can cover before leaving the playable 
+    part of the board) is calculated the first time it's needed, and cached.  
+    The cache is never pickled, because it can be much bigger than the rest of 
+    the board, and it's cheap to calculate again.
+    """
+    PLAYABLE, WALL, HOLE = range(3)
+    TILE_CHARS = {'.': PLAYABLE, '#': WALL, '-': HOLE}
 
-    def __init__(self, width, height):
+    def __init__(self, width, height, layout=None):
         super().__init__()
         self._width = width
         self._height = height
+        self._layout = tuple(layout) if layout else (width * '.',) * height
+        self._kinds = _parse_board_layout(self._layout, width, height)
+        self._valid_tiles = frozenset(
+                i for i, x in enumerate(self._kinds) if x == self.PLAYABLE)
+        self._ray_lengths = {}
 
     def __repr__(self):
         return super().__repr__(width=self.width, height=self.height)
 
+    def __getstate__(self):
+        state = super().__getstate__()
+        del state['_ray_lengths']
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._ray_lengths = {}
+
     def __extend__(self):
         from . import gui
         return {
@@ -144,30 +707,202 @@ class Board(kxg.Token):
     def height(self):
         return self._height
 
+    @property
+    def layout(self):
+        return self._layout
+
+    @property
+    def num_tiles(self):
+        return self._width * self._height
+
+    @property
+    def valid_tiles(self):
+        """
+        The tiles that pieces can occupy.
+        """
+        return self._valid_tiles
+
+    @read_only
+    def contains_xyt(self, xyt):
+        x, y = xyt
+        return 0 <= x < self._width and 0 <= y < self._height
+
+    @read_only
+    def tile_from_xyt(self, xyt):
+        """
+        Pack the given tile coordinates into a single integer, or return None 
+        if they're not on the board.
+        """
+        x, y = xyt
+        if not (0 <= x < self._width and 0 <= y < self._height):
+            return None
+        return y * self._width + x
+
+    @read_only
+    def xyt_from_tile(self, tile):
+        y, x = divmod(tile, self._width)
+        return x, y
+
+    @read_only
+    def tile_from_xyw(self, xyw):
+        """
+        Return the tile nearest the given position, or None if that tile isn't 
+        on the board.
+        """
+        return self.tile_from_xyt(xyt_from_xyw(xyw))
+
+    @read_only
+    def xyw_from_tile(self, tile):
+        return Vector(*self.xyt_from_tile(tile))
+
+    @read_only
+    def kind_from_tile(self, tile):
+        return self._kinds[tile]
+
+    @read_only
+    def is_playable(self, tile):
+        """
+        Return true if pieces can occupy the given tile.  The tile can be None, 
+        as returned by `tile_from_xyw()` for positions off the board.
+        """
+        return tile is not None and self._kinds[tile] == self.PLAYABLE
+
+    @read_only
+    def is_playable_xyw_path(self, xyw_path):
+        """
+        Return true if every waypoint of the given path is on a playable tile.
+        """
+        return all(self.is_playable(self.tile_from_xyw(x)) for x in xyw_path)
+
+    @read_only
+    def find_playable_xyw_paths(self, xyw_paths):
+        """
+        Return a boolean mask indicating which of the given paths only visit 
+        playable tiles.
+
+        The paths are given as an array of shape (..., waypoints, 2), so the 
+        whole batch can be checked at once.
+        """
+        xyt = np.rint(xyw_paths)
+        x, y = xyt[..., 0], xyt[..., 1]
+        on_board = (x >= 0) & (x < self._width) & (y >= 0) & (y < self._height)
+
+        tiles = np.where(on_board, y * self._width + x, 0).astype(int)
+        playable = np.frombuffer(self._kinds, dtype=np.uint8)[tiles] == self.PLAYABLE
+
+        return (on_board & playable).all(axis=-1)
+
+    @read_only
+    def find_ray_length(self, tile, xyt_step):
+        """
+        Return the number of times the given step can be taken from the given 
+        tile before leaving the playable part of the board.
+        """
+        return int(self._cache_ray_lengths(xyt_step)[tile])
+
+    @read_only
+    def find_ray_lengths(self, xyt_step):
+        """
+        Return an array with the length of the ray from every tile, indexed by 
+        tile.  See `find_ray_length()`.  The array must not be modified.
+        """
+        return self._cache_ray_lengths(xyt_step)
+
+    def _cache_ray_lengths(self, xyt_step):
+        # This is the only place the cache is filled.  It's safe to call from 
+        # read-only methods, because the lengths depend only on the layout, 
+        # which never changes, so filling the cache can't change the result 
+        # of any method.
+        try:
+            return self._ray_lengths[xyt_step]
+        except KeyError:
+            pass
+
+        dx, dy = xyt_step
+        playable = np.frombuffer(self._kinds, dtype=np.uint8).reshape(
+                self._height, self._width) == self.PLAYABLE
+
+        # Work one row at a time (or one column at a time, for horizontal 
+        # steps), starting with the row furthest along the step, so that the 
+        # lengths from the next row are always known.
+        if dy:
+            lengths = _find_ray_lengths_by_row(playable, dx, dy)
+        else:
+            lengths = _find_ray_lengths_by_row(playable.T, dy, dx).T
+
+        lengths = self._ray_lengths[xyt_step] = lengths.ravel()
+        return lengths
+
 class Player(kxg.Token):
 
+    # The referee has id 1, so the players have ids 2, 3, etc.  Most games 
+    # (e.g. tournaments and lockstep sessions) have just two players, with the 
+    # ids in `ACTOR_IDS`.
+    FIRST_ACTOR_ID = 2
+    ACTOR_IDS = 2, 3
+
+    # Enough names for the largest free-for-all game.  The first two players 
+    # are white and black, like in chess.
+    COLORS = (
+            'white', 'black', 'red', 'blue', 'green', 'yellow', 'purple', 
+            'orange', 'cyan', 'magenta', 'brown', 'pink', 'gray', 'olive', 
+            'navy', 'teal',
+    )
+    MAX_PLAYERS = len(COLORS)
+
+    @classmethod
+    def find_actor_ids(cls, num_players):
+        return tuple(range(cls.FIRST_ACTOR_ID, cls.FIRST_ACTOR_ID + num_players))
+
     @classmethod
-    def from_actor(cls, actor, board):
-        if actor.id == 2:
-            origin = Vector(0, 0)
+    def from_actor(cls, actor, board, num_players=2):
+        return cls.from_actor_id(actor.id, board, num_players)
+
+    @classmethod
+    def from_actor_id(cls, actor_id, board, num_players=2):
+        """
+        Create the player controlled by the given actor.
+
+        Players take turns being placed along the near (y=0) and far (y=h-1) 
+        edges of the board, facing each other.  When there are more than two 
+        players, each edge is divided into equal slots, one per player, and 
+        each player's origin is at the corner of their slot.  So the first two 
+        players are always in opposite corners, and a 4-player game has two 
+        players on each edge.
+
+        The `[setup]` positions are laid out for the whole width of the board, 
+        so each player only gets the pieces that fit in their own slot (see 
+        `load_initial_pieces()`).
+        """
+        index = actor_id - cls.FIRST_ACTOR_ID
+
+        if not 2 <= num_players <= cls.MAX_PLAYERS:
+            raise ValueError(f"expected 2-{cls.MAX_PLAYERS} players, not {num_players}")
+        if not 0 <= index < num_players:
+            raise ValueError(f"unexpected actor id={actor_id} for {num_players} players")
+
+        num_slots = -(-num_players // 2)
+        slot_width = board.width // num_slots
+        slot = index // 2
+
+        if slot_width < 1:
+            raise ValueError(f"a board {board.width} tiles wide is too narrow for {num_players} players (need at least {num_slots} tiles)")
+
+        if index % 2 == 0:
+            origin = Vector(slot * slot_width, 0)
             heading = Vector(1, 1)
-            color = 'white'
-        elif actor.id == 3:
-            origin = Vector(board.width - 1, board.height - 1)
-            heading = Vector(-1, -1)
-            color = 'black'
         else:
-            # There should only be two players, and their ids should be 2 and 
-            # 3.  (The referee has id 1).
-            raise ValueError(f"{actor!r} has unexpected id={actor.id}")
+            origin = Vector(board.width - 1 - slot * slot_width, board.height - 1)
+            heading = Vector(-1, -1)
 
-        return cls(origin, heading, color)
+        return cls(origin, heading, cls.COLORS[index], slot_width)
 
-    def __init__(self, origin, heading, color):
+    def __init__(self, origin, heading, color, width=None):
         super().__init__()
         self._origin = cast_anything_to_vector(origin)
         self._heading = cast_anything_to_vector(heading)
         self._color = color
+        self._width = width
         self._pieces = []
 
     def __repr__(self):
@@ -185,6 +920,14 @@ class Player(kxg.Token):
     def color(self):
         return self._color
 
+    @property
+    def width(self):
+        """
+        The number of columns this player can set up pieces in, counting from 
+        their origin, or None if they can use the whole board.
+        """
+        return self._width
+
     @property
     def pieces(self):
         return self._pieces
@@ -227,8 +970,11 @@ class Piece(kxg.Token):
         self._player = player
         self._type = type
         self._xyw = cast_anything_to_vector(xyw)
+        self._tick_xyws = self._xyw, self._xyw
+        self._tile = None
         self._current_move = None
         self._current_pattern = None
+        self._cooldown_sec = 0
 
     def __repr__(self):
         return super().__repr__(
@@ -255,6 +1001,14 @@ class Piece(kxg.Token):
     def xyw(self):
         return self._xyw
 
+    @property
+    def tile(self):
+        """
+        The tile nearest to the piece, or None if the piece isn't in the world 
+        or isn't on the board.
+        """
+        return self._tile
+
     @property
     def radius(self):
         return self._type.radius
@@ -267,8 +1021,42 @@ class Piece(kxg.Token):
     def pattern_types(self):
         return self._type.pattern_types
 
+    def on_add_to_world(self, world):
+        self._tile = self._find_tile(world)
+        world._on_add_piece(self)
+
+    def on_update_game(self, dt):
+        # Remember where the piece was as of the last two ticks, so the GUI can 
+        # draw it somewhere in between.
+        self._tick_xyws = self._tick_xyws[1], self._xyw
+
+    def on_remove_from_world(self):
+        self.world._on_remove_piece(self)
+
+    @read_only
+    def interpolate_xyw(self, alpha):
+        """
+        Return the position of the piece the given fraction of the way from 
+        where it was two ticks ago to where it was one tick ago.
+
+        This means that anything drawn with this position lags one tick behind 
+        the simulation, but it also means that pieces move smoothly even if 
+        the frame rate is higher than the tick rate.  See 
+        `clock.FixedTimestep.alpha`.
+        """
+        xyw_before, xyw_after = self._tick_xyws
+        return xyw_before + (xyw_after - xyw_before) * alpha
+
     @read_only
     def find_possible_moves(self):
+        """
+        Return a list of every move the piece could make, ignoring any patterns 
+        that must be completed.
+
+        Sliding moves are returned as `Ray` objects, each of which represents 
+        every move along a particular direction.  Use `Ray.make_move()` to get 
+        the move to a particular tile.
+        """
         return list(collapse(
                 x.make_moves(self)
                 for x in self.move_types
@@ -278,9 +1066,12 @@ class Piece(kxg.Token):
     def find_legal_moves(self):
         """
         Return a list of moves that the piece can legally make, accounting for 
-        other pieces and patterns that must be completed.
+        other pieces.  Patterns that must be completed aren't accounted for 
+        yet.
+
+        The moves are cached by the world, see `World.find_legal_moves()`.
         """
-        raise NotImplementedError
+        return self.world.find_legal_moves(self)
 
     @property
     def current_move(self):
@@ -290,6 +1081,44 @@ class Piece(kxg.Token):
     def current_pattern(self):
         return self._current_pattern
 
+    @property
+    def cooldown_sec(self):
+        """
+        The time remaining before this piece can make another move.
+        """
+        return self._cooldown_sec
+
+    def set_type(self, type):
+        self._type = type
+
+        if self.world:
+            self.world._on_change_piece(self)
+
+    def set_xyw(self, xyw):
+        self._xyw = cast_anything_to_vector(xyw)
+
+        if self.world:
+            tile_before = self._tile
+            self._tile = self._find_tile(self.world)
+            self.world._on_move_piece(self, tile_before)
+
+    def set_current_move(self, move):
+        self._current_move = move
+
+    def set_current_pattern(self, pattern):
+        self._current_pattern = pattern
+
+    def set_cooldown_sec(self, cooldown_sec):
+        self._cooldown_sec = cooldown_sec
+
+        if self.world:
+            self.world._on_change_piece(self)
+
+    def _find_tile(self, world):
+        if world.board is None:
+            return None
+        return world.board.tile_from_xyw(self._xyw)
+
 class PieceType(kxg.Token):
     """
     Parameters for a particular piece type.
@@ -371,6 +1200,10 @@ class PatternType(kxg.Token):
     def name(self):
         return self._name
 
+    @property
+    def xyp_exprs(self):
+        return self._xyp_exprs
+
     @property
     def must_complete(self):
         return self._must_complete
@@ -416,13 +1249,316 @@ class Move(kxg.Token):
     def xyw_path(self):
         return self._xyw_path
 
+class CoverageMap:
+    """
+    The number of pieces belonging to a single player that can reach each tile 
+    of the board.
+
+    Coverage maps are maintained by the world (see `World.get_coverage()`) and 
+    should not be modified directly.
+    """
+
+    def __init__(self, board):
+        # Use column-major order, so that the flattened array can be indexed 
+        # by tile (i.e. y * w + x) without making a copy.
+        self._counts = np.zeros(board.size, dtype=np.int32, order='F')
+        self._counts_by_tile = self._counts.ravel(order='F')
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(total={self._counts.sum()})'
+
+    def count(self, xyw):
+        """
+        Return how many pieces can reach the tile nearest the given position.
+        """
+        x, y = xyt_from_xyw(xyw)
+        w, h = self._counts.shape
+
+        if not (0 <= x < w and 0 <= y < h):
+            return 0
+
+        return int(self._counts[x, y])
+
+    def count_tile(self, tile):
+        """
+        Return how many pieces can reach the given tile.
+        """
+        return int(self._counts_by_tile[tile])
+
+    def to_array(self):
+        """
+        Return a copy of the coverage counts, indexed by [x, y] in the world 
+        frame.
+        """
+        return self._counts.copy()
+
+    def _add_tiles(self, tiles, delta):
+        counts = self._counts_by_tile
+        for tile in tiles:
+            counts[tile] += delta
+
+class ZobristKeys:
+    """
+    The random 64-bit keys that are XORed together to make 
+    `World.zobrist_hash`.
+
+    As usual for Zobrist hashing, there's a key for each piece type and owner 
+    on each tile, and (because pieces that are cooling down can't move yet) a 
+    key for each cooldown bucket on each tile.  The keys for every tile are 
+    made at once, as a row of random numbers.  Each row is seeded with 
+    `[search] zobrist_seed` and whatever the row is for, rather than being 
+    drawn in turn from a single generator, so that every process (and every 
+    machine) agrees on the same keys without having to agree on the order in 
+    which they're needed.
+
+    Rows are only made when they're first needed, so there's at most one for 
+    each combination of piece type and owner, and one for each cooldown 
+    bucket.  Each row takes 8 bytes per tile.
+    """
+
+    def __init__(self, num_tiles, seed=0):
+        self.seed = seed
+
+        # The last key in each row is for pieces that aren't on a tile.
+        self._row_size = num_tiles + 1
+        self._rows = {}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(seed={self.seed}, rows={len(self._rows)})'
+
+    @classmethod
+    def from_config(cls, config, board):
+        return cls(board.num_tiles, seed=config['search']['zobrist_seed'])
+
+    def find_key(self, type_name, player_id, tile, cooldown_bucket):
+        """
+        Return the key for a piece of the given type and owner, on the given 
+        tile (or None), with the given amount of cooldown remaining.
+        """
+        if tile is None:
+            tile = -1
+
+        name = type_name.encode()
+        piece_row = self._find_row((0, player_id, len(name), *name))
+        cooldown_row = self._find_row((1, cooldown_bucket))
+
+        return int(piece_row[tile] ^ cooldown_row[tile])
+
+    def _find_row(self, key):
+        try:
+            return self._rows[key]
+        except KeyError:
+            rng = np.random.default_rng([self.seed, *key])
+            row = self._rows[key] = rng.integers(
+                    2**64, size=self._row_size, dtype=np.uint64)
+            return row
+
+class MoveCache:
+    """
+    The legal moves of each piece, remembered until something they depend on 
+    changes.
+
+    Each entry records the tiles its moves depend on: the tiles along each 
+    of the piece's rays (up to and including the tile that blocked the ray), 
+    and the tile each of its jumps lands on.  When a piece enters or leaves a 
+    tile, only the entries that depend on that tile are invalidated.  The 
+    cache is maintained by the world (see `World.find_legal_moves()`) and 
+    should not be modified directly.
+
+    Entries are only filled in when they're asked for, unlike coverage, which 
+    the world keeps up to date for every piece all the time.
+    """
+
+    def __init__(self):
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_invalidations = 0
+        self._entries = {}
+        self._dependents = defaultdict(set)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(entries={len(self._entries)}, hits={self.num_hits}, misses={self.num_misses}, invalidations={self.num_invalidations})'
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, piece):
+        return piece in self._entries
+
+    def get(self, piece):
+        """
+        Return the cached moves for the given piece, or None.
+        """
+        entry = self._entries.get(piece)
+
+        # The moves also depend on the type of the piece, which changes 
+        # rarely enough that it's simpler to check here than to track.
+        if entry is not None and entry[0] is not piece.type:
+            self.invalidate_piece(piece)
+            entry = None
+
+        if entry is None:
+            self.num_misses += 1
+            return None
+
+        self.num_hits += 1
+        return entry[1]
+
+    def put(self, piece, moves, deps):
+        self.invalidate_piece(piece, count=False)
+        self._entries[piece] = piece.type, tuple(moves), frozenset(deps)
+
+        for tile in deps:
+            self._dependents[tile].add(piece)
+
+    def invalidate_piece(self, piece, *, count=True):
+        try:
+            type, moves, deps = self._entries.pop(piece)
+        except KeyError:
+            return
+
+        if count:
+            self.num_invalidations += 1
+
+        for tile in deps:
+            pieces = self._dependents[tile]
+            pieces.discard(piece)
+            if not pieces:
+                del self._dependents[tile]
+
+    def invalidate_tile(self, tile):
+        for piece in list(self._dependents.get(tile, ())):
+            self.invalidate_piece(piece)
+
+    def clear(self):
+        self.num_invalidations += len(self._entries)
+        self._entries.clear()
+        self._dependents.clear()
+
+    def report(self):
+        """
+        Return a dictionary with the number of hits, misses, and 
+        invalidations, and the fraction of lookups that were hits.
+        """
+        num_lookups = self.num_hits + self.num_misses
+        return {
+                'entries': len(self._entries),
+                'hits': self.num_hits,
+                'misses': self.num_misses,
+                'invalidations': self.num_invalidations,
+                'hit_rate': self.num_hits / num_lookups if num_lookups else 0,
+        }
+
+class Ray:
+    """
+    Every move a sliding piece can make in a particular direction.
+
+    Listing each of these moves separately would require O(w+h) `Move` objects 
+    for every rook, bishop, and queen, which gets expensive on large boards.  
+    Instead, a ray just records where it starts, which direction it goes, and 
+    how many tiles it covers.  A `Move` (with a fully expanded path) is only 
+    made for the tile that's actually chosen.
+
+    Rays are cheap, short-lived objects rather than tokens, because they are 
+    never added to the world.
+    """
+
+    __slots__ = '_type', '_piece', '_xyw_step', '_length'
+
+    def __init__(self, type, piece, xyw_step, length):
+        self._type = type
+        self._piece = piece
+        self._xyw_step = cast_anything_to_vector(xyw_step)
+        self._length = length
+
+    def __repr__(self):
+        return '{}(type={!r}, piece={}, xyw_step={}, length={})'.format(
+                self.__class__.__name__,
+                self.type.name,
+                self.piece.id,
+                self.xyw_step,
+                self.length,
+        )
+
+    @property
+    def type(self):
+        return self._type
+
+    @property
+    def piece(self):
+        return self._piece
+
+    @property
+    def xyw_origin(self):
+        return self._piece.xyw
+
+    @property
+    def xyw_step(self):
+        return self._xyw_step
+
+    @property
+    def length(self):
+        return self._length
+
+    @property
+    def xyw_end(self):
+        return self.xyw_origin + self.xyw_step * self.length
+
+    @property
+    def xyw_path(self):
+        """
+        The path to the farthest tile on the ray.
+
+        This allows rays to be drawn in the same way as moves.
+        """
+        return [self.xyw_end]
+
+    def find_distance(self, xyw):
+        """
+        Return the number of steps from the origin of the ray to the tile 
+        nearest the given position, or None if that tile isn't on the ray.
+        """
+        x0, y0 = xyt_from_xyw(self.xyw_origin)
+        x, y = xyt_from_xyw(xyw)
+        dx, dy = xyt_from_xyw(self.xyw_step)
+
+        # Project the displacement onto the step, then make sure the 
+        # projection lands exactly on the requested tile.
+        num = (x - x0) * dx + (y - y0) * dy
+        den = dx * dx + dy * dy
+        i = num // den
+
+        if num % den or not 0 < i <= self.length:
+            return None
+        if (x0 + i * dx, y0 + i * dy) != (x, y):
+            return None
+
+        return i
+
+    def contains(self, xyw):
+        return self.find_distance(xyw) is not None
+
+    def iter_xyw_tiles(self):
+        for i in range(1, self.length + 1):
+            yield self.xyw_origin + self.xyw_step * i
+
+    def make_move(self, xyw):
+        """
+        Return a move to the tile nearest the given position.
+        """
+        i = self.find_distance(xyw)
+        if i is None:
+            raise ValueError(f"{xyw} is not on {self!r}")
+        return Move(self.type, self.piece, [self.xyw_origin + self.xyw_step * i])
+
 class MoveType(kxg.Token):
 
-    def __init__(self, name, *, mode, xyp_exprs):
+    def __init__(self, name, *, mode, xyp_exprs, xyp_steps=()):
         super().__init__()
         self._name = name
         self._mode = mode
         self._xyp_exprs = xyp_exprs
+        self._xyp_steps = xyp_steps
 
     def __repr__(self):
         return super().__repr__(name=self.name)
@@ -431,6 +1567,14 @@ class MoveType(kxg.Token):
     def name(self):
         return self._name
 
+    @property
+    def xyp_exprs(self):
+        return self._xyp_exprs
+
+    @property
+    def xyp_steps(self):
+        return self._xyp_steps
+
     @property
     def is_jump(self):
         return self._mode == 'jump'
@@ -446,7 +1590,47 @@ class MoveType(kxg.Token):
                 piece,
                 self.world.board,
         )
-        return [Move(self, piece, x) for x in xyw_paths]
+        moves = [
+                Move(self, piece, x)
+                for x in clip_xyw_paths(xyw_paths, self.world.board)
+        ]
+        return moves + self.make_rays(piece)
+
+    @read_only
+    def make_moves_batch(self, pieces):
+        """
+        Return a list of possible moves for each of the given pieces.
+        """
+        board = self.world.board
+        xyw_paths_batch = xyw_paths_from_xyp_exprs_batch(
+                self._xyp_exprs,
+                pieces,
+                board,
+        )
+        return [
+                [
+                    Move(self, piece, [Vector(*xyw) for xyw in xyw_path])
+                    for xyw_paths in xyw_paths_by_expr
+                    for xyw_path in clip_xyw_paths(xyw_paths, board)
+                ] + self.make_rays(piece)
+                for piece, xyw_paths_by_expr in zip(pieces, xyw_paths_batch)
+        ]
+
+    @read_only
+    def make_rays(self, piece):
+        rays = []
+
+        for xyw_step in self.find_xyw_steps(piece):
+            length = self.world.measure_ray(piece.xyw, xyw_step, piece.player)
+            if length:
+                rays.append(Ray(self, piece, xyw_step, length))
+
+        return rays
+
+    @read_only
+    def find_xyw_steps(self, piece):
+        heading = piece.player.heading
+        return [heading * Vector.from_anything(x) for x in self._xyp_steps]
 
 def xyw_paths_from_xyp_exprs(xyp_exprs, piece, board, any_ok=False):
     xyw_paths = []
@@ -489,7 +1673,7 @@ def xyw_paths_from_xyp_expr(xyp_expr, piece, board, any_ok=False):
     any = {'any': float('nan')} if any_ok else {}
 
     xyp_piece = player.xyp_from_xyw(piece.xyw)
-    xyp_eval = eval(xyp_expr, {
+    xyp_eval = eval(_compile_xyp_expr(xyp_expr), {
             'x': xyp_piece.x,
             'y': xyp_piece.y,
             'w': board.width,
@@ -511,6 +1695,185 @@ def xyw_paths_from_xyp_expr(xyp_expr, piece, board, any_ok=False):
 
     return [[player.xyw_from_xyp(xyp) for xyp in _] for _ in xyp_eval]
 
+def xyw_paths_from_xyp_exprs_batch(xyp_exprs, pieces, board, any_ok=False):
+    """
+    Evaluate each of the given expressions for each of the given pieces.
+
+    Returns:
+        A list with an entry for each piece.  Each entry is a list with an item 
+        for each expression, as returned by `xyw_paths_from_xyp_expr_batch()`.
+    """
+    xyw_paths_by_expr = [
+            xyw_paths_from_xyp_expr_batch(x, pieces, board, any_ok)
+            for x in xyp_exprs
+    ]
+    return [list(x) for x in zip(*xyw_paths_by_expr)] or [[] for _ in pieces]
+
+def xyw_paths_from_xyp_expr_batch(xyp_expr, pieces, board, any_ok=False):
+    """
+    Evaluate the given expression for all of the given pieces at once.
+
+    The expression is evaluated a single time, with the `x` and `y` variables 
+    set to numpy arrays containing the player-frame coordinates of every 
+    piece.  Expressions that can't be evaluated this way (e.g. because they 
+    use `range(x)` or `max(x, y)`) are instead evaluated separately for each 
+    piece, see `xyw_paths_from_xyp_expr()`.
+
+    Returns:
+        A list with an entry for each piece.  Each entry is a sequence of 
+        paths, and each path is an array of shape (number of waypoints, 2) 
+        containing absolute coordinates.
+    """
+    if not pieces:
+        return []
+
+    origins = np.array([x.player.origin.tuple for x in pieces])
+    headings = np.array([x.player.heading.tuple for x in pieces])
+    xyw_pieces = np.array([x.xyw.tuple for x in pieces])
+    xyp_pieces = headings * (xyw_pieces - origins)
+
+    try:
+        xyp_paths = _eval_xyp_expr_batch(xyp_expr, xyp_pieces, board, any_ok)
+
+    # These are the errors raised when the expression does something with `x` 
+    # or `y` that only works for scalars, e.g. `range(x)` or `max(x, y)`.  
+    # Anything else (e.g. a typo in the config) is a real error.  If the 
+    # expression is also wrong for scalars, the error is raised again below.
+    except (TypeError, ValueError, IndexError) as err:
+        _log_unbatchable_xyp_expr(xyp_expr, err)
+        return [
+                [
+                    np.array([xyw.tuple for xyw in xyw_path])
+                    for xyw_path in xyw_paths_from_xyp_expr(
+                        xyp_expr, piece, board, any_ok)
+                ]
+                for piece in pieces
+        ]
+
+    xyw_paths = (
+            origins[:, None, None, :] +
+            headings[:, None, None, :] * xyp_paths
+    )
+    return list(xyw_paths)
+
+def clip_xyw_paths(xyw_paths, board):
+    """
+    Discard any of the given paths that leave the playable part of the board.
+
+    The paths can be a list of paths or, as returned by 
+    `xyw_paths_from_xyp_expr_batch()`, an array of shape (paths, waypoints, 2).
+    """
+    if isinstance(xyw_paths, np.ndarray):
+        return xyw_paths[board.find_playable_xyw_paths(xyw_paths)]
+
+    return [x for x in xyw_paths if board.is_playable_xyw_path(x)]
+
+def xyt_from_xyw(xyw):
+    x, y = xyw
+    return round(x), round(y)
+
+def _find_ray_lengths_by_row(playable, dx, dy):
+    """
+    Return the number of times the given step can be taken from each tile of 
+    the given grid of playable tiles (indexed by row, then column) before 
+    reaching a tile that isn't playable, or the edge of the grid.  The step 
+    must move to a different row.
+    """
+    h, w = playable.shape
+    lengths = np.zeros((h, w), dtype=np.int32)
+
+    x = np.arange(w)
+    x_next = x + dx
+    on_grid = (x_next >= 0) & (x_next < w)
+    x_next = np.where(on_grid, x_next, 0)
+
+    ys = range(h - 1, -1, -1) if dy > 0 else range(h)
+
+    for y in ys:
+        y_next = y + dy
+        if not 0 <= y_next < h:
+            continue
+
+        open = on_grid & playable[y_next, x_next]
+        lengths[y] = np.where(open, lengths[y_next, x_next] + 1, 0)
+
+    return lengths
+
+def _parse_board_layout(layout, width, height):
+    """
+    Convert a board layout (see `Board`) into the kind of each tile, indexed 
+    by tile.
+    """
+    if len(layout) != height:
+        raise ValueError(f"board layout has {len(layout)} rows, expected {height}")
+
+    kinds = bytearray(width * height)
+
+    for i, row in enumerate(layout):
+        if len(row) != width:
+            raise ValueError(f"board layout row {i+1} has {len(row)} tiles, expected {width}: {row!r}")
+
+        y = height - i - 1
+        for x, char in enumerate(row):
+            try:
+                kinds[y * width + x] = Board.TILE_CHARS[char]
+            except KeyError:
+                raise ValueError(f"unknown tile {char!r} in board layout row {i+1}: {row!r}") from None
+
+    return bytes(kinds)
+
+@lru_cache(maxsize=None)
+def _compile_xyp_expr(xyp_expr):
+    return compile(xyp_expr, xyp_expr, 'eval')
+
+# The expressions that couldn't be evaluated for many pieces at once, and have 
+# already been logged.
+_unbatchable_xyp_exprs = set()
+
+def _log_unbatchable_xyp_expr(xyp_expr, err):
+    # Only log each expression once, since the same expressions are evaluated 
+    # over and over.
+    if xyp_expr in _unbatchable_xyp_exprs:
+        return
+
+    _unbatchable_xyp_exprs.add(xyp_expr)
+    info(f"evaluating {xyp_expr!r} one piece at a time: {err.__class__.__name__}: {err}")
+
+def _eval_xyp_expr_batch(xyp_expr, xyp_pieces, board, any_ok):
+    """
+    Evaluate the given expression with `x` and `y` bound to arrays.
+
+    Returns an array of shape (pieces, paths, waypoints, 2).  Raises an 
+    exception if the expression can't be evaluated this way, which includes 
+    any expression producing paths with different numbers of waypoints.
+    """
+    any_var = {'any': float('nan')} if any_ok else {}
+    xyp_eval = eval(_compile_xyp_expr(xyp_expr), {
+            'x': xyp_pieces[:, 0],
+            'y': xyp_pieces[:, 1],
+            'w': board.width,
+            'h': board.height,
+            **any_var,
+    })
+
+    # Normalize the result to a list of paths.
+    if isinstance(xyp_eval, tuple):
+        xyp_eval = [[xyp_eval]]
+    elif xyp_eval and isinstance(xyp_eval[0], tuple):
+        xyp_eval = [xyp_eval]
+
+    num_waypoints = len(xyp_eval[0])
+    if any(len(x) != num_waypoints for x in xyp_eval):
+        raise ValueError("paths have different numbers of waypoints")
+
+    xyp_paths = np.empty((len(xyp_pieces), len(xyp_eval), num_waypoints, 2))
+    for i, xyp_path in enumerate(xyp_eval):
+        for j, (xp, yp) in enumerate(xyp_path):
+            xyp_paths[:, i, j, 0] = xp
+            xyp_paths[:, i, j, 1] = yp
+
+    return xyp_paths
+
 # Pseudo-code
 
 class Attack:
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from cherts.camera import *
+from pytest import approx
+
+def make_camera():
+    return Camera(
+            (400, 400),
+            min_px_per_tile=4,
+            max_px_per_tile=128,
+            zoom_step=2,
+            placeholder_px_per_tile=16,
+    )
+
+@pytest.mark.parametrize(
+        'xyp_min, xyp_max, xyp_center, px_per_tile', [
+            ((0, 0), (7, 7), (3.5, 3.5), 50),
+            ((0, 0), (15, 7), (7.5, 3.5), 25),
+            ((-7, -7), (0, 0), (-3.5, -3.5), 50),
+            ((0, 0), (255, 255), (127.5, 127.5), 4),
+            ((0, 0), (0, 0), (0, 0), 128),
+        ],
+)
+def test_camera_fit(xyp_min, xyp_max, xyp_center, px_per_tile):
+    camera = make_camera()
+    camera.fit(xyp_min, xyp_max)
+
+    assert tuple(camera.xyp_center) == approx(xyp_center)
+    assert camera.px_per_tile == approx(px_per_tile)
+
+def test_camera_coords():
+    camera = make_camera()
+    camera.fit((0, 0), (7, 7))
+
+    # The corners of the window are the outer corners of the corner tiles.
+    assert tuple(camera.xyg_from_xyp((-0.5, -0.5))) == approx((0, 0))
+    assert tuple(camera.xyg_from_xyp((7.5, 7.5))) == approx((400, 400))
+    assert tuple(camera.xyp_from_xyg((25, 75))) == approx((0, 1))
+
+    camera.pan(50, -100)
+    assert tuple(camera.xyg_from_xyp((0, 1))) == approx((75, -25))
+    assert tuple(camera.xyp_from_xyg((75, -25))) == approx((0, 1))
+
+def test_camera_zoom():
+    camera = make_camera()
+    camera.fit((0, 0), (7, 7))
+    version = camera.version
+
+    # The point under the anchor stays put.
+    camera.zoom(1, (25, 75))
+    assert camera.px_per_tile == 100
+    assert tuple(camera.xyp_from_xyg((25, 75))) == approx((0, 1))
+    assert camera.version > version
+
+    # Zooming past the limit stops at the limit.  Zooming further doesn't
+    # count as a change.
+    camera.zoom(5)
+    assert camera.px_per_tile == 128
+
+    version = camera.version
+    camera.zoom(1)
+    assert camera.version == version
+
+    camera.zoom(-10)
+    assert camera.px_per_tile == 4
+    assert camera.use_placeholders
+
+@pytest.mark.parametrize(
+        'zoom, pan, margin, expected', [
+            (0, (0, 0), 0, ((0, 0), (7, 7))),
+            (0, (0, 0), 1, ((-1, -1), (8, 8))),
+            (1, (0, 0), 0, ((2, 2), (5, 5))),
+            (1, (25, 0), 0, ((1, 2), (5, 5))),
+            (0, (-400, 0), 0, ((8, 0), (15, 7))),
+        ],
+)
+def test_camera_visible_rect(zoom, pan, margin, expected):
+    camera = make_camera()
+    camera.fit((0, 0), (7, 7))
+    camera.zoom(zoom)
+    camera.pan(*pan)
+
+    assert camera.find_visible_xyp_rect(margin) == expected
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from cherts.clock import *
+
+@pytest.mark.parametrize(
+        'frames, ticks, alpha', [
+            ([0.05] * 20, [1] * 20, 0),
+            ([1/60] * 7, [0, 0, 1, 0, 0, 1, 0], 1/3),
+            ([0.02, 0.02, 0.02], [0, 0, 1], 0.2),
+            ([0.125], [2], 0.5),
+            ([1.0], [5], 0),
+        ],
+)
+def test_fixed_timestep(frames, ticks, alpha):
+    timestep = FixedTimestep(tick_rate=20, max_ticks_per_update=5)
+
+    assert [timestep.advance(x) for x in frames] == ticks
+    assert timestep.tick == sum(ticks)
+    assert timestep.alpha == pytest.approx(alpha)
+
+def test_fixed_timestep_drop_ticks():
+    timestep = FixedTimestep(tick_rate=10, max_ticks_per_update=2)
+
+    # Time beyond what the simulation is allowed to catch up on is dropped, so
+    # the next frame starts from scratch.
+    assert timestep.advance(0.55) == 2
+    assert timestep.num_dropped_ticks == 3
+    assert timestep.alpha == pytest.approx(0.5)
+    assert timestep.advance(0.05) == 1
+    assert timestep.elapsed_sec == pytest.approx(0.3)
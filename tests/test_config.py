@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+from copy import deepcopy
+from cherts.config import load_config, merge_config, diff_config
+
+def test_diff_config_unchanged():
+    config = load_config()
+    assert diff_config(config, deepcopy(config)) == {
+            'moves': set(),
+            'patterns': set(),
+            'pieces': set(),
+    }
+
+def test_diff_config_cascade():
+    old_config = load_config()
+    new_config = deepcopy(old_config)
+    merge_config(new_config, {
+            'moves': {'rook': {'rays': [[0, 1]]}},
+            'pieces': {'pawn': {'radius': 0.3}},
+    })
+
+    # The queen and the rook both use the rook move, so they both need to be 
+    # rebuilt.
+    assert diff_config(old_config, new_config) == {
+            'moves': {'rook'},
+            'patterns': set(),
+            'pieces': {'pawn', 'rook', 'queen'},
+    }
+
+def test_diff_config_added_removed():
+    old_config = load_config()
+    new_config = deepcopy(old_config)
+    del new_config['patterns']['spawn']
+    new_config['moves']['castle'] = {'mode': 'slide', 'waypoints': ['x+2, y']}
+
+    diff = diff_config(old_config, new_config)
+
+    assert diff['moves'] == {'castle'}
+    assert diff['patterns'] == {'spawn'}
+    assert diff['pieces'] == {'king', 'queen'}
+
+def test_merge_config():
+    config = {
+            'a': {'b': 1, 'c': {'d': 2}},
+            'e': [1, 2, 3],
+            'f': 4,
+    }
+    merge_config(config, {
+            'a': {'c': {'g': 5}},
+            'e': [6],
+            'f': {'h': 7},
+    })
+
+    # Tables are merged, but everything else is replaced.
+    assert config == {
+            'a': {'b': 1, 'c': {'d': 2, 'g': 5}},
+            'e': [6],
+            'f': {'h': 7},
+    }
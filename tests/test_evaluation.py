@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+import random
+import numpy as np
+
+from cherts.config import load_config
+from cherts.lockstep import build_world, LockstepSimulation, CommandBatch, MoveCommand
+from cherts.evaluation import PositionEvaluator
+from cherts.notation import Position
+
+def make_positions(config, num_positions, num_ticks):
+    rng = random.Random(0)
+    positions = []
+
+    for _ in range(num_positions):
+        world = build_world(config)
+        simulation = LockstepSimulation(world, tick_rate=1)
+
+        for tick in range(num_ticks):
+            batches = []
+            for player in world.players:
+                pieces = sorted(player.pieces, key=lambda x: x.id)
+                piece = rng.choice(pieces)
+                tiles = sorted(world.find_reachable_tiles(piece))
+                commands = [MoveCommand(piece.id, rng.choice(tiles))] if tiles else []
+                batches.append(CommandBatch(tick, player.id, commands))
+
+            simulation.apply(batches)
+
+        positions.append(world)
+
+    return positions
+
+def test_evaluate_matches_world():
+    config = load_config()
+    evaluator = PositionEvaluator(config)
+    worlds = make_positions(config, 8, 30)
+    values = config['evaluation']['piece_values']
+
+    snapshots = np.stack([evaluator.snapshot(x, num_pieces=32) for x in worlds])
+    terms = evaluator.evaluate_terms(snapshots)
+    scores = evaluator.evaluate(snapshots)
+
+    for i, world in enumerate(worlds):
+        me, them = world.players
+
+        def material(player):
+            return sum(values[x.type.name] for x in player.pieces)
+
+        def mobility(player):
+            own_tiles = {x.tile for x in player.pieces}
+            return sum(
+                    len(world.find_reachable_tiles(x) - own_tiles)
+                    for x in player.pieces
+            )
+
+        def coverage(player):
+            return np.count_nonzero(world.get_coverage(player).to_array())
+
+        assert terms['material'][i] == material(me) - material(them)
+        assert terms['mobility'][i] == mobility(me) - mobility(them)
+        assert terms['coverage'][i] == coverage(me) - coverage(them)
+
+    # The opponent's score is the same, but negated.
+    assert np.allclose(evaluator.evaluate(snapshots, player=1), -scores)
+
+def test_snapshot_position():
+    config = load_config()
+    evaluator = PositionEvaluator(config)
+
+    for world in make_positions(config, 4, 10):
+        position = Position.from_world(world)
+        snapshot = evaluator.snapshot_position(position, 32)
+        np.testing.assert_allclose(
+                evaluator.evaluate(snapshot),
+                evaluator.evaluate(evaluator.snapshot(world, 32)),
+        )
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import socket
+import asyncio
+import kxg
+import linersock
+
+from cherts import World, AiActor
+from cherts.config import load_config
+from cherts.host import MatchHost
+
+async def update_until(theaters, condition, timeout_sec=10):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout_sec
+
+    while not condition():
+        assert loop.time() < deadline, "timed out"
+
+        for theater in theaters:
+            if not theater.is_finished:
+                theater.update(0.05)
+
+        await asyncio.sleep(0.01)
+
+async def play_loopback_match():
+    match_host = MatchHost(load_config())
+    await match_host.start('127.0.0.1', 0)
+
+    try:
+        worlds, pipes, theaters = [], [], []
+
+        for _ in range(2):
+            sock = socket.create_connection(('127.0.0.1', match_host.port))
+            world = World()
+            pipe = linersock.Pipe(sock)
+            stage = kxg.MultiplayerClientGameStage(world, AiActor(), pipe)
+
+            worlds.append(world)
+            pipes.append(pipe)
+            theaters.append(kxg.Theater(stage))
+
+        # Each client sets up its own player, sends it to the host, and
+        # receives the other client's player back.
+        await update_until(theaters, lambda: len(match_host.matches) == 1)
+        match, = match_host.matches
+        assert match.world.rules is match_host.rules
+        await update_until(theaters, lambda: all(
+            len(x.players) == 2 for x in [*worlds, match.world]))
+
+        for world in worlds:
+            assert {x.id for x in world.players} == \
+                   {x.id for x in match.world.players}
+
+        # When one client leaves, the host should end the match and close the
+        # connection to the other client.
+        theaters[0].exit()
+        pipes[0].close()
+
+        await update_until(theaters[1:], lambda: not match_host.matches)
+        await update_until(theaters[1:], lambda: pipes[1].finished())
+
+    finally:
+        await match_host.close()
+
+def test_loopback_match():
+    asyncio.run(play_loopback_match())
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+import random
+import pytest
+
+from cherts.config import load_config
+from cherts.lockstep import *
+
+def make_peers(config):
+    params = config['lockstep']
+    peers = []
+
+    for player_id in Player.ACTOR_IDS:
+        simulation = LockstepSimulation(
+                build_world(config),
+                tick_rate=params['tick_rate'],
+        )
+        peer = LockstepPeer(
+                simulation,
+                player_id,
+                input_delay_ticks=params['input_delay_ticks'],
+                checksum_interval_ticks=params['checksum_interval_ticks'],
+        )
+        peers.append(peer)
+
+    return peers
+
+def play_ticks(peers, num_ticks, rng):
+    for _ in range(num_ticks):
+        packets = []
+
+        for peer in peers:
+            world = peer.simulation.world
+            player = world.get_token(peer.player_id)
+
+            for piece in player.pieces:
+                tiles = sorted(world.find_reachable_tiles(piece))
+                if tiles and rng.random() < 0.1:
+                    peer.queue_command(MoveCommand(piece.id, rng.choice(tiles)))
+
+            packets.append((peer, peer.end_tick()))
+
+        for sender, packet in packets:
+            for peer in peers:
+                if peer is not sender:
+                    peer.receive(packet)
+
+        for peer in peers:
+            assert peer.advance() == 1
+
+def test_command_batch_round_trip():
+    batch = CommandBatch(
+            tick=1234,
+            player_id=3,
+            commands=[MoveCommand(17, 40), MoveCommand(90000, 63)],
+            checksum=(1220, 0xdeadbeef),
+    )
+    packet = batch.pack()
+    batch2 = CommandBatch.unpack(packet)
+
+    assert len(packet) == 8 + 8 + 2 * 8
+    assert batch2.tick == batch.tick
+    assert batch2.player_id == batch.player_id
+    assert batch2.commands == batch.commands
+    assert batch2.checksum == batch.checksum
+
+    with pytest.raises(ValueError):
+        CommandBatch.unpack(packet + b'\0')
+
+def test_command_batch_limits():
+    # Boards can have more tiles than fit in 16 bits.
+    max_tile = 2**32 - 1
+    commands = [MoveCommand(i, max_tile - i) for i in range(MAX_COMMANDS)]
+    batch = CommandBatch(tick=1, player_id=2, commands=commands)
+
+    assert CommandBatch.unpack(batch.pack()).commands == commands
+
+    batch.commands.append(MoveCommand(0, 0))
+
+    with pytest.raises(ValueError, match=f"can't send more than {MAX_COMMANDS} commands in one tick, got {MAX_COMMANDS + 1}"):
+        batch.pack()
+
+def test_peers_stay_in_sync():
+    config = load_config()
+    peers = make_peers(config)
+    rng = random.Random(0)
+
+    play_ticks(peers, 200, rng)
+
+    states = [
+            [(x.id, x.tile) for x in peer.simulation.world.iter_pieces()]
+            for peer in peers
+    ]
+    assert states[0] == states[1]
+    assert peers[0].simulation.checksum() == peers[1].simulation.checksum()
+
+def test_desync_detected():
+    config = load_config()
+    peers = make_peers(config)
+    rng = random.Random(0)
+
+    play_ticks(peers, 10, rng)
+
+    # Move a piece on one peer only, as if its simulation had diverged.
+    world = peers[0].simulation.world
+    piece = next(world.iter_pieces())
+    tile = min(world.find_reachable_tiles(piece))
+
+    with world._unlock_temporarily():
+        piece.set_xyw(world.board.xyw_from_tile(tile))
+
+    with pytest.raises(DesyncError):
+        play_ticks(peers, 20, rng)
+
+def test_build_world_many_players():
+    config = load_config()
+    config['board']['width'] = 32
+
+    world = build_world(config, num_players=8)
+    pieces = list(world.iter_pieces())
+
+    assert len(world.players) == 8
+    assert len(pieces) == 8 * len(config['setup']['pieces'])
+    assert len({x.tile for x in pieces}) == len(pieces)
+
+def test_snapshot_restore():
+    config = load_config()
+    peers = make_peers(config)
+    rng = random.Random(0)
+    simulation = peers[0].simulation
+
+    play_ticks(peers, 10, rng)
+    snapshot = simulation.snapshot()
+    checksum = simulation.checksum()
+    reachable = {
+            x.id: x.world.find_reachable_tiles(x)
+            for x in simulation.world.iter_pieces()
+    }
+
+    # Play long enough for some pieces to be captured, then go back.
+    play_ticks(peers, 200, rng)
+    assert simulation.checksum() != checksum
+
+    simulation.restore(snapshot)
+
+    assert simulation.tick == 10
+    assert simulation.snapshot() == snapshot
+    assert simulation.checksum() == checksum
+    assert reachable == {
+            x.id: x.world.find_reachable_tiles(x)
+            for x in simulation.world.iter_pieces()
+    }
+
+def test_capture_forgets_cooldown():
+    from cherts.notation import load_world
+
+    config = load_config()
+    world = load_world(config, 'r7/8/8/8/8/8/8/R7')
+    simulation = LockstepSimulation(world, tick_rate=20)
+    white, black = Player.find_actor_ids(2)
+    board = world.board
+
+    def piece_on(xyt):
+        return world.find_piece_on_tile(board.tile_from_xyt(xyt))
+
+    def apply(player_id=None, command=None):
+        simulation.apply([
+            CommandBatch(simulation.tick, id, [command] if id == player_id else [])
+            for id in (white, black)
+        ])
+
+    # The black rook moves, so it's still cooling down when it's captured.
+    rook = piece_on((0, 7))
+    apply(black, MoveCommand(rook.id, board.tile_from_xyt((0, 6))))
+    captured_id = rook.id
+    assert captured_id in simulation._cooldown_ticks
+
+    apply(white, MoveCommand(piece_on((0, 0)).id, board.tile_from_xyt((0, 6))))
+    assert piece_on((0, 6)).player.id == white
+
+    # The next tick used to fail, looking up the cooldown of the captured
+    # piece.
+    apply()
+    assert captured_id not in simulation._cooldown_ticks
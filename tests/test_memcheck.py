@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+from cherts.memcheck import *
+
+PARAMS = {
+        'warmup_sec': 60,
+        'sample_interval_sec': 1,
+        'budget_kib': 256,
+        'token_budget': 50,
+}
+
+def test_memcheck_shorter_than_warmup():
+    check = MemoryCheck(PARAMS)
+    check.start()
+    try:
+        for _ in range(3):
+            check.on_update_game(None, 0.5)
+
+        # Allocate something that's still alive at the end of the game, so
+        # there's some growth to measure.
+        garbage = [bytearray(1024) for _ in range(64)]
+        check.finish(None)
+    finally:
+        check.stop()
+
+    # The growth is measured from the sample taken when the check started,
+    # not from a sample taken part way through the game.
+    assert check.samples[0]['elapsed_sec'] == 0
+    assert check.samples[0]['snapshot'] is not None
+    assert check.growth_kib >= 64
+    assert check.find_top_allocations(1)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+import kxg
+import pytest
+import cherts
+
+from cherts.actors import BatchingActor
+from cherts.config import load_config
+from cherts.messages import MessageBatch, ReloadConfig, is_batched
+from cherts.notation import load_world, dump_world
+
+class Append(kxg.Message):
+
+    def __init__(self, value):
+        self.value = value
+
+    def on_check(self, world):
+        if not self.was_sent_by_referee():
+            raise kxg.MessageCheck("only the referee can append.")
+
+    def on_execute(self, world):
+        world.log.append(self.value)
+
+class LogWorld(kxg.World):
+
+    def __init__(self):
+        super().__init__()
+        self.log = []
+
+class Referee(BatchingActor, kxg.Referee):
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+        self.received = []
+
+    @kxg.subscribe_to_message(MessageBatch)
+    def on_batch(self, batch):
+        self.batches.append(batch)
+
+    @kxg.subscribe_to_message(Append)
+    def on_append(self, message):
+        self.received.append((message.value, is_batched(message)))
+
+def test_batch_executes_in_order():
+    world = LogWorld()
+    referee = Referee()
+    kxg.Forum().connect_everyone(world, [referee])
+
+    for i in range(3):
+        referee.queue_message(Append(i))
+    referee.flush_messages()
+
+    assert world.log == [0, 1, 2]
+    assert len(referee.batches) == 1
+    assert referee.received == [(0, True), (1, True), (2, True)]
+
+    # A single message is sent on its own.
+    referee.queue_message(Append(3))
+    referee.flush_messages()
+
+    assert world.log == [0, 1, 2, 3]
+    assert len(referee.batches) == 1
+    assert referee.received[-1] == (3, False)
+
+def start_game(config, num_players=2):
+    world = cherts.World()
+    referee = cherts.Referee(config)
+    actors = [referee] + [cherts.AiActor() for i in range(num_players)]
+    theater = kxg.Theater(kxg.GameStage(world, kxg.Forum(), actors))
+
+    # The first update sets up the world, and the second sets up the players.
+    theater.update(0.05)
+    theater.update(0.05)
+    assert len(world.players) == num_players
+
+    return world, referee
+
+def test_reload_config():
+    world, referee = start_game(load_config())
+    pawns = [x for x in world.iter_pieces() if x.type.name == 'pawn']
+    rooks = [x for x in world.iter_pieces() if x.type.name == 'rook']
+    old_pawn_type = world.piece_types['pawn']
+    old_knight_type = world.piece_types['knight']
+    old_coverage = world.get_coverage(world.players[0]).to_array()
+
+    # Let pawns move like kings, and rooks only sideways.  The rook move type 
+    # is shared by rooks and queens, so both piece types are replaced.
+    config = load_config()
+    config['pieces']['pawn']['moves'] = ['king']
+    config['moves']['rook']['rays'] = [[1, 0], [-1, 0]]
+    referee >> ReloadConfig(world, config)
+
+    assert world.config is config
+    assert world.piece_types['pawn'] is not old_pawn_type
+    assert world.piece_types['knight'] is old_knight_type
+    assert old_pawn_type not in world
+
+    for piece in pawns:
+        assert piece.type is world.piece_types['pawn']
+        assert [x.name for x in piece.type.move_types] == ['king']
+    for piece in rooks:
+        assert piece.type is world.piece_types['rook']
+        assert piece.type.move_types[0] is world.move_types['rook']
+
+    # Everything derived from the piece types should agree with a world that
+    # was built with the new config in the first place.
+    expected = load_world(config, dump_world(world))
+
+    for player in world.players:
+        expected_player = expected.get_token(player.id)
+        assert (
+                world.get_coverage(player).to_array() ==
+                expected.get_coverage(expected_player).to_array()
+        ).all()
+
+    assert (world.get_coverage(world.players[0]).to_array() != old_coverage).any()
+    assert world.zobrist_hash == expected.zobrist_hash
+
+    # Piece types can't be removed while there are still pieces of that type.
+    config = load_config()
+    del config['pieces']['pawn']
+
+    with pytest.raises(kxg.MessageCheck, match="can't remove piece type 'pawn'"):
+        referee >> ReloadConfig(world, config)
+
+    assert 'pawn' in world.piece_types
+    assert all(x.type is world.piece_types['pawn'] for x in pawns)
+
+def test_reload_config_move_cache():
+    world, referee = start_game(load_config())
+    cache = world.move_cache
+    knights = [x for x in world.iter_pieces() if x.type.name == 'knight']
+    num_pieces = len(list(world.iter_pieces()))
+
+    def find_moves(world):
+        return {
+                (piece.player.color, piece.tile):
+                    sorted((x.type.name, x.xyw_path[-1].tuple) for x in moves)
+                for piece, moves in world.find_legal_moves_by_piece().items()
+        }
+
+    find_moves(world)
+
+    # A reload that doesn't change any piece, move, or pattern types keeps 
+    # every cached move.
+    config = load_config()
+    config['evaluation']['mobility'] = 0.2
+    referee >> ReloadConfig(world, config)
+
+    report = cache.report()
+    find_moves(world)
+
+    assert cache.report()['hits'] == report['hits'] + num_pieces
+    assert cache.report()['misses'] == report['misses']
+
+    # A reload that changes one piece type only forgets the moves of the 
+    # pieces of that type.
+    config = load_config()
+    config['pieces']['knight']['moves'] = ['king']
+    referee >> ReloadConfig(world, config)
+
+    report = cache.report()
+    moves = find_moves(world)
+
+    assert cache.report()['hits'] == report['hits'] + num_pieces - len(knights)
+    assert cache.report()['misses'] == report['misses'] + len(knights)
+
+    # The moves that were kept are the same as if they'd been found from 
+    # scratch.
+    assert moves == find_moves(load_world(config, dump_world(world)))
+
+def test_setup_players():
+    # With four players on an 8x8 board, each player only gets the half of 
+    # their edge nearest to their origin, and only sets up the pieces that fit 
+    # there.
+    config = load_config()
+    world, referee = start_game(config, num_players=4)
+    pieces = list(world.iter_pieces())
+    num_pieces = sum(x['pos'][0] < 4 for x in config['setup']['pieces'])
+
+    for player in world.players:
+        assert player.width == 4
+        assert len(player.pieces) == num_pieces
+
+        for piece in player.pieces:
+            assert 0 <= player.xyp_from_xyw(piece.xyw).x < 4
+
+    assert len({x.tile for x in pieces}) == len(pieces)
+    assert all(world.board.is_playable(x.tile) for x in pieces)
+
+def test_setup_players_err():
+    config = load_config()
+    config['board']['width'] = 1
+
+    with pytest.raises(ValueError, match="too narrow for 4 players"):
+        start_game(config, num_players=4)
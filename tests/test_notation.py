@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from cherts.config import load_config
+from cherts.lockstep import build_world
+from cherts.notation import *
+
+LETTERS = load_config()['notation']['letters']
+START = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBKQBNR'
+
+@pytest.mark.parametrize(
+        'text', [
+            START,
+            '8/8/8/8/8/8/8/8',
+            'k7/8/8/3Q4/8/8/8/7K',
+            '12/12/5kK5 6,0~2.5',
+            'r7/8/8/8/8/8/8/R7 0,7>rook:0,6 0,0~0.25@0,0.5>rook:0,3',
+            '1n6/8/8/8/8/8/8/8 1,7@1.25,6.75>knight:1,6;3,5',
+            '(k2)7/8/8/8/8/8/8/7(q11) 7,0~1',
+        ],
+)
+def test_parse_dump_position(text):
+    position = parse_position(text, LETTERS)
+    assert dump_position(position, LETTERS) == text
+
+@pytest.mark.parametrize(
+        'text, error', [
+            ('8/7/8/8/8/8/8/8', "row 2 has 7 tiles, expected 8"),
+            ('8/8/8/8/8/8/8/7x', "unknown piece 'x'"),
+            ('8/8/8/8/8/8/8/K7 1,0~2', "refers to an empty tile"),
+            ('8/8/8/8/8/8/8/K7 0,0~two', "can't parse annotation"),
+            ('K7/8/8/8/8/8/8/8 0,7@3,3', "isn't on tile 0,7"),
+            ('KQ6/8/8/8/8/8/8/8 1,7@0,7', "isn't on tile 1,7"),
+        ],
+)
+def test_parse_position_err(text, error):
+    with pytest.raises(ValueError, match=error):
+        parse_position(text, LETTERS)
+
+def test_load_dump_world():
+    config = load_config()
+    assert dump_world(build_world(config)) == START
+
+    text = 'rnbqkbnr/pppppppp/8/8/8/4P3/PPPP1PPP/RNBKQBNR 4,2~9.5@4,2.5>pawn:4,3'
+    world = load_world(config, text)
+    piece = world.find_piece_on_tile(world.board.tile_from_xyt((4, 2)))
+
+    assert piece.type.name == 'pawn'
+    assert piece.player.color == 'white'
+    assert piece.cooldown_sec == 9.5
+    assert tuple(piece.xyw) == (4, 2.5)
+    assert piece.current_move.type.name == 'pawn'
+    assert world.get_token(piece.current_move.id) is piece.current_move
+    assert dump_world(world) == text
+
+    with pytest.raises(ValueError, match="position is 4x8"):
+        load_world(config, '4/4/4/4/4/4/4/4')
+
+def test_load_dump_world_many_players():
+    config = load_config()
+    text = '(k2)7/8/8/8/8/8/8/7K 0,7~1.5'
+    world = load_world(config, text)
+
+    assert len(world.players) == 3
+    assert len(list(world.iter_pieces())) == 2
+    assert dump_world(world) == text
+
+    world = load_world(config, text, num_players=4)
+    assert len(world.players) == 4
+    assert dump_world(world) == text
+
+    with pytest.raises(ValueError, match="pieces for 3 players"):
+        load_world(config, text, num_players=2)
+
+def test_benchmark(capsys):
+    main(['notation', 'k7/8/8/8/8/8/8/7K', '--positions', '10', '--worlds', '2'])
+    lines = capsys.readouterr().out.splitlines()
+
+    assert lines[0] == 'k7/8/8/8/8/8/8/7K'
+    assert [x.split()[0] for x in lines[1:]] == [
+            'parse_position', 'dump_position', 'load_world', 'dump_world',
+    ]
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+import random
+
+from cherts.config import load_config
+from cherts.tournament import play_headless_match
+from cherts.replay import *
+
+# Later than anything in the recordings made by these tests.
+END = 100
+
+def record_match(tmp_path, num_ticks=60):
+    """
+    Record a short match in which a random piece jumps to a random empty tile
+    every few ticks.  The referee syncs the jumps to every client, so they're
+    recorded along with everything else.
+    """
+    config = load_config()
+    config['replay'] = {
+            'record': True,
+            'dir': str(tmp_path),
+            'snapshot_interval_sec': 1,
+    }
+    rng = random.Random(0)
+    ticks = 0
+
+    def on_tick(world):
+        nonlocal ticks
+        ticks += 1
+
+        # Leave the last few ticks alone, so the last jump is synced before
+        # the match ends.
+        if ticks % 5 or ticks > num_ticks - 5:
+            return
+
+        piece = rng.choice(sorted(world.iter_pieces(), key=lambda x: x.id))
+        tile = rng.choice(sorted(
+                x for x in world.board.valid_tiles
+                if world.find_piece_on_tile(x) is None
+        ))
+        with world._unlock_temporarily():
+            piece.set_xyw(world.board.xyw_from_tile(tile))
+
+    world, _ = play_headless_match(
+            config,
+            num_ticks=num_ticks,
+            dt_sec=1 / config['simulation']['tick_rate'],
+            on_tick=on_tick,
+    )
+    path, = tmp_path.glob('*.replay')
+    return world, path
+
+def find_state(world):
+    return sorted(
+            (x.id, x.player.id, x.type.name, tuple(x.xyw))
+            for x in world.iter_pieces()
+    )
+
+def replay_messages(reader, until):
+    world, _ = reader._restore_nearest_snapshot(-1)
+    for _ in reader.iter_messages(world, until=until):
+        pass
+    return world
+
+def truncate(path, size):
+    with open(path, 'r+b') as file:
+        file.truncate(size)
+
+def find_index_offset(path):
+    data = path.read_bytes()
+    offset, = FOOTER_STRUCT.unpack_from(data, len(data) - FOOTER_SIZE)
+    return offset
+
+def test_replay_seek(tmp_path):
+    live_world, path = record_match(tmp_path)
+
+    with ReplayReader(path) as reader:
+        assert len(reader.snapshot_times) >= 2
+
+        # Seeking from the nearest snapshot should give the same result as
+        # applying every message from the start.
+        for time in [0.5, 1.52, 2.5, *reader.snapshot_times]:
+            world = reader.seek(time)
+            assert find_state(world) == find_state(replay_messages(reader, time))
+
+        assert find_state(reader.seek(END)) == find_state(live_world)
+
+        # The pieces really did move, so seeking to different times should
+        # give different results.
+        assert find_state(reader.seek(0.5)) != find_state(reader.seek(END))
+
+def test_replay_unclosed(tmp_path):
+    live_world, path = record_match(tmp_path)
+
+    with ReplayReader(path) as reader:
+        snapshot_times = reader.snapshot_times
+        records = list(reader.iter_records())
+
+    # Cut off the index and the footer, as if the game had crashed before the
+    # recording could be closed.  The index should be rebuilt by scanning the
+    # file.
+    truncate(path, find_index_offset(path))
+
+    with ReplayReader(path) as reader:
+        assert reader.snapshot_times == snapshot_times
+        assert list(reader.iter_records()) == records
+        assert find_state(reader.seek(END)) == find_state(live_world)
+
+def test_replay_truncated_record(tmp_path):
+    _, path = record_match(tmp_path)
+    data = path.read_bytes()
+
+    with ReplayReader(path) as reader:
+        records = list(reader.iter_records())
+        *_, (_, _, payload, offset) = records
+
+    # Drop the last record cleanly, to find out what the recording should
+    # look like without it.
+    truncate(path, offset)
+
+    with ReplayReader(path) as reader:
+        expected = find_state(reader.seek(END))
+
+    # Now cut the last record off half way through, as if the game had
+    # crashed while it was being written.  Everything before it should still
+    # be readable.
+    path.write_bytes(data[:offset + len(payload) // 2])
+
+    with ReplayReader(path) as reader:
+        assert list(reader.iter_records()) == records[:-1]
+        assert find_state(reader.seek(END)) == expected
+
+def test_replay_token_identity(tmp_path):
+    _, path = record_match(tmp_path)
+
+    with ReplayReader(path) as reader:
+        # Before the first snapshot, every token comes from a message.  After,
+        # most of them come from the snapshot.
+        for time in [0.5, 2.5]:
+            world = reader.seek(time)
+            pieces = list(world.iter_pieces())
+            assert pieces
+
+            for piece in pieces:
+                assert world.get_token(piece.id) is piece
+                assert world.get_token(piece.player.id) is piece.player
+                assert world.piece_types[piece.type.name] is piece.type
+                assert piece in piece.player.pieces
+
+                for move_type in piece.type.move_types:
+                    assert world.move_types[move_type.name] is move_type
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+import random
+import pytest
+
+from cherts.config import load_config
+from cherts.lockstep import *
+from cherts.rollback import *
+
+def make_peers(config):
+    params = config['lockstep']
+    peers = []
+
+    for player_id in Player.ACTOR_IDS:
+        simulation = LockstepSimulation(
+                build_world(config),
+                tick_rate=params['tick_rate'],
+        )
+        peer = RollbackPeer(
+                simulation,
+                player_id,
+                max_rollback_ticks=params['max_rollback_ticks'],
+                checksum_interval_ticks=params['checksum_interval_ticks'],
+        )
+        peers.append(peer)
+
+    return peers
+
+def play_ticks(peers, num_ticks, rng, *, max_latency_ticks, in_flight=None):
+    """
+    Play the given number of ticks, delivering each packet after a random
+    number of ticks.  Packets that haven't been delivered by the end are
+    returned, so that the next call can deliver them.
+    """
+    in_flight = in_flight or []
+
+    for tick in range(num_ticks):
+        for peer in peers:
+            world = peer.simulation.world
+            player = world.get_token(peer.player_id)
+
+            for piece in player.pieces:
+                tiles = sorted(world.find_reachable_tiles(piece))
+                if tiles and rng.random() < 0.05:
+                    peer.queue_command(MoveCommand(piece.id, rng.choice(tiles)))
+
+            packet = peer.end_tick()
+            for receiver in peers:
+                if receiver is not peer:
+                    latency = rng.randint(0, max_latency_ticks)
+                    in_flight.append((tick + latency, receiver, packet))
+
+        # Deliver packets in the order they were sent, as a reliable,
+        # ordered connection would.
+        for receiver in peers:
+            for item in [x for x in in_flight if x[1] is receiver]:
+                if item[0] > tick:
+                    break
+                receiver.receive(item[2])
+                in_flight.remove(item)
+
+        for peer in peers:
+            peer.advance()
+
+    return [(t - num_ticks, r, p) for t, r, p in in_flight]
+
+def get_state(peer):
+    return [(x.id, x.tile) for x in peer.simulation.world.iter_pieces()]
+
+@pytest.mark.parametrize('max_latency_ticks', [0, 3, 7])
+def test_peers_converge(max_latency_ticks):
+    config = load_config()
+    peers = make_peers(config)
+    rng = random.Random(0)
+
+    in_flight = play_ticks(
+            peers, 200, rng, max_latency_ticks=max_latency_ticks)
+
+    # Stop issuing commands, and let everything arrive.
+    for peer in peers:
+        for _, receiver, packet in in_flight:
+            if receiver is peer:
+                peer.receive(packet)
+        peer.advance()
+
+    while any(x.confirmed_tick < x.tick for x in peers):
+        packets = [(x, x.end_tick()) for x in peers]
+        for sender, packet in packets:
+            for peer in peers:
+                if peer is not sender:
+                    peer.receive(packet)
+        for peer in peers:
+            peer.advance()
+
+    assert peers[0].tick == peers[1].tick
+    assert get_state(peers[0]) == get_state(peers[1])
+    assert peers[0].simulation.checksum() == peers[1].simulation.checksum()
+
+    if max_latency_ticks:
+        assert all(x.num_rollbacks for x in peers)
+    else:
+        assert not any(x.num_rollbacks for x in peers)
+
+def test_local_commands_apply_immediately():
+    config = load_config()
+    peer, _ = make_peers(config)
+    world = peer.simulation.world
+    player = world.get_token(peer.player_id)
+    piece = player.pieces[0]
+    tile = min(world.find_reachable_tiles(piece))
+
+    peer.queue_command(MoveCommand(piece.id, tile))
+    peer.end_tick()
+
+    assert peer.advance() == 1
+    assert piece.tile == tile
+    assert peer.confirmed_tick == 0
+
+def test_too_far_ahead():
+    config = load_config()
+    peer, _ = make_peers(config)
+
+    # Without hearing from the other player, the peer stops once it runs out
+    # of room to roll back.
+    for _ in range(20):
+        peer.end_tick()
+        peer.advance()
+
+    assert peer.tick == peer.max_rollback_ticks
+
+def test_desync_detected():
+    config = load_config()
+    peers = make_peers(config)
+    rng = random.Random(0)
+
+    # Without any latency, every tick is confirmed as soon as it's simulated.
+    # Otherwise, rolling back would undo the divergence made below.
+    in_flight = play_ticks(peers, 10, rng, max_latency_ticks=0)
+    assert all(x.confirmed_tick == x.tick for x in peers)
+
+    # Move a piece on one peer only, as if its simulation had diverged.
+    world = peers[0].simulation.world
+    piece = next(world.iter_pieces())
+    tile = min(world.find_reachable_tiles(piece))
+
+    with world._unlock_temporarily():
+        piece.set_xyw(world.board.xyw_from_tile(tile))
+
+    with pytest.raises(DesyncError):
+        play_ticks(peers, 40, rng, max_latency_ticks=0, in_flight=in_flight)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+import cherts
+from cherts.config import load_config, load_board, load_move_types
+from cherts.rules import RuleBook, NO_TILE
+
+def test_move_table():
+    config = load_config()
+    rules = RuleBook.from_config(config)
+    board = load_board(config)
+    knight = load_move_types(config)['knight']
+
+    for actor_id in cherts.Player.ACTOR_IDS:
+        player = cherts.Player.from_actor_id(actor_id, board)
+        table = rules.find_move_table(board, player, knight)
+
+        for tile in range(board.num_tiles):
+            piece = cherts.Piece(player, None, board.xyw_from_tile(tile))
+            xyw_paths = cherts.xyw_paths_from_xyp_exprs(
+                    knight.xyp_exprs, piece, board)
+            expected = {
+                    board.tile_from_xyw(x[-1])
+                    for x in cherts.clip_xyw_paths(xyw_paths, board)
+            }
+
+            assert set(table[tile].tolist()) - {NO_TILE} == expected
+
+def test_shared_memory_round_trip():
+    config = load_config()
+    rules = RuleBook.from_config(config)
+    board = load_board(config)
+    player = cherts.Player.from_actor_id(2, board)
+    shm = rules.publish()
+
+    def check_tables(shared_rules):
+        for move_type in load_move_types(config).values():
+            expected = rules.find_move_table(board, player, move_type)
+            actual = shared_rules.find_move_table(board, player, move_type)
+
+            if expected is None:
+                assert actual is None
+            else:
+                assert (actual == expected).all()
+                assert not actual.flags.writeable
+
+    try:
+        shared_rules = RuleBook.attach(shm.name)
+        assert shared_rules.config == config
+
+        check_tables(shared_rules)
+        shared_rules.close()
+
+    finally:
+        shm.close()
+        shm.unlink()
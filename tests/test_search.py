@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from cherts.config import load_config
+from cherts.lockstep import build_world
+from cherts.search import *
+
+def test_transposition_table_store_probe():
+    table = TranspositionTable(max_bytes=1000)
+    assert len(table) == 1000 // ENTRY_DTYPE.itemsize
+
+    assert table.probe(12345) is None
+    assert table.store(12345, 1.5, depth=3, move=(7, 20))
+
+    entry = table.probe(12345)
+    assert entry == Entry(value=1.5, depth=3, bound=EXACT, piece_id=7, tile=20)
+    assert table.probe(2**64 - 1) is None
+
+    assert table.num_probes == 3
+    assert table.num_hits == 1
+
+@pytest.mark.parametrize(
+        'replacement, new_depth, kept', [
+            ('always', 1, True),
+            ('depth', 1, False),
+            ('depth', 4, True),
+        ],
+)
+def test_transposition_table_replacement(replacement, new_depth, kept):
+    table = TranspositionTable(max_bytes=ENTRY_DTYPE.itemsize, replacement=replacement)
+
+    table.store(1, 1.0, depth=3)
+    assert table.store(2, 2.0, depth=new_depth) == kept
+    assert (table.probe(2) is not None) == kept
+    assert (table.probe(1) is not None) != kept
+
+    # Entries from earlier searches can always be replaced.
+    table.new_search()
+    table.store(3, 3.0, depth=0)
+    assert table.probe(3) is not None
+
+def test_zobrist_hash():
+    config = load_config()
+    world = build_world(config)
+    hash_0 = world.zobrist_hash
+    piece = next(world.iter_pieces())
+    xyw_0 = piece.xyw
+
+    with world._unlock_temporarily():
+        tile = min(world.find_reachable_tiles(piece))
+        piece.set_xyw(world.board.xyw_from_tile(tile))
+        hash_1 = world.zobrist_hash
+
+        piece.set_cooldown_sec(2.5)
+        hash_2 = world.zobrist_hash
+
+        piece.set_cooldown_sec(0)
+        piece.set_xyw(xyw_0)
+
+    assert len({hash_0, hash_1, hash_2}) == 3
+    assert world.zobrist_hash == hash_0
+
+    # The hash depends only on the arrangement of the pieces.
+    assert build_world(config).zobrist_hash == hash_0
+
+def test_zobrist_keys():
+    from cherts.world import ZobristKeys
+
+    keys = ZobristKeys(64, seed=1)
+    key = keys.find_key('pawn', 2, 10, 0)
+
+    # The keys only depend on the seed, not on the order they're needed in.
+    assert ZobristKeys(64, seed=1).find_key('pawn', 2, 10, 0) == key
+    assert ZobristKeys(64, seed=2).find_key('pawn', 2, 10, 0) != key
+
+    # Any change to the piece changes the key.
+    assert len({
+        key,
+        keys.find_key('rook', 2, 10, 0),
+        keys.find_key('pawn', 3, 10, 0),
+        keys.find_key('pawn', 2, 11, 0),
+        keys.find_key('pawn', 2, None, 0),
+        keys.find_key('pawn', 2, 10, 1),
+    }) == 6
+
+    # There's one row of keys for each piece type and owner, and one for each 
+    # cooldown bucket, no matter how many tiles are looked up.
+    for tile in range(64):
+        keys.find_key('pawn', 2, tile, 0)
+
+    assert len(keys._rows) == 5
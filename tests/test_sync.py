@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import cherts
+from kxg import IdFactory
+from cherts.sync import SyncEncoder, decode, TILE_QUANTA
+from pytest import approx
+
+def make_pieces(xyws):
+    player = cherts.Player((0, 0), (1, 1), 'white')
+    type = cherts.PieceType(
+            'dummy',
+            radius=0.4,
+            move_types=[],
+            pattern_types=[],
+            cooldown_sec=0,
+    )
+    ids = IdFactory(1, 1)
+    pieces = [cherts.Piece(player, type, xyw) for xyw in xyws]
+    for piece in pieces:
+        piece._give_id(ids)
+    return pieces
+
+def test_keyframe_round_trip():
+    pieces = make_pieces([(0, 0), (1.5, 2.25), (7, 7)])
+    pieces[1].set_cooldown_sec(2.5)
+
+    encoder = SyncEncoder()
+    frame = decode(encoder.encode(pieces, tick=3))
+
+    assert frame.tick == 3
+    assert frame.is_keyframe
+    assert frame.states == {
+            1: {'xyw': (0, 0), 'move': None, 'pattern': None, 'cooldown': 0},
+            2: {'xyw': (1.5, 2.25), 'move': None, 'pattern': None, 'cooldown': 2.5},
+            3: {'xyw': (7, 7), 'move': None, 'pattern': None, 'cooldown': 0},
+    }
+
+def test_delta_only_changed_fields():
+    pieces = make_pieces([(0, 0), (1, 1)])
+    encoder = SyncEncoder()
+    encoder.encode(pieces, tick=1)
+
+    # Nothing changed, so there's nothing to send.
+    assert encoder.encode(pieces, tick=2) is None
+
+    pieces[1].set_xyw((1.1, 1))
+    frame = decode(encoder.encode(pieces, tick=3))
+
+    assert not frame.is_keyframe
+    assert list(frame.states) == [2]
+    assert list(frame.states[2]) == ['xyw']
+    assert frame.states[2]['xyw'] == approx((1.1, 1), abs=1/TILE_QUANTA)
+
+def test_periodic_keyframe():
+    pieces = make_pieces([(0, 0)])
+    encoder = SyncEncoder(keyframe_interval=3)
+
+    packets = [encoder.encode(pieces, tick=i) for i in range(7)]
+    is_keyframe = [x is not None and decode(x).is_keyframe for x in packets]
+
+    assert is_keyframe == [True, False, False, True, False, False, True]
+
+    encoder.request_keyframe()
+    assert decode(encoder.encode(pieces, tick=7)).is_keyframe
+
+def test_payload_meter():
+    from cherts.sync import PayloadMeter
+
+    pieces = make_pieces([(0, 0), (1, 1)])
+    encoder = SyncEncoder()
+    meter = PayloadMeter()
+    packets = []
+
+    for tick in range(10):
+        pieces[0].set_xyw((tick / 10, 0))
+        packets.append(encoder.encode(pieces, tick))
+        meter.record(packets[-1])
+        meter.on_update_game(0.5)
+
+    # Only the packets themselves are counted, once each.
+    assert meter.report() == {
+            'payload_bytes': sum(map(len, packets)),
+            'packets': 10,
+            'payload_bytes_per_sec': approx(sum(map(len, packets)) / 5),
+    }
+
+def test_sync_loaded_move():
+    from cherts.config import load_config
+    from cherts.notation import load_world
+
+    # Pieces loaded in the middle of a move are synced with the id of the move.
+    world = load_world(load_config(), 'r7/8/8/8/8/8/8/R7 0,0@0,0.5>rook:0,3')
+    piece = world.find_piece_on_tile(0)
+    frame = decode(SyncEncoder().encode([piece], tick=0))
+
+    assert piece.current_move.id
+    assert frame.states[piece.id]['move'] == piece.current_move.id
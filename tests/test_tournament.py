@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+import multiprocessing
+import pytest
+
+from cherts.config import load_config
+from cherts.lockstep import build_world
+from cherts.rules import RuleBook
+from cherts.tournament import *
+from cherts.tournament import _init_worker, _play_job
+
+@pytest.mark.parametrize(
+        'kwargs, num_ticks', [
+            (dict(num_ticks=100, dt_sec=0.05), 100),
+            (dict(time_limit_sec=5, dt_sec=0.05), 100),
+            (dict(time_limit_sec=0.3, dt_sec=0.1), 3),
+        ],
+)
+def test_play_headless_match_num_ticks(kwargs, num_ticks):
+    ticks = []
+    world, elapsed_sec = play_headless_match(
+            load_config(),
+            on_tick=ticks.append,
+            **kwargs,
+    )
+
+    assert len(ticks) == num_ticks
+    assert elapsed_sec == pytest.approx(num_ticks * kwargs['dt_sec'])
+
+def test_play_headless_match_err():
+    with pytest.raises(ValueError, match="not both"):
+        play_headless_match(load_config(), num_ticks=1, time_limit_sec=1, dt_sec=1)
+    with pytest.raises(ValueError, match="either"):
+        play_headless_match(load_config(), dt_sec=1)
+
+def test_play_random_match():
+    config = load_config()
+    results = [
+            summarize_match(*play_random_match(
+                config, seed=seed, time_limit_sec=600, dt_sec=0.05))
+            for seed in (0, 1)
+    ]
+
+    # Every match is won by capturing a king, well before the time limit.
+    for result in results:
+        assert result['winner'] is not None
+        assert result['duration_sec'] < 600
+
+        loser = 'black' if result['winner'] == 'white' else 'white'
+        assert result['pieces'][result['winner']]['king'] == 1
+        assert 'king' not in result['pieces'][loser]
+
+    # Different seeds play different matches, but the same seed always plays 
+    # the same match.
+    assert results[0] != results[1]
+    assert results[0] == summarize_match(*play_random_match(
+            config, seed=0, time_limit_sec=600, dt_sec=0.05))
+
+def test_find_winner():
+    config = load_config()
+    world = build_world(config)
+    white, black = world.players
+
+    assert find_winner(world, {'king'}) is None
+
+    with world._unlock_temporarily():
+        king = next(x for x in black.pieces if x.type.name == 'king')
+        black.lose_piece(king)
+
+    assert find_winner(world, {'king'}) is white
+    assert find_winner(world, {'king', 'queen'}) is None
+
+def test_tournament_summary():
+    summary = TournamentSummary()
+    results = [
+            ('a', 'white', 10, {'white': {'king': 1, 'pawn': 2}}),
+            ('a', None, 30, {'white': {'king': 1}, 'black': {'king': 1}}),
+            ('b', 'black', 5, {'black': {'queen': 1}}),
+    ]
+    for variant, winner, duration_sec, pieces in results:
+        summary.add_result({
+            'variant': variant,
+            'seed': 0,
+            'winner': winner,
+            'duration_sec': duration_sec,
+            'pieces': pieces,
+        })
+
+    assert summary.num_matches == 3
+    assert summary.report() == {
+            'a': {
+                'matches': 2,
+                'win_rates': {'draw': 0.5, 'white': 0.5},
+                'mean_duration_sec': 20,
+                'mean_surviving_pieces': {
+                    'white': {'king': 1, 'pawn': 1},
+                    'black': {'king': 0.5},
+                },
+            },
+            'b': {
+                'matches': 1,
+                'win_rates': {'black': 1},
+                'mean_duration_sec': 5,
+                'mean_surviving_pieces': {
+                    'black': {'queen': 1},
+                },
+            },
+    }
+    assert summary.format().splitlines()[0] == "a: 2 matches, mean length 20.0s"
+
+def test_play_jobs_in_pool():
+    shm = RuleBook.from_config(load_config()).publish()
+    jobs = [('default', seed, 0.5, 0.05) for seed in range(2)]
+
+    try:
+        with multiprocessing.Pool(
+                2,
+                initializer=_init_worker,
+                initargs=({'default': shm.name},),
+        ) as pool:
+            results = sorted(pool.map(_play_job, jobs), key=lambda x: x['seed'])
+    finally:
+        shm.close()
+        shm.unlink()
+
+    assert [x['seed'] for x in results] == [0, 1]
+
+    # The workers play the same matches as playing each seed directly.
+    for result in results:
+        expected = summarize_match(*play_random_match(
+                load_config(),
+                seed=result['seed'],
+                time_limit_sec=0.5,
+                dt_sec=0.05,
+        ))
+        assert result['variant'] == 'default'
+        assert result['duration_sec'] == pytest.approx(0.5)
+        assert {k: result[k] for k in expected} == expected
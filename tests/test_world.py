@@ -57,3 +57,251 @@ def test_xyw_paths_from_xyp_expr_err(xyp_expr, err_type, err_msg):
 
     with raises(eval(err_type), match=err_msg):
         cherts.xyw_paths_from_xyp_expr(xyp_expr, piece, board)
+
+@parametrize_via_toml('test_world.toml')
+def test_ray_find_distance(xyw_origin, xyw_step, length, xyw, distance):
+    player = cherts.Player((0, 0), (1, 1), 'white')
+    type = cherts.PieceType(
+            'dummy',
+            radius=10,
+            move_types=[],
+            pattern_types=[],
+            cooldown_sec=0,
+    )
+    piece = cherts.Piece(player, type, xyw_origin)
+    ray = cherts.Ray(type, piece, xyw_step, length)
+
+    assert ray.find_distance(xyw) == (distance or None)
+    assert ray.contains(xyw) == bool(distance)
+
+@parametrize_via_toml('test_world.toml')
+def test_xyw_paths_from_xyp_expr_batch(xyp_expr):
+    # The batched evaluation should give the same paths as evaluating the 
+    # expression separately for each piece, whether or not the expression can 
+    # be vectorized.
+    players = [
+            cherts.Player((0, 0), (1, 1), 'white'),
+            cherts.Player((7, 7), (-1, -1), 'black'),
+    ]
+    type = cherts.PieceType(
+            'dummy',
+            radius=10,
+            move_types=[],
+            pattern_types=[],
+            cooldown_sec=0,
+    )
+    pieces = [
+            cherts.Piece(player, type, xyw)
+            for player in players
+            for xyw in [(0, 0), (2, 3), (5, 1)]
+    ]
+    board = cherts.Board(8, 8)
+
+    batch = cherts.xyw_paths_from_xyp_expr_batch(xyp_expr, pieces, board)
+    assert len(batch) == len(pieces)
+
+    for piece, xyw_paths in zip(pieces, batch):
+        expected = cherts.xyw_paths_from_xyp_expr(xyp_expr, piece, board)
+        assert [[tuple(x) for x in p] for p in xyw_paths] == \
+               [[x.tuple for x in p] for p in expected]
+
+@parametrize_via_toml('test_world.toml')
+def test_xyw_paths_from_xyp_expr_batch_err(xyp_expr, err_type, err_msg):
+    player = cherts.Player((0, 0), (1, 1), 'white')
+    type = cherts.PieceType(
+            'dummy',
+            radius=10,
+            move_types=[],
+            pattern_types=[],
+            cooldown_sec=0,
+    )
+    pieces = [cherts.Piece(player, type, xyw) for xyw in [(0, 0), (2, 3)]]
+    board = cherts.Board(8, 8)
+
+    with raises(eval(err_type), match=err_msg):
+        cherts.xyw_paths_from_xyp_expr_batch(xyp_expr, pieces, board)
+
+def test_xyw_paths_from_xyp_expr_batch_log(caplog):
+    import logging
+
+    player = cherts.Player((0, 0), (1, 1), 'white')
+    type = cherts.PieceType(
+            'dummy',
+            radius=10,
+            move_types=[],
+            pattern_types=[],
+            cooldown_sec=0,
+    )
+    pieces = [cherts.Piece(player, type, xyw) for xyw in [(0, 0), (2, 3)]]
+    board = cherts.Board(8, 8)
+    xyp_expr = 'min(x, y), 1'
+
+    # Falling back to evaluating one piece at a time is logged, but only the 
+    # first time for each expression.
+    with caplog.at_level(logging.INFO):
+        for _ in range(2):
+            cherts.xyw_paths_from_xyp_expr_batch(xyp_expr, pieces, board)
+
+    messages = [x.getMessage() for x in caplog.records if xyp_expr in x.getMessage()]
+    assert len(messages) == 1
+    assert messages[0].startswith(f"evaluating {xyp_expr!r} one piece at a time: ValueError:")
+
+@parametrize_via_toml('test_world.toml')
+def test_board_tiles(wh, xyw, tile):
+    # TOML doesn't have a null value, so `false` means "not on the board".
+    tile = None if tile is False else tile
+
+    board = cherts.Board(*wh)
+    assert board.tile_from_xyw(xyw) == tile
+
+    if tile is not None:
+        assert board.xyw_from_tile(tile) == (round(xyw[0]), round(xyw[1]))
+
+@parametrize_via_toml('test_world.toml')
+def test_board_ray_lengths(layout, xyt, xyt_step, length):
+    w, h = len(layout[0]), len(layout)
+    board = cherts.Board(w, h, layout)
+    tile = board.tile_from_xyt(xyt)
+
+    assert board.find_ray_length(tile, tuple(xyt_step)) == length
+
+    # The precomputed length should agree with just walking the ray.
+    x, y = xyt
+    dx, dy = xyt_step
+    expected = 0
+    while board.is_playable(board.tile_from_xyt((x + dx, y + dy))):
+        x += dx; y += dy; expected += 1
+
+    assert length == expected
+
+@parametrize_via_toml('test_world.toml')
+def test_player_from_actor_id(wh, num_players, actor_id, origin, heading, color):
+    board = cherts.Board(*wh)
+    player = cherts.Player.from_actor_id(actor_id, board, num_players)
+
+    assert player.origin == origin
+    assert player.heading == heading
+    assert player.color == color
+
+@parametrize_via_toml('test_world.toml')
+def test_find_pieces_in_rect(position, xyt_min, xyt_max, expected):
+    from cherts.config import load_config
+    from cherts.notation import load_world
+
+    world = load_world(load_config(), position)
+    pieces = world.find_pieces_in_rect(xyt_min, xyt_max)
+
+    assert sorted(world.board.xyt_from_tile(x.tile) for x in pieces) == \
+            sorted(tuple(x) for x in expected)
+
+def test_move_cache():
+    import random
+    from cherts.config import load_config
+    from cherts.lockstep import build_world
+
+    def describe(moves):
+        return sorted(
+                (x.type.name, tuple(tuple(v) for v in x.xyw_path))
+                for x in moves
+        )
+
+    world = build_world(load_config())
+    cache = world.move_cache
+    rng = random.Random(0)
+    pieces = list(world.iter_pieces())
+
+    for piece in pieces:
+        piece.find_legal_moves()
+
+    assert cache.report()['misses'] == len(pieces)
+    assert len(cache) == len(pieces)
+
+    for _ in range(100):
+        # Whatever is still cached must be the same as what would be found 
+        # from scratch.
+        for piece in world.iter_pieces():
+            moves, deps = world._find_legal_moves(piece)
+            assert describe(piece.find_legal_moves()) == describe(moves)
+
+        piece = rng.choice(list(world.iter_pieces()))
+        tiles = sorted(world.find_reachable_tiles(piece))
+        if not tiles:
+            continue
+
+        tile = rng.choice(tiles)
+        occupant = world.find_piece_on_tile(tile)
+        num_entries = len(cache)
+
+        with world._unlock_temporarily():
+            if occupant is not None:
+                occupant.player.lose_piece(occupant)
+                world._remove_token(occupant)
+            piece.set_xyw(world.board.xyw_from_tile(tile))
+
+        # Only the pieces that depended on the tiles involved are refreshed.
+        assert 0 < num_entries - len(cache) < num_entries
+
+    report = cache.report()
+    assert report['hits'] > report['misses'] > 0
+    assert report['invalidations'] > 0
+
+def test_coverage_cache():
+    import random
+    import numpy as np
+    from cherts.config import load_config
+    from cherts.lockstep import build_world
+
+    def find_coverage_from_scratch(world):
+        coverage = {}
+        for player in world.players:
+            coverage[player.id] = np.zeros(world.board.size, dtype=np.int32, order='F')
+            tiles = coverage[player.id].ravel(order='F')
+
+            for piece in player.pieces:
+                reach, deps = world._find_reach(piece)
+                for tile in reach:
+                    tiles[tile] += 1
+
+        return coverage
+
+    world = build_world(load_config())
+    rng = random.Random(0)
+    num_captures = 0
+
+    for i in range(300):
+        # The coverage maps are updated incrementally as pieces move, so check 
+        # that they always agree with a full recalculation.
+        if i % 10 == 0:
+            expected = find_coverage_from_scratch(world)
+            for player in world.players:
+                np.testing.assert_array_equal(
+                        world.get_coverage(player).to_array(),
+                        expected[player.id],
+                )
+
+        piece = rng.choice(list(world.iter_pieces()))
+        tiles = sorted(world.find_reachable_tiles(piece))
+        if not tiles:
+            continue
+
+        tile = rng.choice(tiles)
+        occupant = world.find_piece_on_tile(tile)
+
+        with world._unlock_temporarily():
+            if occupant is not None:
+                occupant.player.lose_piece(occupant)
+                world._remove_token(occupant)
+                num_captures += 1
+            piece.set_xyw(world.board.xyw_from_tile(tile))
+
+        if occupant is not None:
+            assert occupant not in world._reach
+
+    expected = find_coverage_from_scratch(world)
+    for player in world.players:
+        np.testing.assert_array_equal(
+                world.get_coverage(player).to_array(),
+                expected[player.id],
+        )
+
+    assert num_captures > 0